@@ -125,6 +125,25 @@ def update_groups(user_id):
     
     return jsonify({"message": "Group updated successfully"}), 200
     
+from stock_app.lstmPredict import lstm_predict_batch
+
+# 批次預測使用者某個群組的所有股票，以 NDJSON 逐檔串流輸出（查詢參數與 /stock_app/api/lstm_predict 相同）
+@app.route("/groups/<user_id>/<int:group_index>/lstm_predict", methods=["GET"])
+def predict_group(user_id, group_index):
+    try:
+        object_id = ObjectId(user_id)
+    except InvalidId:
+        return jsonify({"error": "Invalid user ID format"}), 400
+
+    user = mongo.db.users.find_one({"_id": object_id}, {"groups": 1})
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    groups = user.get("groups", [])
+    if group_index >= len(groups):
+        return jsonify({"error": "Group not found"}), 404
+    return lstm_predict_batch(groups[group_index].get("stocks", []), request.args.get("market"))
+
 # 註冊 Blueprint
 from stock_app import stock_app_blueprint
 app.register_blueprint(stock_app_blueprint, url_prefix='/stock_app')  
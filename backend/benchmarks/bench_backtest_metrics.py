@@ -0,0 +1,71 @@
+"""
+回測指標：逐 fold、逐根K棒以 Python 迴圈計算，與 backtestEngine.fold_metrics 以 (folds, bars) 陣列一次計算
+
+迴圈版本的寫法與 lstmPredict.calculate_metrics 相同（每個 fold 各自呼叫一次），
+另外逐根K棒判斷方向與累計訊號報酬。兩者的結果必須一致。
+不需要 TensorFlow，預測價格為實際價格加上雜訊。
+
+執行方式（於 backend 目錄）:
+    python -m benchmarks.bench_backtest_metrics
+"""
+import time
+
+import numpy as np
+
+from stock_app.backtestEngine import fold_metrics
+
+FOLDS = 200
+BARS = 63
+ROUNDS = 20
+
+def loop_metrics(actual, predicted, previous):
+    results = {name: [] for name in ("rmse", "mape", "hit_rate", "pnl", "buy_and_hold", "naive_rmse")}
+    for fold_actual, fold_predicted, fold_previous in zip(actual, predicted, previous):
+        squared = absolute = naive = 0.0
+        hits = 0
+        equity = 1.0
+        for a, p, prev in zip(fold_actual, fold_predicted, fold_previous):
+            squared += (p - a) ** 2
+            absolute += abs(p - a) / abs(a)
+            naive += (prev - a) ** 2
+            if np.sign(p - prev) == np.sign(a - prev):
+                hits += 1
+            position = 1.0 if p > prev else -1.0
+            equity *= 1 + position * (a / prev - 1)
+        bars = len(fold_actual)
+        results["rmse"].append(np.sqrt(squared / bars))
+        results["mape"].append(absolute / bars * 100)
+        results["hit_rate"].append(hits / bars * 100)
+        results["pnl"].append(equity - 1)
+        results["buy_and_hold"].append(fold_actual[-1] / fold_previous[0] - 1)
+        results["naive_rmse"].append(np.sqrt(naive / bars))
+    return {name: np.array(values) for name, values in results.items()}
+
+def best_time(func, *args):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    rng = np.random.default_rng(0)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, FOLDS * BARS + 1)))
+    previous = closes[:-1].reshape(FOLDS, BARS)
+    actual = closes[1:].reshape(FOLDS, BARS)
+    predicted = previous * (1 + rng.normal(0, 0.01, previous.shape))
+
+    expected = loop_metrics(actual, predicted, previous)
+    result = fold_metrics(actual, predicted, previous)
+    for name, values in expected.items():
+        assert np.allclose(result[name], values), name
+
+    loop_seconds = best_time(loop_metrics, actual, predicted, previous)
+    vector_seconds = best_time(fold_metrics, actual, predicted, previous)
+    print(f"{FOLDS} folds x {BARS} bars (best of {ROUNDS})")
+    print(f"  python loop:  {loop_seconds * 1000:8.2f} ms")
+    print(f"  fold_metrics: {vector_seconds * 1000:8.2f} ms  ({loop_seconds / vector_seconds:.0f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+LSTM 推論服務的批次效果：CLIENTS 個執行緒同時對同一檔股票發出預測請求
+
+舊路徑: 每個請求在自己的執行緒中推論（原本 Flask 執行緒直接呼叫 Keras）
+推論服務: 經由 Unix socket，BATCH_WINDOW = 0（每個請求單獨推論）與預設的批次等待時間
+
+模型為 stockLSTM.create_lstm_model 建立的未訓練模型（推論成本與訓練後相同），
+存放在暫存的 MODEL_DIR（使用紀錄也寫在暫存目錄），不影響 stock_app/models。需要安裝 TensorFlow 與 sklearn。
+
+執行方式（於 backend 目錄）:
+    python -m benchmarks.bench_inference_batching
+"""
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from stock_app import modelRegistry, inferenceClient
+from stock_app.inferenceServer import InferenceServer, run_batch, configure_threads, BATCH_WINDOW
+
+SYMBOL = 'BENCH'
+WINDOW = 60
+BARS = 90
+CLIENTS = 16
+REQUESTS_PER_CLIENT = 10
+
+def build_model(model_dir, closes):
+    """建立模型與縮放器並以 save_model_files 寫入 model_dir"""
+    from sklearn.preprocessing import MinMaxScaler # type: ignore
+    from stock_app.stockLSTM import create_lstm_model
+
+    modelRegistry.MODEL_DIR = model_dir
+    modelRegistry.USAGE_PATH = os.path.join(model_dir, 'model_usage.json')
+    scaler = MinMaxScaler(feature_range=(0, 1)).fit(closes.reshape(-1, 1))
+    model = create_lstm_model((WINDOW, 1), include_sentiment=False)
+    modelRegistry.save_model_files(SYMBOL, False, model, scaler)
+
+def make_request(closes):
+    return {"model": "symbol", "symbol": SYMBOL, "with_sentiment": False,
+            "closes": closes, "sentiment": None, "days": 7}
+
+def in_process(closes):
+    result = run_batch([make_request(closes)])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+def via_server(closes):
+    return inferenceClient.forecast(SYMBOL, False, closes)
+
+def run_clients(predict, closes):
+    """CLIENTS 個執行緒各自連續送出 REQUESTS_PER_CLIENT 個請求，回傳 (總秒數, 每個請求的延遲, 一個結果)"""
+    latencies, results = [], []
+    lock = threading.Lock()
+
+    def client():
+        for _ in range(REQUESTS_PER_CLIENT):
+            start = time.perf_counter()
+            result = predict(closes)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                results.append(result)
+
+    threads = [threading.Thread(target=client) for _ in range(CLIENTS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, np.array(latencies), results[0]
+
+def start_server(socket_path, batch_window):
+    server = InferenceServer(socket_path, batch_window=batch_window)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    while not os.path.exists(socket_path):
+        time.sleep(0.01)
+    return server
+
+def report(label, seconds, latencies, baseline=None):
+    total = len(latencies)
+    speedup = f"  ({baseline / seconds:.1f}x)" if baseline else ""
+    print(f"{label:<28} {total / seconds:8.1f} req/s  p50 {np.median(latencies) * 1000:7.1f} ms"
+          f"  p95 {np.percentile(latencies, 95) * 1000:7.1f} ms{speedup}")
+
+def main():
+    configure_threads()
+    tmp = tempfile.mkdtemp()
+    closes = 100 + np.cumsum(np.random.default_rng(0).normal(0, 1, BARS))
+    build_model(tmp, closes)
+
+    # 預熱：載入模型並追蹤推論函數
+    reference = in_process(closes)
+
+    old_seconds, old_latencies, old_result = run_clients(in_process, closes)
+
+    inferenceClient.INFERENCE_MODE = 'remote'
+    results = {}
+    for label, batch_window in (("server, no batching", 0.0), ("server, batched", BATCH_WINDOW)):
+        inferenceClient.INFERENCE_SOCKET = os.path.join(tmp, f"inference-{int(batch_window * 1000)}.sock")
+        server = start_server(inferenceClient.INFERENCE_SOCKET, batch_window)
+        # 每個執行緒保留自己的連線，換 socket 後重新連線
+        inferenceClient._local = threading.local()
+        results[label] = run_clients(via_server, closes) + (server.stats(),)
+
+    for _, _, result, _ in results.values():
+        assert np.allclose(result["future"], reference["future"], rtol=1e-4)
+    assert np.allclose(old_result["future"], reference["future"], rtol=1e-4)
+
+    print(f"{CLIENTS} clients x {REQUESTS_PER_CLIENT} requests, {BARS} bars, window {WINDOW}")
+    report("in-process, per request", old_seconds, old_latencies)
+    for label, (seconds, latencies, _, stats) in results.items():
+        report(label, seconds, latencies, old_seconds)
+        print(f"{'':<28} {stats['batches']} batches, largest {stats['largest_batch']}")
+
+if __name__ == '__main__':
+    main()
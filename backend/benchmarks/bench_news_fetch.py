@@ -0,0 +1,111 @@
+"""
+新聞抓取效能比較：本地 HTML 測試伺服器上的 20 篇文章
+
+測試伺服器提供新聞列表頁 (/quote/<symbol>/news) 與文章頁 (/news/<n>.html)，
+每個文章請求延遲 ARTICLE_LATENCY 秒，模擬外部網站的回應時間。
+
+舊路徑: 逐篇 session.get + 解析（不快取）
+新路徑: stock_app.newsFetcher.fetch_news_list + fetch_articles（同時抓取、以 URL 快取）
+
+執行方式（於 backend 目錄）:
+    python -m benchmarks.bench_news_fetch
+"""
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 使用行程內快取，不寫入 data/cache.db
+os.environ.setdefault('STOCK_CACHE_BACKEND', 'memory')
+
+from stock_app import rateLimiter
+from stock_app.rateLimiter import RateLimiter, BUDGETS, yahoo_session
+from stock_app.newsFetcher import (fetch_news_list, fetch_articles, extract_article_text,
+                                   parse_news_list, MAX_ARTICLES)
+
+ARTICLES = 20
+ARTICLE_LATENCY = 0.2
+
+PARAGRAPH = ("Shares rallied after the company reported strong quarterly growth, "
+             "beating analyst estimates while guidance pointed to further upside. ")
+
+def news_list_html(symbol, count=ARTICLES):
+    items = ''.join(
+        f'<li class="js-stream-content"><a href="/news/{n}.html"><h3>{symbol} headline number {n} for investors</h3></a>'
+        f'<div class="publishing">Reuters • {n + 1} hours ago</div></li>'
+        for n in range(count)
+    )
+    return f"<html><body><ul>{items}</ul></body></html>"
+
+def article_html(n):
+    paragraphs = ''.join(f"<p>{PARAGRAPH * 3}</p>" for _ in range(8))
+    return f'<html><body><div class="caas-body">{paragraphs}</div></body></html>'
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith('/quote/'):
+            body = news_list_html(self.path.split('/')[2])
+        elif self.path.startswith('/news/'):
+            time.sleep(ARTICLE_LATENCY)
+            body = article_html(self.path.rsplit('/', 1)[-1])
+        else:
+            self.send_error(404)
+            return
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def start_fixture_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def old_path(symbol, base_url):
+    response = yahoo_session.get(f"{base_url}/quote/{symbol}/news", timeout=15)
+    news_items = parse_news_list(response.text, base_url)[:MAX_ARTICLES]
+    contents = []
+    for news in news_items:
+        article_response = yahoo_session.get(news['link'], timeout=15)
+        contents.append(extract_article_text(article_response.text))
+    return contents
+
+def new_path(symbol, base_url):
+    news_items = fetch_news_list(symbol, base_url)[:MAX_ARTICLES]
+    return fetch_articles([news['link'] for news in news_items])
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def main():
+    server, base_url = start_fixture_server()
+    # 測試伺服器使用獨立的速率限制狀態，本機主機 (default 預算) 每秒 20 個請求
+    rateLimiter.limiter = RateLimiter(
+        db_path=os.path.join(tempfile.mkdtemp(), 'rate_limits.db'),
+        budgets=dict(BUDGETS, default=(20.0, 20)),
+    )
+    try:
+        old_seconds, old_contents = timed(old_path, 'AAPL', base_url)
+        cold_seconds, new_contents = timed(new_path, 'AAPL', base_url)
+        warm_seconds, warm_contents = timed(new_path, 'AAPL', base_url)
+    finally:
+        server.shutdown()
+
+    assert old_contents == new_contents == warm_contents
+    assert len(new_contents) == ARTICLES and all(new_contents)
+
+    print(f"{ARTICLES} articles, {ARTICLE_LATENCY * 1000:.0f} ms latency each")
+    print(f"serial, uncached:      {old_seconds * 1000:8.1f} ms")
+    print(f"concurrent, cold:      {cold_seconds * 1000:8.1f} ms  ({old_seconds / cold_seconds:.1f}x)")
+    print(f"concurrent, cached:    {warm_seconds * 1000:8.1f} ms  ({old_seconds / warm_seconds:.0f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+新聞情感評分效能比較：500 則標題與文章（每篇 800 字詞，約 7 個 1000 字的段落）
+
+舊路徑: 原本 analysis_stock_sentiment 的逐則迴圈（每則標題掃描 28 個詞彙、每篇文章每個詞彙都重新 lower()）
+新路徑: stock_app.sentimentScoring.score_news_batch 一次處理整批
+
+分別以 VADER 與固定分數（只比較金融詞彙比對、位置加權等其餘步驟）執行。
+
+執行方式（於 backend 目錄）:
+    python -m benchmarks.bench_sentiment_scoring
+"""
+import timeit
+
+import numpy as np
+from nltk.sentiment.vader import SentimentIntensityAnalyzer # type: ignore
+
+from stock_app.sentimentScoring import (score_news_batch, FINANCE_POS_TERMS, FINANCE_NEG_TERMS,
+                                        STOCK_TERMS)
+
+ARTICLES = 500
+ARTICLE_WORDS = 800
+REPEAT = 3
+
+# 金融詞彙佔所有單字的比例
+TERM_FRACTION = 0.01
+
+WORDS = ("the company said quarterly revenue guidance investors analysts expect demand outlook shares "
+         "market earnings results margin iphone services china supply chain chips data center cloud "
+         "software users subscription price target rating federal reserve rates inflation consumer "
+         "spending holiday season quarter fiscal year billion million percent").split()
+
+def make_news(n=ARTICLES, seed=0):
+    rng = np.random.default_rng(seed)
+    terms = np.array(FINANCE_POS_TERMS + FINANCE_NEG_TERMS)
+
+    def sentence(words):
+        tokens = rng.choice(WORDS, words)
+        mask = rng.random(words) < TERM_FRACTION
+        tokens[mask] = rng.choice(terms, mask.sum())
+        return ' '.join(tokens).capitalize()
+
+    symbols = [f"SYM{i % 50}" for i in range(n)]
+    titles = [f"{symbols[i]} {sentence(10)}" for i in range(n)]
+    contents = [sentence(ARTICLE_WORDS) for _ in range(n)]
+    return titles, symbols, contents
+
+def old_path(titles, symbols, contents, polarity):
+    """原本的逐則評分（標題與文章一一對應）"""
+    title_scores, combined = [], []
+    for title, symbol, content in zip(titles, symbols, contents):
+        stock_terms = [symbol.lower(), symbol] + STOCK_TERMS
+        compound_score = polarity(title)
+        title_lower = title.lower()
+        pos_matches = sum(1 for term in FINANCE_POS_TERMS if term in title_lower)
+        neg_matches = sum(1 for term in FINANCE_NEG_TERMS if term in title_lower)
+        weight = 1.5 if any(term in title_lower for term in stock_terms) else 1.0
+        if -0.1 < compound_score < 0.1:
+            if pos_matches > neg_matches:
+                compound_score += 0.1 * pos_matches
+            elif neg_matches > pos_matches:
+                compound_score -= 0.1 * neg_matches
+        title_score = max(-1.0, min(1.0, compound_score * weight))
+        title_scores.append(title_score)
+
+        chunks = [content[i:i + 1000] for i in range(0, len(content), 1000)]
+        chunk_scores = [polarity(chunk) for chunk in chunks]
+        weighted_scores = [score * (1.0 / (1 + i * 0.3)) for i, score in enumerate(chunk_scores)]
+        avg_article_score = sum(weighted_scores) / sum(1.0 / (1 + i * 0.3) for i in range(len(chunk_scores)))
+        pos_matches = sum(1 for term in FINANCE_POS_TERMS if term in content.lower())
+        neg_matches = sum(1 for term in FINANCE_NEG_TERMS if term in content.lower())
+        if -0.1 < avg_article_score < 0.1:
+            if pos_matches > neg_matches:
+                avg_article_score += 0.05 * min(5, pos_matches)
+            elif neg_matches > pos_matches:
+                avg_article_score -= 0.05 * min(5, neg_matches)
+        article_score = max(-1.0, min(1.0, avg_article_score))
+        combined.append(title_score * 0.35 + article_score * 0.65)
+    return np.array(title_scores), np.array(combined)
+
+def compare(label, news, polarity):
+    old = old_path(*news, polarity)
+    new = score_news_batch(*news, polarity)
+    assert np.allclose(old[0], new[0]) and np.allclose(old[1], new[1])
+
+    old_seconds = min(timeit.repeat(lambda: old_path(*news, polarity), number=1, repeat=REPEAT))
+    new_seconds = min(timeit.repeat(lambda: score_news_batch(*news, polarity), number=1, repeat=REPEAT))
+    print(f"{label}")
+    print(f"  per-item loop:  {old_seconds * 1000:8.1f} ms")
+    print(f"  batched:        {new_seconds * 1000:8.1f} ms  ({old_seconds / new_seconds:.1f}x)")
+
+def main():
+    news = make_news()
+    chunks = sum(-(-len(content) // 1000) for content in news[2])
+    print(f"{ARTICLES} titles, {ARTICLES} articles ({chunks} chunks)")
+
+    sid = SentimentIntensityAnalyzer()
+    compare("VADER", news, lambda text: sid.polarity_scores(text)['compound'])
+    # VADER 以外的步驟（詞彙比對、加權、調整）
+    compare("term matching + weighting only", news, lambda text: 0.0)
+
+if __name__ == '__main__':
+    main()
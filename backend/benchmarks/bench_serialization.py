@@ -0,0 +1,82 @@
+"""
+指標回應序列化效能比較：5 年日K (約 1260 根) 的 /api/ma 欄位
+
+舊路徑: data.where(pd.notnull(data), None) + 逐元素 list comprehension + json.dumps
+新路徑: stock_app.serializer.dumps_columns 直接輸出 NumPy float 陣列
+
+執行方式（於 backend 目錄）:
+    python -m benchmarks.bench_serialization
+"""
+import json
+import timeit
+
+import numpy as np
+import pandas as pd # type: ignore
+
+from stock_app.indicatorEngine import compute_indicators, clear_cache
+from stock_app.routes import MA_INDICATORS
+from stock_app.serializer import dumps_columns
+
+BARS = 5 * 252
+REPEAT = 50
+
+def make_bars(n=BARS, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=n, name='Date')
+    return pd.DataFrame({
+        'Open': close + rng.normal(0, 0.5, n),
+        'High': close + 1,
+        'Low': close - 1,
+        'Close': close,
+        'Volume': rng.integers(100000, 1000000, n),
+    }, index=index)
+
+def old_path(data, indicators):
+    data = data.copy()
+    for key, spec in MA_INDICATORS.items():
+        data[key] = indicators[spec]
+    data = data.where(pd.notnull(data), None)
+    data = data.reset_index()
+    result = {
+        "dates": data['Date'].dt.strftime('%Y-%m-%d').tolist(),
+        "open_prices": data['Open'].tolist(),
+        "high_prices": data['High'].tolist(),
+        "low_prices": data['Low'].tolist(),
+        "close_prices": data['Close'].tolist(),
+    }
+    for key in MA_INDICATORS:
+        result[key] = [None if pd.isna(x) else x for x in data[key].tolist()]
+    result["volumes"] = data['Volume'].tolist()
+    return json.dumps(result).encode('utf-8')
+
+def new_path(data, indicators):
+    result = {
+        "dates": data.index.strftime('%Y-%m-%d').tolist(),
+        "open_prices": data['Open'].to_numpy(),
+        "high_prices": data['High'].to_numpy(),
+        "low_prices": data['Low'].to_numpy(),
+        "close_prices": data['Close'].to_numpy(),
+    }
+    for key, spec in MA_INDICATORS.items():
+        result[key] = indicators[spec]
+    result["volumes"] = data['Volume'].to_numpy()
+    return dumps_columns(result)
+
+def main():
+    data = make_bars()
+    clear_cache()
+    indicators = compute_indicators('BENCH', data, MA_INDICATORS.values())
+
+    # 兩條路徑輸出的內容必須一致
+    assert json.loads(old_path(data, indicators)) == json.loads(new_path(data, indicators))
+
+    old = min(timeit.repeat(lambda: old_path(data, indicators), number=REPEAT, repeat=3)) / REPEAT
+    new = min(timeit.repeat(lambda: new_path(data, indicators), number=REPEAT, repeat=3)) / REPEAT
+    print(f"bars={len(data)} columns={len(MA_INDICATORS) + 6}")
+    print(f"舊路徑: {old * 1000:.2f} ms")
+    print(f"新路徑: {new * 1000:.2f} ms")
+    print(f"加速: {old / new:.1f}x")
+
+if __name__ == '__main__':
+    main()
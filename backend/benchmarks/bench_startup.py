@@ -0,0 +1,75 @@
+"""
+API 啟動時間：在新的 Python 行程中匯入 app.py
+
+stock_app 原本無條件匯入 stockLSTM（TensorFlow、sklearn、NLTK），現在 TF 只在訓練、
+推論（沒有推論服務時）時才載入，NLTK 只在第一次評分新聞時才載入。
+每次都啟動新的行程量測冷啟動的 import app，檢查：
+- 最快的一次不超過 STARTUP_BUDGET 秒（可由 STOCK_STARTUP_BUDGET 調整）
+- 匯入後尚未載入 ML_MODULES
+有安裝 TensorFlow / NLTK 時另外量測第一次載入 stockLSTM 的時間（原本每個 worker 啟動時都要付出）。
+
+背景排程與新聞情感 ingester 在量測時停用，避免背景執行緒在量測期間匯入 stockLSTM。
+
+執行方式（於 backend 目錄）:
+    python -m benchmarks.bench_startup
+"""
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RUNS = 5
+STARTUP_BUDGET = float(os.environ.get('STOCK_STARTUP_BUDGET', '1.0'))
+
+ML_MODULES = ['tensorflow', 'keras', 'sklearn', 'nltk', 'stock_app.stockLSTM', 'stock_app.lstmInference',
+              'stock_app.globalModel']
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import app
+result = {"import": time.perf_counter() - start,
+          "loaded": [m for m in %r if m in sys.modules]}
+if %r:
+    from stock_app.lstmRoutes import lstm_module
+    start = time.perf_counter()
+    try:
+        lstm_module()
+        result["ml"] = time.perf_counter() - start
+    except ImportError as e:
+        result["ml_error"] = str(e)
+print(json.dumps(result))
+"""
+
+def run(load_ml=False):
+    env = dict(os.environ, STOCK_SENTIMENT_INTERVAL='0', STOCK_RETRAIN_HOUR='-1',
+               STOCK_PREWARM_MODELS='0', STOCK_PRELOAD_ML='0')
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_SCRIPT % (ML_MODULES, load_ml)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    results = [run() for _ in range(RUNS)]
+    times = sorted(result["import"] for result in results)
+    loaded = sorted({m for result in results for m in result["loaded"]})
+
+    print(f"cold import app ({RUNS} processes)")
+    print(f"  min:     {times[0] * 1000:8.1f} ms")
+    print(f"  median:  {times[len(times) // 2] * 1000:8.1f} ms")
+    print(f"  budget:  {STARTUP_BUDGET * 1000:8.1f} ms")
+
+    ml = run(load_ml=True)
+    if "ml" in ml:
+        print(f"first lstm_module() load: {ml['ml'] * 1000:8.1f} ms (previously paid at startup)")
+    else:
+        print(f"first lstm_module() load: skipped ({ml['ml_error']})")
+
+    assert not loaded, f"ML modules loaded at startup: {loaded}"
+    assert times[0] <= STARTUP_BUDGET, f"cold import took {times[0]:.2f}s (budget {STARTUP_BUDGET:.2f}s)"
+
+if __name__ == '__main__':
+    main()
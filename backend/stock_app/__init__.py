@@ -13,4 +13,5 @@ CORS(stock_app_blueprint, resources={
 })
 
 from . import routes
-from . import stockLSTM
\ No newline at end of file
+# stockLSTM（TensorFlow、NLTK）由 lstmRoutes 在第一次使用時才載入
+from . import lstmRoutes
@@ -0,0 +1,300 @@
+"""
+LSTM 滾動前進 (walk-forward) 回測
+
+/api/lstm_predict 的 prediction_accuracy 只是模型在訓練資料最後一段的誤差（樣本內），
+看不出模型對未來的預測能力。這裡以本地日K資料庫中多年的歷史逐段回測：
+- 資料切成連續的 fold，每個 fold 以前 train_bars 根K棒訓練，預測接下來 test_bars 根K棒
+  （每根都是以實際歷史價格的單步預測，與 /api/lstm_predict 的近期準確度相同）；
+  縮放器只以訓練區段擬合，不會看到測試區段的價格
+- mode=retrain：每個 fold 各自訓練新模型，fold 之間互不相依，在行程池中平行執行
+- mode=fine_tune：第一個 fold 訓練新模型，之後每個 fold 以上一個 fold 的權重為起點，
+  只用新增的K棒微調並沿用原本的縮放器（與排程更新 retrainScheduler 相同），依序在一個子行程中執行
+- 各 fold 的 RMSE、MAPE、方向命中率，以及依「買入/賣出」訊號每天做多/做空的報酬，
+  以 (folds, bars) 陣列一次計算，並附上「預測價格 = 前一天收盤價」的基準 RMSE 與買進持有報酬
+
+回測只使用價格模型（歷史新聞情感只保存最近的資料，無法涵蓋多年的回測期間）。
+TensorFlow 只在行程池的子行程中載入，web worker 與訓練佇列的執行緒不需要載入 TF；
+子行程以 spawn 啟動（不繼承父行程的 TF 執行緒與鎖），每個子行程的 TF 執行緒數依 CPU 數平均分配。
+
+結果以 (symbol, 模型版本, 資料最後日期) 保存在 data/backtests.db，
+模型版本包含 MODEL_VERSION 與回測參數，模型結構或訓練方式改變時遞增 MODEL_VERSION。
+回測工作排入獨立的 backtest_queue（工作數量另外限制），不佔用模型訓練的 training_queue；
+工作狀態與訓練工作存放在同一個資料表，可由 /api/lstm_jobs 查詢。
+"""
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import repeat
+from multiprocessing import get_context
+
+import numpy as np
+
+from .stockStore import get_history
+from .trainingQueue import TrainingQueue
+from .windowing import make_windows, make_training_windows
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'data', 'backtests.db')
+
+# stockLSTM 的模型結構或訓練方式改變時遞增，舊的回測結果不再使用
+MODEL_VERSION = 1
+
+MODES = ('retrain', 'fine_tune')
+PERIODS = ('2y', '5y', '10y', 'max')
+
+WINDOW = 60
+TRAIN_BARS = 252
+TEST_BARS = 63
+
+# 最多回測的 fold 數量（取最近的 fold）
+MAX_FOLDS = 20
+
+# 行程池的子行程數量
+BACKTEST_WORKERS = int(os.environ.get('STOCK_BACKTEST_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+# 每個行程同時執行的回測數量，以及最多接受的等待中 + 執行中回測數量
+BACKTEST_JOBS = int(os.environ.get('STOCK_BACKTEST_JOBS', '1'))
+MAX_PENDING_BACKTESTS = 5
+
+# 回測專用的工作佇列
+backtest_queue = TrainingQueue(max_workers=BACKTEST_JOBS, max_pending=MAX_PENDING_BACKTESTS)
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS backtests (
+            symbol TEXT NOT NULL,
+            version TEXT NOT NULL,
+            data_through TEXT NOT NULL,
+            created_at REAL,
+            result TEXT,
+            PRIMARY KEY (symbol, version, data_through)
+        )
+    """)
+    return conn
+
+def validate_params(mode, period, train_bars, test_bars):
+    """檢查回測參數，不合法時拋出 ValueError"""
+    if mode not in MODES:
+        raise ValueError(f"不支援的 mode: {mode}，可用值: {', '.join(MODES)}")
+    if period not in PERIODS:
+        raise ValueError(f"不支援的 period: {period}，可用值: {', '.join(PERIODS)}")
+    if not WINDOW + 20 <= train_bars <= 2520:
+        raise ValueError(f"train_bars 必須介於 {WINDOW + 20} 與 2520 之間")
+    if not 5 <= test_bars <= 252:
+        raise ValueError("test_bars 必須介於 5 與 252 之間")
+
+def model_version(mode, period, train_bars, test_bars):
+    """回測結果的模型版本：MODEL_VERSION 與所有回測參數"""
+    return f"v{MODEL_VERSION}-{mode}-{period}-w{WINDOW}-t{train_bars}-s{test_bars}"
+
+def fold_bounds(bars, train_bars, test_bars, max_folds=MAX_FOLDS):
+    """
+    回傳 [(train_start, test_start, test_end), ...]（依時間排序）
+
+    從最後一根K棒往前切出連續的 fold，最後一個 fold 的測試區段結束於最新的K棒；
+    每個 fold 的測試區段緊接在訓練區段之後，下一個 fold 的訓練區段往後移動 test_bars 根
+    """
+    folds = []
+    test_end = bars
+    while len(folds) < max_folds:
+        test_start = test_end - test_bars
+        train_start = test_start - train_bars
+        if train_start < 0:
+            break
+        folds.append((train_start, test_start, test_end))
+        test_end = test_start
+    return folds[::-1]
+
+def load_result(symbol, version, data_through):
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT result FROM backtests WHERE symbol = ? AND version = ? AND data_through = ?",
+            (symbol, version, data_through)
+        ).fetchone()
+    finally:
+        conn.close()
+    return json.loads(row[0]) if row else None
+
+def save_result(result):
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO backtests VALUES (?, ?, ?, ?, ?)",
+            (result["symbol"], result["version"], result["data_through"], time.time(),
+             json.dumps(result, ensure_ascii=False))
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def _history(symbol_full, period):
+    data = get_history(symbol_full, period=period)
+    if data.empty:
+        raise ValueError(f"無法獲取股票數據: {symbol_full}")
+    return data
+
+def find_result(symbol_full, mode='retrain', period='5y', train_bars=TRAIN_BARS, test_bars=TEST_BARS):
+    """
+    回傳 (已保存的回測結果或 None, 模型版本)
+
+    以最新K棒的日期查詢，有新的K棒時視為尚未回測
+    """
+    validate_params(mode, period, train_bars, test_bars)
+    version = model_version(mode, period, train_bars, test_bars)
+    data = _history(symbol_full, period)
+    if not fold_bounds(len(data), train_bars, test_bars):
+        raise ValueError(f"歷史資料不足以回測 (需要至少 {train_bars + test_bars} 根K棒，目前 {len(data)} 根)")
+    return load_result(symbol_full, version, data.index[-1].strftime('%Y-%m-%d')), version
+
+# ---- 行程池的子行程 ----
+
+def _init_worker(threads):
+    from .inferenceServer import configure_threads
+    configure_threads(threads, cpus='')
+
+def _fit_scaler(prices):
+    from sklearn.preprocessing import MinMaxScaler # type: ignore
+    return MinMaxScaler(feature_range=(0, 1)).fit(prices.reshape(-1, 1))
+
+def _predict(model, scaler, closes, test_start, test_end, window):
+    """測試區段每根K棒的單步預測（視窗為實際的前 window 根收盤價），回傳價格"""
+    from .lstmInference import rollout
+
+    segment = scaler.transform(closes[test_start - window:test_end].reshape(-1, 1))
+    predicted = rollout(model, make_windows(segment, window), days=1)
+    return scaler.inverse_transform(predicted.reshape(-1, 1)).reshape(-1)
+
+def run_retrain_fold(closes, bounds, window=WINDOW):
+    """以訓練區段擬合縮放器並訓練新模型，回傳測試區段的預測價格"""
+    from .stockLSTM import train_lstm_model
+
+    train_start, test_start, test_end = bounds
+    scaler = _fit_scaler(closes[train_start:test_start])
+    x, y = make_training_windows(scaler.transform(closes[train_start:test_start].reshape(-1, 1)), window)
+    model = train_lstm_model(x, y)
+    return _predict(model, scaler, closes, test_start, test_end, window)
+
+def run_fine_tune_chain(closes, folds, window=WINDOW):
+    """
+    第一個 fold 訓練新模型，之後每個 fold 只以上一個測試區段（訓練後新增的K棒）微調，
+    沿用第一個 fold 的縮放器；回傳每個 fold 測試區段的預測價格
+    """
+    from tensorflow.keras.optimizers import Adam # type: ignore
+    from .stockLSTM import train_lstm_model, FINE_TUNE_LEARNING_RATE, FINE_TUNE_EPOCHS
+
+    train_start, test_start, test_end = folds[0]
+    scaler = _fit_scaler(closes[train_start:test_start])
+    x, y = make_training_windows(scaler.transform(closes[train_start:test_start].reshape(-1, 1)), window)
+    model = train_lstm_model(x, y)
+    outputs = [_predict(model, scaler, closes, test_start, test_end, window)]
+
+    model.compile(optimizer=Adam(learning_rate=FINE_TUNE_LEARNING_RATE), loss='mean_squared_error')
+    for (_, previous_start, _), (_, test_start, test_end) in zip(folds, folds[1:]):
+        new_bars = scaler.transform(closes[previous_start - window:test_start].reshape(-1, 1))
+        x, y = make_training_windows(new_bars, window)
+        model.fit(x, y, epochs=FINE_TUNE_EPOCHS, batch_size=min(32, len(y)), verbose=0)
+        outputs.append(_predict(model, scaler, closes, test_start, test_end, window))
+    return outputs
+
+def _run_folds(closes, folds, mode):
+    """在 spawn 的行程池中執行所有 fold，回傳 (folds, test_bars) 的預測價格"""
+    workers = 1 if mode == 'fine_tune' else max(1, min(BACKTEST_WORKERS, len(folds)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                             initializer=_init_worker, initargs=(threads,)) as pool:
+        if mode == 'fine_tune':
+            outputs = pool.submit(run_fine_tune_chain, closes, folds).result()
+        else:
+            outputs = list(pool.map(run_retrain_fold, repeat(closes), folds))
+    return np.vstack(outputs)
+
+# ---- 指標 ----
+
+def fold_metrics(actual, predicted, previous):
+    """
+    每個 fold 的回測指標，輸入皆為 (folds, bars) 的價格陣列
+
+    - previous: 每個預測目標的前一根收盤價（預測當下已知的價格）
+    - hit_rate: 預測的漲跌方向與實際相同的比例 (%)
+    - pnl: 與 /api/lstm_predict 的 signal 相同，預測上漲為「買入」（做多一天）、否則為「賣出」（做空一天），
+      fold 內逐日複利的報酬
+    - naive_rmse: 以前一天收盤價作為預測的 RMSE（模型至少應優於此基準）
+    """
+    error = predicted - actual
+    predicted_move = predicted - previous
+    returns = actual / previous - 1
+    position = np.where(predicted_move > 0, 1.0, -1.0)
+    return {
+        "rmse": np.sqrt(np.mean(error ** 2, axis=1)),
+        "mape": np.mean(np.abs(error) / np.abs(actual), axis=1) * 100,
+        "hit_rate": np.mean(np.sign(predicted_move) == np.sign(actual - previous), axis=1) * 100,
+        "pnl": np.prod(1 + position * returns, axis=1) - 1,
+        "buy_and_hold": actual[:, -1] / previous[:, 0] - 1,
+        "naive_rmse": np.sqrt(np.mean((previous - actual) ** 2, axis=1)),
+    }
+
+def summarize_metrics(actual, predicted, previous, metrics):
+    """所有 fold 合併的指標（RMSE、MAPE、命中率以全部預測計算，報酬為各 fold 連續複利）"""
+    overall = fold_metrics(actual.reshape(1, -1), predicted.reshape(1, -1), previous.reshape(1, -1))
+    overall = {name: float(values[0]) for name, values in overall.items()}
+    overall["pnl"] = float(np.prod(1 + metrics["pnl"]) - 1)
+    overall["buy_and_hold"] = float(actual[-1, -1] / previous[0, 0] - 1)
+    return overall
+
+def run_backtest(symbol_full, mode='retrain', period='5y', train_bars=TRAIN_BARS, test_bars=TEST_BARS):
+    """
+    執行滾動前進回測並保存結果，已有相同模型版本與資料日期的結果時直接回傳
+
+    由 backtest_queue 在背景執行，訓練與推論在行程池的子行程中進行
+    """
+    validate_params(mode, period, train_bars, test_bars)
+    version = model_version(mode, period, train_bars, test_bars)
+    data = _history(symbol_full, period)
+    data_through = data.index[-1].strftime('%Y-%m-%d')
+    cached = load_result(symbol_full, version, data_through)
+    if cached is not None:
+        return cached
+
+    closes = data['Close'].to_numpy(dtype=np.float64)
+    folds = fold_bounds(len(closes), train_bars, test_bars)
+    if not folds:
+        raise ValueError(f"歷史資料不足以回測 (需要至少 {train_bars + test_bars} 根K棒，目前 {len(closes)} 根)")
+
+    start = time.perf_counter()
+    predicted = _run_folds(closes, folds, mode)
+
+    # (folds, test_bars) 的目標索引，實際價格與前一根收盤價一次取出
+    targets = np.array([test_start for _, test_start, _ in folds])[:, np.newaxis] + np.arange(test_bars)
+    actual, previous = closes[targets], closes[targets - 1]
+    metrics = fold_metrics(actual, predicted, previous)
+
+    dates = data.index.strftime('%Y-%m-%d')
+    result = {
+        "symbol": symbol_full,
+        "version": version,
+        "mode": mode,
+        "period": period,
+        "window": WINDOW,
+        "train_bars": train_bars,
+        "test_bars": test_bars,
+        "data_through": data_through,
+        "folds": [
+            {
+                "train_start": dates[train_start],
+                "test_start": dates[test_start],
+                "test_end": dates[test_end - 1],
+                **{name: float(values[i]) for name, values in metrics.items()},
+            }
+            for i, (train_start, test_start, test_end) in enumerate(folds)
+        ],
+        "overall": summarize_metrics(actual, predicted, previous, metrics),
+        "seconds": round(time.perf_counter() - start, 1),
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+    }
+    save_result(result)
+    return result
@@ -0,0 +1,380 @@
+"""
+快取後端
+
+ttlCache 的裝飾器透過相同的介面存取快取：
+get(key) -> (是否命中, 值)、set(key, value, ttl, size=None)、invalidate(kind=None)、stats()
+key 為 tuple，第一個元素為快取種類 (kind)。
+
+- MemoryBackend: 行程內的 OrderedDict，每個 gunicorn worker 各自一份
+- SQLiteBackend: data/cache.db，同一台機器上的所有 worker 共用，值以 pickle 保存；
+  讀取只執行 SELECT，不取得寫入鎖：最後存取時間超過 ACCESS_GRANULARITY 秒才更新，
+  命中/未命中次數先累計在行程內，每 STATS_FLUSH_SECONDS 秒（或寫入快取時）一次寫回
+- RedisBackend: Redis 協定的伺服器（需安裝 redis 套件），可跨機器共用；
+  建構時可傳入任何相容的 client（例如測試用的 fakeredis）
+
+以環境變數 STOCK_CACHE_BACKEND 選擇 memory / sqlite / redis，預設為 sqlite。
+"""
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd # type: ignore
+
+try:
+    import redis # type: ignore
+except ImportError:
+    redis = None
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'data', 'cache.db')
+
+# 快取總大小上限（位元組）
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+CACHE_BACKEND = os.environ.get('STOCK_CACHE_BACKEND', 'sqlite')
+REDIS_URL = os.environ.get('STOCK_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+STAT_FIELDS = ("hits", "misses", "evictions", "expirations")
+
+# SQLiteBackend：命中時最後存取時間（LRU 淘汰依據）超過此秒數才寫回
+ACCESS_GRANULARITY = 60
+
+# SQLiteBackend：行程內累計的統計寫回資料庫的間隔秒數
+STATS_FLUSH_SECONDS = 10
+
+def _sizeof(value):
+    """估算快取項目佔用的位元組數"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return sys.getsizeof(value)
+
+def _key_text(key):
+    # 快取鍵由字串、數字組成的 tuple，repr 在各行程間一致
+    return repr(key)
+
+class MemoryBackend:
+    """行程內的 TTL + LRU 快取"""
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (value, 到期時間, 大小)，順序即為 LRU 順序（最後面為最近使用）
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._stats = {}
+
+    def _count(self, kind, field):
+        stats = self._stats.setdefault(kind, dict.fromkeys(STAT_FIELDS, 0))
+        stats[field] += 1
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        """回傳 (是否命中, 值)"""
+        kind = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._count(kind, "misses")
+                return False, None
+            value, expires_at, _ = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                self._count(kind, "expirations")
+                self._count(kind, "misses")
+                return False, None
+            self._entries.move_to_end(key)
+            self._count(kind, "hits")
+            return True, value
+
+    def set(self, key, value, ttl, size=None):
+        if ttl <= 0:
+            return
+        size = _sizeof(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.time() + ttl, size)
+            self._bytes += size
+            # 超過大小上限時淘汰最久未使用的項目
+            while self._bytes > self.max_bytes:
+                old_key = next(iter(self._entries))
+                self._remove(old_key)
+                self._count(old_key[0], "evictions")
+
+    def invalidate(self, kind=None):
+        """清除指定種類（或全部）的項目"""
+        with self._lock:
+            for key in [k for k in self._entries if kind is None or k[0] == kind]:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            entries = {}
+            for key, (_, _, size) in self._entries.items():
+                item = entries.setdefault(key[0], {"entries": 0, "bytes": 0})
+                item["entries"] += 1
+                item["bytes"] += size
+            return {
+                "backend": "memory",
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "entries": len(self._entries),
+                "kinds": {
+                    kind: dict(stats, **entries.get(kind, {"entries": 0, "bytes": 0}))
+                    for kind, stats in self._stats.items()
+                },
+            }
+
+class SQLiteBackend:
+    """以 SQLite 檔案保存的 TTL + LRU 快取，同一台機器上的所有行程共用"""
+
+    def __init__(self, db_path=DB_PATH, max_bytes=MAX_CACHE_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        # 尚未寫回資料庫的統計 {kind: {field: 次數}}
+        self._stats_lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.time()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS stats (
+                    kind TEXT PRIMARY KEY,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0,
+                    evictions INTEGER NOT NULL DEFAULT 0,
+                    expirations INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, conn, kind, field, amount=1):
+        conn.execute("INSERT OR IGNORE INTO stats (kind) VALUES (?)", (kind,))
+        conn.execute(f"UPDATE stats SET {field} = {field} + ? WHERE kind = ?", (amount, kind))
+
+    def _record(self, kind, field):
+        """在行程內累計統計，稍後由 _flush_stats 或 set 寫回"""
+        with self._stats_lock:
+            stats = self._pending.setdefault(kind, dict.fromkeys(STAT_FIELDS, 0))
+            stats[field] += 1
+
+    def _take_pending(self):
+        with self._stats_lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.time()
+        return pending
+
+    def _write_stats(self, conn, pending):
+        """將累計的統計寫回（需在交易中呼叫）"""
+        for kind, counts in pending.items():
+            for field, amount in counts.items():
+                if amount:
+                    self._count(conn, kind, field, amount)
+
+    def _flush_stats(self, force=False):
+        if not force and time.time() - self._last_flush < STATS_FLUSH_SECONDS:
+            return
+        pending = self._take_pending()
+        if not pending:
+            return
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_stats(conn, pending)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, key):
+        kind = key[0]
+        key_text = _key_text(key)
+        conn = self._connect()
+        now = time.time()
+        # 只讀取，不開啟寫入交易；過期的項目留給 set 的 _evict 刪除
+        row = conn.execute(
+            "SELECT value, expires_at, accessed_at FROM entries WHERE key = ?", (key_text,)
+        ).fetchone()
+        if row is None:
+            self._record(kind, "misses")
+            hit = False
+        elif row[1] <= now:
+            self._record(kind, "expirations")
+            self._record(kind, "misses")
+            hit = False
+        else:
+            if now - row[2] > ACCESS_GRANULARITY:
+                conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key_text))
+            self._record(kind, "hits")
+            hit = True
+        self._flush_stats()
+        return (True, pickle.loads(row[0])) if hit else (False, None)
+
+    def set(self, key, value, ttl, size=None):
+        if ttl <= 0:
+            return
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (_key_text(key), key[0], data, len(data), now + ttl, now)
+            )
+            self._evict(conn, now)
+            # 已持有寫入鎖，順便寫回累計的統計
+            self._write_stats(conn, self._take_pending())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn, now):
+        """先移除過期項目，仍超過大小上限時依最後存取時間淘汰"""
+        conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = {}
+        for key, kind, size in conn.execute(
+            "SELECT key, kind, size FROM entries ORDER BY accessed_at"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted[kind] = evicted.get(kind, 0) + 1
+        for kind, amount in evicted.items():
+            self._count(conn, kind, "evictions", amount)
+
+    def invalidate(self, kind=None):
+        conn = self._connect()
+        if kind is None:
+            conn.execute("DELETE FROM entries")
+        else:
+            conn.execute("DELETE FROM entries WHERE kind = ?", (kind,))
+
+    def stats(self):
+        self._flush_stats(force=True)
+        conn = self._connect()
+        entries = {
+            kind: {"entries": count, "bytes": size}
+            for kind, count, size in conn.execute(
+                "SELECT kind, COUNT(*), SUM(size) FROM entries GROUP BY kind"
+            )
+        }
+        counters = {
+            row[0]: dict(zip(STAT_FIELDS, row[1:]))
+            for row in conn.execute(f"SELECT kind, {', '.join(STAT_FIELDS)} FROM stats")
+        }
+        kinds = {
+            kind: dict(counters.get(kind, dict.fromkeys(STAT_FIELDS, 0)),
+                       **entries.get(kind, {"entries": 0, "bytes": 0}))
+            for kind in sorted(set(counters) | set(entries))
+        }
+        return {
+            "backend": "sqlite",
+            "bytes": sum(item["bytes"] for item in entries.values()),
+            "max_bytes": self.max_bytes,
+            "entries": sum(item["entries"] for item in entries.values()),
+            "kinds": kinds,
+        }
+
+class RedisBackend:
+    """
+    Redis 協定的共用快取
+
+    到期由 Redis 的 PX 處理；大小上限與 LRU 淘汰請在伺服器設定
+    maxmemory 與 maxmemory-policy allkeys-lru
+    """
+    PREFIX = 'stock_app:cache:'
+
+    def __init__(self, client=None, url=REDIS_URL):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("使用 Redis 快取需安裝 redis 套件")
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def _count(self, kind, field):
+        self.client.hincrby(f"{self.PREFIX}stats:{kind}", field, 1)
+
+    def get(self, key):
+        data = self.client.get(self.PREFIX + _key_text(key))
+        if data is None:
+            self._count(key[0], "misses")
+            return False, None
+        self._count(key[0], "hits")
+        return True, pickle.loads(data)
+
+    def set(self, key, value, ttl, size=None):
+        if ttl <= 0:
+            return
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        pipe = self.client.pipeline()
+        pipe.set(self.PREFIX + _key_text(key), data, px=int(ttl * 1000))
+        pipe.sadd(f"{self.PREFIX}kinds", key[0])
+        pipe.execute()
+
+    def invalidate(self, kind=None):
+        pattern = f"{self.PREFIX}({kind!r},*" if kind is not None else f"{self.PREFIX}(*"
+        for name in self.client.scan_iter(match=pattern):
+            self.client.delete(name)
+
+    def stats(self):
+        kinds = {}
+        for kind in self.client.smembers(f"{self.PREFIX}kinds"):
+            kind = kind.decode() if isinstance(kind, bytes) else kind
+            raw = self.client.hgetall(f"{self.PREFIX}stats:{kind}")
+            counters = {
+                (k.decode() if isinstance(k, bytes) else k): int(v) for k, v in raw.items()
+            }
+            kinds[kind] = {field: counters.get(field, 0) for field in STAT_FIELDS}
+        return {"backend": "redis", "kinds": kinds}
+
+def create_backend(name=CACHE_BACKEND):
+    """依名稱建立快取後端，Redis 無法使用時改用 SQLite"""
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'redis':
+        try:
+            backend = RedisBackend()
+            backend.client.ping()
+            return backend
+        except Exception as e:
+            print(f"無法連線 Redis 快取，改用 SQLite: {e}")
+    return SQLiteBackend()
@@ -0,0 +1,260 @@
+"""
+美股分類資料背景更新工作
+
+逐檔抓取 us_stock_list.csv 內股票的 .info 需要數小時，因此不在 HTTP 請求中執行。
+/api/categories 只回傳上一次完成的結果與更新進度，需要更新時在背景執行緒啟動本工作。
+
+同一時間只允許一個更新在執行：行程內以 threading.Lock 控制，
+多個 gunicorn worker 之間則以 data/category_refresh.lock 的檔案鎖控制。
+進度寫在 data/category_refresh_status.json，任一 worker 都能讀取。
+"""
+import json
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd # type: ignore
+import yfinance as yf # type: ignore
+
+from .rateLimiter import yahoo_session, retry_on_429
+from .fileLock import acquire_file_lock, release_file_lock
+
+DATA_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'data')
+CSV_PATH = os.path.join(DATA_DIR, 'us_stock_list.csv')
+JSON_PATH = os.path.join(DATA_DIR, 'us_stock_categories.json')
+PROGRESS_PATH = os.path.join(DATA_DIR, 'fetch_progress.json')
+CHECKPOINT_PATH = os.path.join(DATA_DIR, 'fetch_progress.jsonl')
+STATUS_PATH = os.path.join(DATA_DIR, 'category_refresh_status.json')
+LOCK_PATH = os.path.join(DATA_DIR, 'category_refresh.lock')
+
+BATCH_SIZE = 100  # 每批次的股票數量
+MAX_WORKERS = 10  # 背景工作自己的執行緒數量
+
+# 上一次結果超過此秒數即視為過期，請求時會在背景啟動更新
+SNAPSHOT_MAX_AGE = 24 * 60 * 60
+
+_local_lock = threading.Lock()
+
+def _write_json_atomic(path, data):
+    """先寫入暫存檔再取代，避免讀取到寫到一半的檔案"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _update_status(**fields):
+    status = read_status()
+    status.update(fields)
+    _write_json_atomic(STATUS_PATH, status)
+
+def is_running():
+    """是否有任一行程正在執行更新"""
+    if _local_lock.locked():
+        return True
+    handle = acquire_file_lock(LOCK_PATH)
+    if handle is None:
+        return True
+    release_file_lock(handle)
+    return False
+
+def read_status():
+    """讀取更新進度"""
+    status = {
+        "state": "idle",
+        "started_at": None,
+        "finished_at": None,
+        "processed": 0,
+        "total": 0,
+        "error": None,
+    }
+    if os.path.exists(STATUS_PATH):
+        try:
+            with open(STATUS_PATH, 'r', encoding='utf-8') as f:
+                status.update(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            pass
+    return status
+
+def job_status():
+    """更新進度，並辨識因行程中止而停在 running 的狀態"""
+    status = read_status()
+    if status["state"] == "running" and not is_running():
+        status["state"] = "interrupted"
+    return status
+
+def load_snapshot():
+    """回傳 (上一次完成的分類資料, 完成時間)，尚無資料時為 ([], None)"""
+    if not os.path.exists(JSON_PATH):
+        return [], None
+    try:
+        with open(JSON_PATH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return [], None
+    return data, datetime.fromtimestamp(os.path.getmtime(JSON_PATH))
+
+def snapshot_is_stale(updated_at):
+    return updated_at is None or (datetime.now() - updated_at).total_seconds() > SNAPSHOT_MAX_AGE
+
+def start_refresh():
+    """
+    在背景執行緒啟動更新
+
+    回傳 True 表示已啟動；已有更新在執行（本行程或其他 worker）時回傳 False
+    """
+    if not _local_lock.acquire(blocking=False):
+        return False
+    handle = acquire_file_lock(LOCK_PATH)
+    if handle is None:
+        _local_lock.release()
+        return False
+
+    # 在回傳前寫入 running，讓同一個請求就能看到更新已啟動
+    _update_status(
+        state="running",
+        started_at=datetime.now().isoformat(timespec='seconds'),
+        finished_at=None,
+        processed=0,
+        total=0,
+        error=None,
+    )
+    thread = threading.Thread(target=_run, args=(handle,), name='category-refresh', daemon=True)
+    thread.start()
+    return True
+
+def _run(handle):
+    try:
+        refresh_categories()
+        _update_status(state="completed", finished_at=datetime.now().isoformat(timespec='seconds'))
+    except Exception as e:
+        print(f"更新美股分類資料失敗: {e}")
+        _update_status(state="failed", error=str(e), finished_at=datetime.now().isoformat(timespec='seconds'))
+    finally:
+        release_file_lock(handle)
+        _local_lock.release()
+
+@retry_on_429(max_retries=10)
+def _fetch_info(symbol):
+    return yf.Ticker(symbol, session=yahoo_session).info
+
+def fetch_stock_data(symbol):
+    # 速率由共用的 RateLimitedSession 控制，不再於每次請求前 sleep
+    try:
+        info = _fetch_info(symbol)
+    except Exception as e:
+        print(f"Error fetching data for {symbol}: {e}")
+        return None
+    if not info:
+        print(f"Invalid symbol: {symbol}")
+        return None
+
+    previous_close = info.get("previousClose", 0)
+    current_price = info.get("currentPrice", 0)
+    change = round((current_price - previous_close) / previous_close * 100, 2) if previous_close else 0
+
+    return {
+        "ticker": symbol,
+        "name": info.get("shortName", "N/A"),
+        "sector": info.get("sector", "Unknown"),
+        "industry": info.get("industry", "Unknown"),
+        "marketCap": info.get("marketCap", 0),
+        "change": change,
+        "current_price": current_price,
+        "date": datetime.now().strftime('%Y-%m-%d')
+    }
+
+def load_checkpoint(date):
+    """
+    讀取當日的 JSON-lines 檢查點，回傳 {ticker: 資料}
+
+    第一行為 {"date": ...}，之後每行一筆股票資料；
+    程式中止時最後一行可能只寫了一半，該行會被忽略並在下次執行時重新抓取
+    """
+    records = {}
+    if not os.path.exists(CHECKPOINT_PATH):
+        return records
+
+    with open(CHECKPOINT_PATH, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    try:
+        header = json.loads(lines[0]) if lines else {}
+    except json.JSONDecodeError:
+        return records
+    if header.get('date') != date:
+        return records
+
+    for line in lines[1:]:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        records[record['ticker']] = record
+    return records
+
+def _open_checkpoint(date, resumed):
+    """開啟檢查點準備附加寫入，不是接續當日進度時重新建立"""
+    if resumed:
+        f = open(CHECKPOINT_PATH, 'a', encoding='utf-8')
+        # 確保新的紀錄從新的一行開始（上一次可能中止在行中間）
+        if f.tell() > 0:
+            f.write('\n')
+        return f
+    f = open(CHECKPOINT_PATH, 'w', encoding='utf-8')
+    f.write(json.dumps({"date": date}) + '\n')
+    f.flush()
+    return f
+
+def refresh_categories():
+    """抓取所有美股的分類與報價，完成後寫入 us_stock_categories.json"""
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    # 今天已完成過，只需重新輸出結果
+    if os.path.exists(PROGRESS_PATH):
+        try:
+            with open(PROGRESS_PATH, 'r', encoding='utf-8') as f:
+                progress_data = json.load(f)
+            if progress_data.get('date') == today and 'last_processed' not in progress_data:
+                sorted_data = sorted(progress_data.get('data', []), key=lambda x: x.get('ticker', ''))
+                _write_json_atomic(JSON_PATH, sorted_data)
+                return sorted_data
+        except json.JSONDecodeError:
+            pass
+
+    # 繼續處理未完成的進度：以已完成的股票代號集合判斷，而非最後處理的代號
+    records = load_checkpoint(today)
+    df = pd.read_csv(CSV_PATH)
+    pending = df[~df['Symbol'].isin(records.keys())]
+
+    total_stocks = len(df)
+    num_batches = math.ceil(len(pending) / BATCH_SIZE)
+    processed = total_stocks - len(pending)
+    _update_status(total=total_stocks, processed=processed)
+    if records:
+        print(f"從檢查點繼續，已完成 {len(records)} 檔")
+
+    with _open_checkpoint(today, bool(records)) as checkpoint, \
+            ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for batch_num in range(num_batches):
+            batch_df = pending.iloc[batch_num * BATCH_SIZE:(batch_num + 1) * BATCH_SIZE]
+
+            futures = {executor.submit(fetch_stock_data, symbol): symbol for symbol in batch_df['Symbol']}
+            for future in as_completed(futures):
+                result = future.result()
+                if result:
+                    records[result['ticker']] = result
+                    # 每成功獲取一筆數據就附加一行到檢查點
+                    checkpoint.write(json.dumps(result, ensure_ascii=False) + '\n')
+                    checkpoint.flush()
+
+            processed += len(batch_df)
+            _update_status(processed=processed)
+            print(f"Completed batch {batch_num + 1}/{num_batches}")
+
+    # 所有批次完成後，以原子方式寫入最終結果並移除檢查點
+    sorted_data = sorted(records.values(), key=lambda x: x.get('ticker', ''))
+    _write_json_atomic(PROGRESS_PATH, {"date": today, "data": sorted_data})
+    _write_json_atomic(JSON_PATH, sorted_data)
+    os.remove(CHECKPOINT_PATH)
+    return sorted_data
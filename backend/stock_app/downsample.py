@@ -0,0 +1,83 @@
+"""
+圖表資料降採樣
+
+長期間或分鐘線的原始 K 棒數量過多時，在伺服器端先降到 max_points 個點再回傳：
+- K 線圖使用 OHLC 分桶聚合（開盤取第一根、最高取最大、最低取最小、收盤取最後一根、成交量加總）
+- 折線圖使用 LTTB (Largest-Triangle-Three-Buckets) 挑選最能保留形狀的點
+
+指標必須先以完整解析度計算，再由這裡取每個分桶最後一根 K 棒的值。
+"""
+import numpy as np
+
+def bucket_starts(length, max_points):
+    """將 length 根 K 棒平均分成 max_points 個分桶，回傳每個分桶的起始位置"""
+    if max_points <= 0 or length <= max_points:
+        return np.arange(length)
+    return np.unique(np.linspace(0, length, max_points, endpoint=False).astype(np.int64))
+
+def ohlc_buckets(data, max_points):
+    """
+    以 OHLC 分桶聚合降採樣
+
+    參數:
+    - data: 含 Open/High/Low/Close/Volume 欄位、以日期為索引的 DataFrame
+    - max_points: 最多保留的點數
+
+    回傳 (聚合後的 DataFrame（索引為各分桶最後一根的日期）, 各分桶最後一根的位置)
+
+    分桶的日期、收盤價與路由取樣的指標值都對應同一根（最後一根）K 棒，
+    降採樣後的 MA、BIAS 不會相對於 K 棒偏移
+    """
+    length = len(data)
+    starts = bucket_starts(length, max_points)
+    ends = np.append(starts[1:], length) - 1
+    if len(starts) == length:
+        return data, ends
+
+    aggregated = data.iloc[ends].copy()
+    aggregated['Open'] = data['Open'].to_numpy()[starts]
+    aggregated['High'] = np.maximum.reduceat(data['High'].to_numpy(), starts)
+    aggregated['Low'] = np.minimum.reduceat(data['Low'].to_numpy(), starts)
+    aggregated['Volume'] = np.add.reduceat(data['Volume'].to_numpy(), starts)
+    return aggregated, ends
+
+def lttb_indices(values, max_points):
+    """
+    以 LTTB 挑選折線圖要保留的點，回傳位置陣列（包含第一個與最後一個點）
+
+    values 中的 NaN 以前一個有效值計算面積，避免整個分桶被忽略
+    """
+    length = len(values)
+    if max_points <= 0 or length <= max_points or max_points < 3:
+        return np.arange(length)
+
+    y = np.asarray(values, dtype=np.float64)
+    if np.isnan(y).any():
+        valid = ~np.isnan(y)
+        filled = np.where(valid, np.arange(length), 0)
+        np.maximum.accumulate(filled, out=filled)
+        y = np.nan_to_num(y[filled])
+    x = np.arange(length, dtype=np.float64)
+
+    # 第一個與最後一個點固定保留，中間的點分成 max_points - 2 個分桶
+    edges = np.linspace(1, length - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+
+    previous = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        # 下一個分桶的平均點（最後一個分桶則使用最後一個點）
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else length
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # 與前一個選取點、下一分桶平均點形成的三角形面積最大者
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
@@ -0,0 +1,36 @@
+"""
+跨行程檔案鎖
+
+多個 gunicorn worker 之間以檔案鎖確保同一時間只有一個行程執行某項背景工作
+（美股分類更新、模型重新訓練排程）。Linux/macOS 使用 fcntl，Windows 使用 msvcrt。
+"""
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt # type: ignore
+
+def acquire_file_lock(path):
+    """以非阻塞方式取得跨行程檔案鎖，失敗時回傳 None"""
+    handle = open(path, 'a+')
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+def release_file_lock(handle):
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        handle.close()
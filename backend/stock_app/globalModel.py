@@ -0,0 +1,261 @@
+"""
+全域 (多股票) LSTM 模型
+
+每檔股票各自一個 .keras 與縮放器時，新股票第一次預測前一定要先訓練。
+全域模型以多檔股票的視窗一起訓練，任何股票都能直接使用同一個已載入的模型：
+- 價格以對數價格表示，並以視窗最後一根收盤價為基準歸一化（每個視窗各自歸一化，不需要事先擬合縮放器）
+- 股票代號與產業以雜湊分桶後經過 Embedding；訓練時隨機以「未知股票」取代部分代號，
+  讓沒看過的股票也能得到合理的預測
+- 模型存放在 MODEL_DIR 的 __global__ 檔案，經由模型登錄表載入；
+  縮放器檔案的位置改存模型的中繼資料（視窗長度、分桶數、訓練股票）
+"""
+import json
+import os
+import zlib
+from datetime import datetime
+
+import numpy as np
+import tensorflow as tf # type: ignore
+from tensorflow.keras.models import Model # type: ignore
+from tensorflow.keras.layers import LSTM, Dense, Dropout, Input, Embedding, Flatten # type: ignore
+from tensorflow.keras.optimizers import Adam # type: ignore
+from tensorflow.keras.callbacks import EarlyStopping # type: ignore
+
+from .stockStore import get_history
+from .categoryJob import load_snapshot, JSON_PATH as US_CATEGORIES_PATH
+from .modelRegistry import GLOBAL_SYMBOL, registry, save_model_files
+from .lstmInference import infer
+from .windowing import make_windows, make_training_windows
+
+WINDOW = 60
+SYMBOL_BUCKETS = 4096   # 第 0 桶保留給未知股票
+SECTOR_BUCKETS = 64     # 第 0 桶保留給未知產業
+
+# 訓練時以未知股票取代代號的比例
+SYMBOL_DROPOUT = 0.1
+
+# 未指定股票時，以市值最大的美股訓練
+DEFAULT_TRAINING_SYMBOLS = 200
+TRAINING_PERIOD = '2y'
+
+TW_CATEGORIES_PATH = os.path.join(os.path.dirname(__file__), 'data', 'tw_stock_categories.json')
+
+_sector_cache = {"mtimes": None, "sectors": {}}
+
+def _bucket(value, buckets):
+    """以 crc32 將字串穩定地分到 1..buckets-1，空值為 0"""
+    if not value:
+        return 0
+    return 1 + zlib.crc32(value.encode('utf-8')) % (buckets - 1)
+
+def symbol_id(symbol):
+    return _bucket(symbol, SYMBOL_BUCKETS)
+
+def _mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+def _sector_map():
+    """{股票代號: 產業}，美股分類快照或台股產業檔案更新時重新建立"""
+    mtimes = (_mtime(US_CATEGORIES_PATH), _mtime(TW_CATEGORIES_PATH))
+    if _sector_cache["mtimes"] != mtimes:
+        stocks, _ = load_snapshot()
+        sectors = {stock.get('ticker'): stock.get('sector') for stock in stocks}
+        if mtimes[1] is not None:
+            try:
+                with open(TW_CATEGORIES_PATH, 'r', encoding='utf-8') as f:
+                    for category in json.load(f).get('categories', []):
+                        for stock in category.get('stocks', []):
+                            sectors[f"{stock.get('ticker')}.TW"] = category.get('industry')
+            except (OSError, json.JSONDecodeError):
+                pass
+        _sector_cache.update(mtimes=mtimes, sectors=sectors)
+    return _sector_cache["sectors"]
+
+def sector_of(symbol):
+    """股票所屬產業，找不到時為 None"""
+    return _sector_map().get(symbol)
+
+def sector_id(symbol):
+    return _bucket(sector_of(symbol), SECTOR_BUCKETS)
+
+def create_global_model(window=WINDOW, dropout_rate=0.2):
+    """價格視窗 + 股票/產業 Embedding 的單一模型"""
+    price_input = Input(shape=(window, 1), name='price_input')
+    symbol_input = Input(shape=(1,), name='symbol_input', dtype='int32')
+    sector_input = Input(shape=(1,), name='sector_input', dtype='int32')
+
+    x = LSTM(units=64, return_sequences=True)(price_input)
+    x = Dropout(dropout_rate)(x)
+    x = LSTM(units=32, return_sequences=False)(x)
+    x = Dropout(dropout_rate)(x)
+
+    symbol_vector = Flatten()(Embedding(SYMBOL_BUCKETS, 8, name='symbol_embedding')(symbol_input))
+    sector_vector = Flatten()(Embedding(SECTOR_BUCKETS, 4, name='sector_embedding')(sector_input))
+
+    x = tf.keras.layers.concatenate([x, symbol_vector, sector_vector])
+    x = Dense(units=32, activation='relu')(x)
+    output = Dense(units=1)(x)
+
+    model = Model(inputs=[price_input, symbol_input, sector_input], outputs=output)
+    model.compile(optimizer=Adam(learning_rate=0.001), loss='mean_squared_error')
+    return model
+
+def normalize_windows(log_windows):
+    """以每個視窗最後一個值為基準：(B, window) -> (B, window, 1)"""
+    return (log_windows - log_windows[:, -1:])[:, :, np.newaxis]
+
+def default_training_symbols(limit=DEFAULT_TRAINING_SYMBOLS):
+    """美股分類快照中市值最大的股票"""
+    stocks, _ = load_snapshot()
+    stocks = sorted(stocks, key=lambda s: s.get('marketCap') or 0, reverse=True)
+    return [s['ticker'] for s in stocks[:limit]]
+
+def build_training_set(symbols, window=WINDOW, period=TRAINING_PERIOD, seed=0):
+    """彙整多檔股票的視窗，回傳 ([x, symbol_ids, sector_ids], y, 實際使用的股票)"""
+    xs, ys, symbol_ids, sector_ids, used = [], [], [], [], []
+    for symbol in symbols:
+        try:
+            closes = get_history(symbol, period=period)['Close'].to_numpy(dtype=np.float64)
+        except Exception as e:
+            print(f"略過 {symbol}: {e}")
+            continue
+        closes = closes[np.isfinite(closes) & (closes > 0)]
+        if len(closes) <= window:
+            continue
+
+        log_prices = np.log(closes).astype(np.float32)
+        x, y = make_training_windows(log_prices, window)
+        anchors = x[:, -1, 0]
+        xs.append(normalize_windows(x[:, :, 0]))
+        ys.append(y - anchors)
+        symbol_ids.append(np.full(len(y), symbol_id(symbol), dtype=np.int32))
+        sector_ids.append(np.full(len(y), sector_id(symbol), dtype=np.int32))
+        used.append(symbol)
+
+    if not xs:
+        raise ValueError("沒有可用於訓練全域模型的股票資料")
+
+    x = np.concatenate(xs)
+    y = np.concatenate(ys)
+    symbols_column = np.concatenate(symbol_ids)
+    sectors_column = np.concatenate(sector_ids)
+
+    # 打亂順序（validation_split 取最後一段），並隨機將部分股票代號換成未知
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(y))
+    x, y, symbols_column, sectors_column = x[order], y[order], symbols_column[order], sectors_column[order]
+    symbols_column[rng.random(len(y)) < SYMBOL_DROPOUT] = 0
+    return [x, symbols_column[:, np.newaxis], sectors_column[:, np.newaxis]], y, used
+
+def train_global_model(symbols=None, window=WINDOW):
+    """訓練全域模型並保存（由 training_queue 在背景執行），回傳訓練摘要"""
+    symbols = symbols or default_training_symbols()
+    inputs, y, used = build_training_set(symbols, window)
+
+    model = create_global_model(window)
+    early_stopping = EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True)
+    history = model.fit(inputs, y, epochs=15, batch_size=256, verbose=0,
+                        validation_split=0.1, callbacks=[early_stopping])
+
+    meta = {
+        "window": window,
+        "symbol_buckets": SYMBOL_BUCKETS,
+        "sector_buckets": SECTOR_BUCKETS,
+        "symbols": used,
+        "trained_at": datetime.now().isoformat(timespec='seconds'),
+    }
+    save_model_files(GLOBAL_SYMBOL, False, model, meta)
+    registry.put(GLOBAL_SYMBOL, False, model, meta)
+
+    return {
+        "symbols": len(used),
+        "samples": int(len(y)),
+        "val_loss": float(min(history.history.get('val_loss', [np.nan]))),
+    }
+
+def global_model_exists():
+    return registry.exists(GLOBAL_SYMBOL, False)
+
+def load_global_model():
+    """回傳 (model, meta, 模型檔案 mtime)"""
+    return registry.get(GLOBAL_SYMBOL, False)
+
+def _id_inputs(symbols, trained_symbols):
+    """
+    推論用的代號與產業編號
+
+    訓練時沒看過的股票一律使用第 0 桶（訓練時以 SYMBOL_DROPOUT 學到的「未知股票」），
+    否則會取得沒有訓練過的 embedding，或與另一檔訓練過的股票落在同一桶
+    """
+    trained_symbols = set(trained_symbols)
+    symbol_ids = np.array([[symbol_id(s) if s in trained_symbols else 0] for s in symbols], dtype=np.int32)
+    sector_ids = np.array([[sector_id(s)] for s in symbols], dtype=np.int32)
+    return symbol_ids, sector_ids
+
+def predict_next(model, symbols, closes_windows, trained_symbols):
+    """
+    單步預測（用於評估）
+
+    closes_windows: (B, window) 收盤價；trained_symbols: 模型中繼資料的訓練股票；回傳 (B,) 下一根收盤價
+    """
+    log_windows = np.log(np.asarray(closes_windows, dtype=np.float32))
+    symbol_ids, sector_ids = _id_inputs(symbols, trained_symbols)
+    output = infer(model, [normalize_windows(log_windows), symbol_ids, sector_ids])[:, 0]
+    return np.exp(log_windows[:, -1] + output)
+
+def global_rollout(model, symbols, closes_windows, trained_symbols, days=7):
+    """
+    多檔股票一起自回歸預測未來 days 天的收盤價
+
+    closes_windows: (B, window) 最近的收盤價；回傳 (B, days)
+    每一步都以目前視窗的最後一個值重新歸一化，全部股票共用 days 次批次推論
+    """
+    closes_windows = np.asarray(closes_windows, dtype=np.float32)
+    batch, window = closes_windows.shape
+    symbol_ids, sector_ids = _id_inputs(symbols, trained_symbols)
+
+    log_prices = np.empty((batch, window + days), dtype=np.float32)
+    log_prices[:, :window] = np.log(closes_windows)
+    for day in range(days):
+        current = log_prices[:, day:day + window]
+        output = infer(model, [normalize_windows(current), symbol_ids, sector_ids])[:, 0]
+        log_prices[:, window + day] = current[:, -1] + output
+    return np.exp(log_prices[:, window:])
+
+def forecast_global_many(model, meta, jobs, days=7):
+    """
+    全域模型的多個預測請求一起推論（推論服務一次收集的請求）
+
+    jobs: [(symbol, closes), ...]；所有請求的歷史視窗串接成一次單步預測，未來價格一起遞推。
+    回傳與 jobs 順序相同的 {"predicted": 對應 closes[window:] 的單步預測, "future": (days,),
+    "window", "trained_symbols"}，資料不足的請求為 ValueError
+    """
+    window = meta.get("window", WINDOW)
+    results = [None] * len(jobs)
+    valid = []
+    for i, (symbol, closes) in enumerate(jobs):
+        if len(closes) <= window:
+            results[i] = ValueError(f"數據不足以進行預測 (需要至少 {window + 1} 個數據點)")
+        else:
+            valid.append(i)
+    if not valid:
+        return results
+
+    closes = [np.asarray(jobs[i][1], dtype=np.float64) for i in valid]
+    symbols = [jobs[i][0] for i in valid]
+    windows = [make_windows(values, window)[:, :, 0] for values in closes]
+    counts = [len(x) for x in windows]
+    trained_symbols = meta.get("symbols", [])
+    predicted = predict_next(model, np.repeat(symbols, counts).tolist(), np.concatenate(windows), trained_symbols)
+    future = global_rollout(model, symbols, np.stack([values[-window:] for values in closes]),
+                            trained_symbols, days)
+
+    offsets = np.cumsum([0] + counts)
+    for n, i in enumerate(valid):
+        results[i] = {
+            "predicted": predicted[offsets[n]:offsets[n + 1]],
+            "future": future[n],
+            "window": window,
+            "trained_symbols": len(trained_symbols),
+        }
+    return results
@@ -0,0 +1,124 @@
+"""
+技術指標計算引擎
+
+路由以宣告式的指標規格 (indicator spec) 描述需要的欄位，引擎會：
+1. 合併相同的規格，每個 TA-Lib 函數只呼叫一次
+2. 以連續記憶體的 float64 NumPy 陣列作為輸入
+3. 依 (股票代號, K棒區間, 規格) 快取結果，不同路由對同一份資料可共用計算
+"""
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+from talib import SMA, EMA, WMA, KAMA, RSI, STOCH, STOCHRSI, STOCHF, MACD # type: ignore
+
+# name: 指標名稱, params: 排序後的參數 tuple, output: 多輸出指標要取第幾個輸出
+IndicatorSpec = namedtuple('IndicatorSpec', ['name', 'params', 'output'])
+
+# 指標名稱 -> (TA-Lib 函數, 需要的價格欄位)
+TALIB_FUNCTIONS = {
+    'SMA': (SMA, ('close',)),
+    'EMA': (EMA, ('close',)),
+    'WMA': (WMA, ('close',)),
+    'KAMA': (KAMA, ('close',)),
+    'RSI': (RSI, ('close',)),
+    'MACD': (MACD, ('close',)),
+    'STOCHRSI': (STOCHRSI, ('close',)),
+    'STOCH': (STOCH, ('high', 'low', 'close')),
+    'STOCHF': (STOCHF, ('high', 'low', 'close')),
+}
+
+# 由其他指標推導的指標
+DERIVED_INDICATORS = ('BIAS',)
+
+# 快取最多保留的計算結果數量
+MAX_CACHE_ENTRIES = 1024
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def indicator(name, output=0, **params):
+    """建立指標規格，例如 indicator('SMA', timeperiod=5)、indicator('MACD', 1, fastperiod=12, ...)"""
+    if name not in TALIB_FUNCTIONS and name not in DERIVED_INDICATORS:
+        raise ValueError(f"不支援的指標: {name}")
+    return IndicatorSpec(name, tuple(sorted(params.items())), output)
+
+def price_arrays(data):
+    """將 DataFrame 的價格欄位轉為連續的 float64 陣列"""
+    return {
+        'close': np.ascontiguousarray(data['Close'].to_numpy(), dtype=np.float64),
+        'high': np.ascontiguousarray(data['High'].to_numpy(), dtype=np.float64),
+        'low': np.ascontiguousarray(data['Low'].to_numpy(), dtype=np.float64),
+    }
+
+def _arrays_digest(arrays):
+    """價格陣列內容的雜湊（作為快取鍵的一部分）"""
+    digest = hashlib.blake2b(digest_size=16)
+    for name in sorted(arrays):
+        digest.update(arrays[name].tobytes())
+    return digest.hexdigest()
+
+def _cache_get(key):
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    return None
+
+def _cache_set(key, value):
+    with _cache_lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_CACHE_ENTRIES:
+            _cache.popitem(last=False)
+
+def _run(name, params, arrays, data_key):
+    """計算單一指標（不分輸出），結果一律為 tuple"""
+    key = data_key + (name, params)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    kwargs = dict(params)
+    if name == 'BIAS':
+        # BIAS = (收盤價 - SMA) / SMA * 100，SMA 與其他路由共用快取
+        sma = _run('SMA', params, arrays, data_key)[0]
+        result = ((arrays['close'] - sma) / sma * 100,)
+    else:
+        func, inputs = TALIB_FUNCTIONS[name]
+        result = func(*(arrays[i] for i in inputs), **kwargs)
+        if not isinstance(result, tuple):
+            result = (result,)
+
+    _cache_set(key, result)
+    return result
+
+def compute_indicators(symbol, data, specs):
+    """
+    計算一組指標
+
+    參數:
+    - symbol: 股票代號，作為快取鍵的一部分
+    - data: 含 High/Low/Close 欄位、以日期為索引的 DataFrame
+    - specs: IndicatorSpec 的可迭代物件
+
+    回傳 {spec: np.ndarray}
+    """
+    if data.empty:
+        return {spec: np.array([], dtype=np.float64) for spec in specs}
+
+    # 以首尾日期、長度與價格內容辨識同一份 K 棒資料（不同起點的 EMA/RSI 結果不同；
+    # 盤中最後一根 K 棒的價格會更新、除權息後歷史價格會調整，日期與長度卻不變）
+    arrays = price_arrays(data)
+    data_key = (symbol, data.index[0], data.index[-1], len(data), _arrays_digest(arrays))
+
+    results = {}
+    for spec in specs:
+        if spec not in results:
+            results[spec] = _run(spec.name, spec.params, arrays, data_key)[spec.output]
+    return results
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
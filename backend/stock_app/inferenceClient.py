@@ -0,0 +1,173 @@
+"""
+LSTM 推論用戶端
+
+原本每個 gunicorn worker 都在 Flask 執行緒中呼叫 Keras，每個 worker 各自載入一份 TensorFlow 與模型，
+TF 的 intra-op 執行緒也和處理請求的執行緒搶 CPU。
+現在 /api/lstm_predict 只在 web worker 準備價格與情感資料，模型推論交給本機的推論服務
+（python -m stock_app.inferenceServer，經由 Unix socket INFERENCE_SOCKET）：
+- 每個執行緒保留一條連線，服務中斷時重新連線一次
+- STOCK_INFERENCE=auto（預設）：socket 存在時使用推論服務，否則在目前行程推論（開發時不必另外啟動服務）；
+  在目前行程推論時同樣經過批次器，同時送出的請求（例如批次預測）會合併推論
+- STOCK_INFERENCE=remote：只使用推論服務，無法連線時拋出 InferenceUnavailable（web worker 不會載入 TF）
+- STOCK_INFERENCE=local：一律在目前行程推論
+- 訓練、微調與誤差評估 (MODEL_TASKS) 也經由 run_task 交給推論服務執行，web worker 的訓練佇列只等待結果；
+  沒有推論服務時才在目前行程執行（第一次執行時載入 TensorFlow）
+
+請求與結果以 multiprocessing.connection 傳遞（pickle，以 INFERENCE_AUTHKEY 驗證），
+NumPy 陣列不需要額外轉換。
+"""
+import importlib
+import os
+import threading
+from multiprocessing.connection import Client
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+INFERENCE_SOCKET = os.environ.get('STOCK_INFERENCE_SOCKET', os.path.join(DATA_DIR, 'inference.sock'))
+INFERENCE_AUTHKEY = os.environ.get('STOCK_INFERENCE_AUTHKEY', 'stock_app').encode('utf-8')
+
+# auto / remote / local
+INFERENCE_MODE = os.environ.get('STOCK_INFERENCE', 'auto')
+
+# 需要 TensorFlow 的模型工作：名稱 -> (模組, 函數)
+MODEL_TASKS = {
+    "train_model": ("stockLSTM", "train_model"),
+    "fine_tune_model": ("stockLSTM", "fine_tune_model"),
+    "current_model_rmse": ("stockLSTM", "current_model_rmse"),
+    "train_global_model": ("globalModel", "train_global_model"),
+}
+
+class InferenceUnavailable(Exception):
+    pass
+
+_local = threading.local()
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def _connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        try:
+            conn = Client(INFERENCE_SOCKET, family='AF_UNIX', authkey=INFERENCE_AUTHKEY)
+        except (OSError, EOFError) as e:
+            raise InferenceUnavailable(f"無法連線到推論服務 {INFERENCE_SOCKET}: {e}")
+        _local.conn = conn
+    return conn
+
+def _close():
+    conn = getattr(_local, 'conn', None)
+    _local.conn = None
+    if conn is not None:
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+def call(message):
+    """送出一個請求並等待結果（連線中斷時重新連線一次）"""
+    for attempt in range(2):
+        conn = _connection()
+        try:
+            conn.send(message)
+            response = conn.recv()
+            break
+        except (OSError, EOFError) as e:
+            _close()
+            if attempt == 1:
+                raise InferenceUnavailable(f"推論服務連線中斷: {e}")
+    if "error" in response:
+        raise RuntimeError(response["error"])
+    return response["result"]
+
+def use_remote():
+    if INFERENCE_MODE == 'local':
+        return False
+    return INFERENCE_MODE == 'remote' or os.path.exists(INFERENCE_SOCKET)
+
+def _local_batcher():
+    """目前行程的批次器（沒有推論服務時使用，第一次呼叫時建立）"""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                from .inferenceServer import InferenceServer
+                batcher = InferenceServer(address=None)
+                batcher.start_batching()
+                _batcher = batcher
+    return _batcher
+
+def _submit(request):
+    if use_remote():
+        try:
+            return call(request)
+        except InferenceUnavailable as e:
+            if INFERENCE_MODE == 'remote':
+                raise
+            print(f"{e}，改在目前行程推論")
+
+    # 沒有推論服務：在目前行程推論（第一次呼叫時載入 TensorFlow）
+    return _local_batcher().submit(request).result()
+
+def forecast(symbol, with_sentiment, closes, sentiment_data=None, days=7):
+    """
+    以股票自己的模型預測
+
+    回傳 {"predicted": 對應 closes[window:] 的單步預測, "future": (days,) 預測價格,
+    "sentiment_model": bool, "model_mtime": 模型檔案 mtime}
+    """
+    return _submit({
+        "model": "symbol",
+        "symbol": symbol,
+        "with_sentiment": bool(with_sentiment),
+        "closes": np.asarray(closes, dtype=np.float64),
+        "sentiment": None if sentiment_data is None else [float(s) for s in sentiment_data],
+        "days": days,
+    })
+
+def forecast_global(symbol, closes, days=7):
+    """以全域模型預測，回傳 {"predicted", "future", "window", "trained_symbols", "model_mtime"}"""
+    return _submit({
+        "model": "global",
+        "symbol": symbol,
+        "closes": np.asarray(closes, dtype=np.float64),
+        "days": days,
+    })
+
+def server_stats():
+    """推論服務的模型登錄表與批次統計；沒有使用推論服務時為 None"""
+    if not use_remote():
+        return None
+    try:
+        return call({"op": "stats"})
+    except InferenceUnavailable:
+        return None
+
+def start_retraining():
+    """請推論服務啟動一次模型排程更新，回傳是否已啟動；沒有使用推論服務時為 None"""
+    if not use_remote():
+        return None
+    try:
+        return call({"op": "retrain"})
+    except InferenceUnavailable:
+        if INFERENCE_MODE == 'remote':
+            raise
+        return None
+
+def run_local_task(task, *args):
+    """在目前行程執行 MODEL_TASKS 中的工作（匯入 stockLSTM / globalModel 時載入 TensorFlow）"""
+    module, name = MODEL_TASKS[task]
+    return getattr(importlib.import_module(f".{module}", __package__), name)(*args)
+
+def run_task(task, *args):
+    """執行需要 TensorFlow 的模型工作：有推論服務時交給推論服務並等待結果，否則在目前行程執行"""
+    if use_remote():
+        try:
+            return call({"op": "task", "task": task, "args": list(args)})
+        except InferenceUnavailable as e:
+            if INFERENCE_MODE == 'remote':
+                raise
+            print(f"{e}，改在目前行程執行 {task}")
+    return run_local_task(task, *args)
@@ -0,0 +1,222 @@
+"""
+LSTM 推論服務（每台主機一個行程）
+
+執行方式（於 backend 目錄）:
+    python -m stock_app.inferenceServer
+
+在 INFERENCE_SOCKET 上接受 inferenceClient 的請求，模型登錄表只存在於這個行程，
+每個模型在主機上只載入一次；web worker 不需要載入 TensorFlow。
+- 每條連線一個執行緒，請求放入同一個佇列；批次執行緒收到第一個請求後再等待 BATCH_WINDOW 秒
+  （最多 MAX_BATCH 個），同一個模型的請求合併成一次歷史推論與一次未來價格遞推
+  （全域模型的所有股票都共用同一個模型，合併效果最明顯）
+- TF 的 intra-op / inter-op 執行緒數固定為 INFERENCE_THREADS / 1，
+  可以 STOCK_INFERENCE_CPUS（例如 "0-3"）把行程固定在指定的 CPU 上，不與 web worker 搶核心
+- 每天的模型排程更新 (retrainScheduler) 也在這個行程執行，微調需要的 TF 已經載入；
+  web worker 的 /api/lstm_retrain 以 {"op": "retrain"} 轉送過來
+- web worker 訓練佇列中的工作以 {"op": "task"} 在這裡執行（同時執行的數量由 TRAINING_WORKERS 限制），
+  訓練完成的模型直接放入這個行程的登錄表
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Listener, Client
+from multiprocessing import AuthenticationError
+
+from .inferenceClient import INFERENCE_SOCKET, INFERENCE_AUTHKEY, run_local_task
+from .modelRegistry import GLOBAL_SYMBOL, registry
+from .retrainScheduler import start_scheduler, start_retraining
+from .trainingQueue import TRAINING_WORKERS
+
+# 收到第一個請求後等待其他請求的秒數
+BATCH_WINDOW = float(os.environ.get('STOCK_INFERENCE_BATCH_MS', '5')) / 1000
+
+# 每個批次最多的請求數量
+MAX_BATCH = 64
+
+# TF intra-op 執行緒數量
+INFERENCE_THREADS = int(os.environ.get('STOCK_INFERENCE_THREADS', str(min(4, os.cpu_count() or 1))))
+
+# 固定使用的 CPU（例如 "0-3,6"），空字串表示不限制
+INFERENCE_CPUS = os.environ.get('STOCK_INFERENCE_CPUS', '')
+
+def parse_cpus(text):
+    """將 "0-3,6" 轉換為 {0, 1, 2, 3, 6}"""
+    cpus = set()
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        start, _, end = part.partition('-')
+        cpus.update(range(int(start), int(end or start) + 1))
+    return cpus
+
+def configure_threads(threads=INFERENCE_THREADS, cpus=INFERENCE_CPUS):
+    """固定 CPU 與 TF 執行緒數（必須在 TF 執行任何運算之前呼叫）"""
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, parse_cpus(cpus))
+    import tensorflow as tf # type: ignore
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+def fine_tune_model(symbol_full, include_sentiment):
+    return run_local_task("fine_tune_model", symbol_full, include_sentiment)
+
+def current_model_rmse(symbol_full, include_sentiment):
+    return run_local_task("current_model_rmse", symbol_full, include_sentiment)
+
+def run_batch(requests):
+    """
+    執行一批預測請求，回傳與 requests 順序相同的結果（失敗的請求為例外物件）
+
+    以 (模型, 預測天數) 分組，每組只取一次模型並合併推論
+    """
+    from .lstmInference import forecast_many
+    from .globalModel import forecast_global_many
+
+    groups = {}
+    for index, request in enumerate(requests):
+        if request["model"] == "global":
+            key = (GLOBAL_SYMBOL, False, request["days"])
+        else:
+            key = (request["symbol"], request["with_sentiment"], request["days"])
+        groups.setdefault(key, []).append(index)
+
+    results = [None] * len(requests)
+    for (symbol, with_sentiment, days), indices in groups.items():
+        members = [requests[i] for i in indices]
+        try:
+            model, extra, model_mtime = registry.get(symbol, with_sentiment)
+            if symbol == GLOBAL_SYMBOL:
+                outputs = forecast_global_many(model, extra, [(r["symbol"], r["closes"]) for r in members], days)
+            else:
+                outputs = forecast_many(model, extra, [(r["closes"], r["sentiment"]) for r in members], days)
+        except Exception as e:
+            outputs = [e] * len(members)
+        for index, output in zip(indices, outputs):
+            results[index] = output if isinstance(output, Exception) else dict(output, model_mtime=model_mtime)
+    return results
+
+class InferenceServer:
+    def __init__(self, address=INFERENCE_SOCKET, batch_window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.address = address
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "model_groups": 0, "largest_batch": 0}
+        # 所有 web worker 送來的訓練工作共用的執行數量上限
+        self._task_slots = threading.BoundedSemaphore(TRAINING_WORKERS)
+
+    def start_batching(self):
+        """啟動批次執行緒；web worker 在目前行程推論時只使用 submit，不監聽 socket"""
+        threading.Thread(target=self._batch_loop, name='inference-batch', daemon=True).start()
+
+    def submit(self, request):
+        future = Future()
+        self._queue.put((request, future))
+        return future
+
+    def _collect(self):
+        """等待第一個請求，之後在 batch_window 秒內收集更多請求"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _batch_loop(self):
+        while True:
+            batch = self._collect()
+            requests = [request for request, _ in batch]
+            try:
+                results = run_batch(requests)
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+            groups = {(r["model"], r["symbol"] if r["model"] == "symbol" else "", r.get("with_sentiment"))
+                      for r in requests}
+            with self._lock:
+                self._stats["requests"] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["model_groups"] += len(groups)
+                self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+
+    def run_task(self, task, args):
+        with self._task_slots:
+            return run_local_task(task, *args)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, registry=registry.stats(), pid=os.getpid())
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if message.get("op") == "stats":
+                        response = {"result": self.stats()}
+                    elif message.get("op") == "task":
+                        response = {"result": self.run_task(message["task"], message["args"])}
+                    elif message.get("op") == "retrain":
+                        response = {"result": start_retraining(fine_tune_model, current_model_rmse)}
+                    else:
+                        response = {"result": self.submit(message).result()}
+                except Exception as e:
+                    response = {"error": str(e)}
+                try:
+                    conn.send(response)
+                except OSError:
+                    return
+
+    def _remove_stale_socket(self):
+        """socket 檔案存在但沒有服務在監聽時刪除；已有服務在執行時拋出 RuntimeError"""
+        if not os.path.exists(self.address):
+            return
+        try:
+            Client(self.address, family='AF_UNIX', authkey=INFERENCE_AUTHKEY).close()
+        except (OSError, EOFError, AuthenticationError):
+            os.remove(self.address)
+            return
+        raise RuntimeError(f"推論服務已在 {self.address} 執行")
+
+    def serve_forever(self):
+        self._remove_stale_socket()
+        listener = Listener(self.address, family='AF_UNIX', authkey=INFERENCE_AUTHKEY)
+        os.chmod(self.address, 0o600)
+        self.start_batching()
+        print(f"推論服務已啟動: {self.address} (批次等待 {self.batch_window * 1000:.0f} ms)")
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except AuthenticationError as e:
+                    print(f"拒絕未通過驗證的連線: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), name='inference-conn', daemon=True).start()
+        finally:
+            listener.close()
+
+def main():
+    configure_threads()
+    # 啟動時預先載入最常使用的模型（STOCK_PREWARM_MODELS > 0 時）
+    registry.prewarm_async()
+    # 每天離峰時段微調過期或誤差惡化的模型（STOCK_RETRAIN_HOUR < 0 時停用）
+    start_scheduler(fine_tune_model, current_model_rmse)
+    InferenceServer().serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+LSTM 多步預測
+
+原本 predict_future_prices 每預測一天就呼叫一次 model.predict，並以 np.append 重建視窗；
+Keras 的 predict 每次都要建立資料管線，7 天預測等於跑 7 次完整的 predict。
+這裡改為：
+- 以 tf.function 編譯的單步推論直接呼叫模型（每個模型只編譯一次）
+- 預先配置 (B, window + days, 1) 的緩衝區，每一步只寫入一個值，輸入為其中的視窗切片
+- B 個序列一起遞推：共用同一個模型的多檔股票只需要 days 次批次推論
+- forecast_many 把同一個模型的多個預測請求（推論服務一次收集的請求）合併成一次歷史推論與一次遞推
+"""
+import numpy as np
+import tensorflow as tf # type: ignore
+
+from .windowing import make_windows
+
+# 編譯後的推論函數存放在模型物件的這個屬性上，與模型一起被釋放
+# （推論函數參照模型本身，若以模型為鍵另外保存，模型永遠不會被回收，登錄表淘汰也無法釋放記憶體）
+STEP_ATTRIBUTE = '_stock_infer_step'
+
+def is_sentiment_model(model):
+    """是否為帶有情感輸入 (sentiment_input) 的模型"""
+    inputs = getattr(model, 'inputs', None) or []
+    return len(inputs) > 1 and any('sentiment' in getattr(t, 'name', '') for t in inputs)
+
+def _step_function(model):
+    step = getattr(model, STEP_ATTRIBUTE, None)
+    if step is None:
+        # reduce_retracing：批次大小改變時不重新追蹤
+        step = tf.function(lambda inputs: model(inputs, training=False), reduce_retracing=True)
+        # 不經過 Keras 的屬性追蹤，推論函數不會被當成模型的一部分存檔
+        object.__setattr__(model, STEP_ATTRIBUTE, step)
+    return step
+
+def infer(model, inputs):
+    """直接呼叫模型推論（不經過 model.predict），回傳 NumPy 陣列"""
+    return _step_function(model)(inputs).numpy()
+
+def rollout(model, windows, sentiments=None, days=7):
+    """
+    自回歸預測未來 days 天（歸一化後的值）
+
+    參數:
+    - windows: (B, window, 1) 最近的歸一化價格視窗
+    - sentiments: None 或 (B, days) 每一天使用的情感值，只用於情感模型（None 時為 0）
+    - days: 預測天數
+
+    回傳 (B, days) 的預測值
+    """
+    windows = np.asarray(windows, dtype=np.float32)
+    batch, window = windows.shape[0], windows.shape[1]
+
+    # 緩衝區前段為原始視窗，每預測一天就寫入下一個位置
+    buffer = np.empty((batch, window + days, 1), dtype=np.float32)
+    buffer[:, :window] = windows
+    use_sentiment = is_sentiment_model(model)
+    if use_sentiment:
+        # 情感模型沒有情感資料時以中性值 0 代入
+        if sentiments is None:
+            sentiments = np.zeros((batch, days), dtype=np.float32)
+        sentiments = np.asarray(sentiments, dtype=np.float32).reshape(batch, days)
+
+    for day in range(days):
+        current = buffer[:, day:day + window]
+        if use_sentiment:
+            inputs = [current, sentiments[:, day:day + 1]]
+        else:
+            inputs = current
+        buffer[:, window + day, 0] = infer(model, inputs)[:, 0]
+
+    return buffer[:, window:, 0].copy()
+
+def future_sentiment(sentiment_data, days=7):
+    """取未來 days 天使用的情感值：最近 days 筆，不足時以最後一個值填充"""
+    if sentiment_data is None or len(sentiment_data) == 0:
+        return [0.0] * days
+    if len(sentiment_data) >= days:
+        return list(sentiment_data[-days:])
+    return [sentiment_data[-1]] * days
+
+def rollout_many(items, days=7):
+    """
+    多檔股票的批次預測
+
+    items: [(key, model, window, sentiment_data 或 None), ...]，window 為 (window, 1)
+    共用同一個模型的項目合併為一個批次；回傳 {key: (days,) 預測值}
+    """
+    groups = {}
+    for key, model, window, sentiment_data in items:
+        groups.setdefault(id(model), (model, []))[1].append((key, window, sentiment_data))
+
+    results = {}
+    for model, members in groups.values():
+        windows = np.stack([np.asarray(window, dtype=np.float32).reshape(-1, 1) for _, window, _ in members])
+        sentiments = None
+        if is_sentiment_model(model):
+            sentiments = np.array([future_sentiment(s, days) for _, _, s in members], dtype=np.float32)
+        predictions = rollout(model, windows, sentiments, days)
+        for (key, _, _), prediction in zip(members, predictions):
+            results[key] = prediction
+    return results
+
+def _history_sentiment(sentiment_data, count):
+    """歷史視窗使用的情感值：最近 count 筆，不足時以最後一個值填充（沒有資料時為 0）"""
+    if sentiment_data is None or len(sentiment_data) == 0:
+        return np.zeros(count, dtype=np.float32)
+    if len(sentiment_data) >= count:
+        return np.asarray(sentiment_data[-count:], dtype=np.float32)
+    return np.full(count, sentiment_data[-1], dtype=np.float32)
+
+def forecast_many(model, scaler, jobs, days=7):
+    """
+    同一個模型（同一檔股票）的多個預測請求一起推論
+
+    jobs: [(closes, sentiment_data 或 None), ...]，closes 為一維收盤價
+    所有請求的歷史視窗串接成一次推論，未來價格以一個 (B, window, 1) 批次遞推；
+    回傳與 jobs 順序相同的 {"predicted": 對應 closes[window:] 的單步預測, "future": (days,) 預測價格,
+    "sentiment_model": bool}，資料不足的請求為 ValueError（不影響同批的其他請求）
+    """
+    window = int(model.inputs[0].shape[1])
+    sentiment_model = is_sentiment_model(model)
+    results = [None] * len(jobs)
+
+    valid, scaled = [], []
+    for i, (closes, _) in enumerate(jobs):
+        closes = np.asarray(closes, dtype=np.float64).reshape(-1, 1)
+        if len(closes) <= window:
+            results[i] = ValueError(f"數據不足以進行預測 (需要至少 {window + 1} 個數據點)")
+            continue
+        valid.append(i)
+        scaled.append(scaler.transform(closes).astype(np.float32))
+    if not valid:
+        return results
+
+    # 歷史視窗：所有請求串接成一次推論
+    windows = [make_windows(values, window) for values in scaled]
+    counts = [len(x) for x in windows]
+    inputs = np.concatenate(windows)
+    if sentiment_model:
+        sentiments = np.concatenate([_history_sentiment(jobs[i][1], count) for i, count in zip(valid, counts)])
+        inputs = [inputs, sentiments.reshape(-1, 1)]
+    predicted = scaler.inverse_transform(infer(model, inputs).reshape(-1, 1))[:, 0]
+
+    # 未來價格：所有請求一起遞推
+    last_windows = np.stack([values[-window:] for values in scaled])
+    future_sentiments = None
+    if sentiment_model:
+        future_sentiments = np.array([future_sentiment(jobs[i][1], days) for i in valid], dtype=np.float32)
+    future = scaler.inverse_transform(rollout(model, last_windows, future_sentiments, days).reshape(-1, 1))
+    future = future.reshape(len(valid), days)
+
+    offsets = np.cumsum([0] + counts)
+    for n, i in enumerate(valid):
+        results[i] = {
+            "predicted": predicted[offsets[n]:offsets[n + 1]],
+            "future": future[n],
+            "sentiment_model": sentiment_model,
+        }
+    return results
@@ -0,0 +1,422 @@
+"""
+LSTM 預測 API（web worker 端）
+
+只負責準備價格與情感資料、組成回應；模型推論經由 inferenceClient 交給推論服務
+（或在沒有推論服務時於目前行程推論），因此這個模組不需要載入 TensorFlow。
+訓練與微調在 stockLSTM，背景訓練工作開始時才載入。
+
+批次預測（lstm_predict_batch，一個群組或一組代號）：
+- 所有股票的日K以 get_histories 一次更新
+- 每檔股票在執行緒池中準備資料並送出推論，推論服務（或目前行程的批次器）把同時到達的請求合併推論
+- 以 NDJSON 逐行輸出，每檔股票完成時立即送出，最後一行為 {"done": true, ...}
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import Response, jsonify, request, stream_with_context # type: ignore
+
+from .stockStore import get_history, get_histories
+from .serializer import preferred_format, binary_response, JSON_MIMETYPE, NpEncoder
+from . import sentimentStore as sentiment_store
+from .newsSentiment import sentiment_summary
+from .modelRegistry import GLOBAL_SYMBOL, registry
+from .trainingQueue import training_queue, QueueFull
+from . import inferenceClient as inference_client
+from .inferenceClient import InferenceUnavailable
+
+def generate_future_dates(start_date, days=7):
+    """生成指定天數的未來交易日期（跳過週末）"""
+    future_dates = []
+    current_date = start_date
+    
+    for _ in range(days):
+        # 前進到下一天
+        current_date = current_date + timedelta(days=1)
+        
+        # 跳過週末
+        while current_date.weekday() >= 5:  # 5=Saturday, 6=Sunday
+            current_date = current_date + timedelta(days=1)
+        
+        future_dates.append(current_date.strftime('%Y-%m-%d'))
+    
+    return future_dates
+
+# 1. 數據載入與準備函式
+def load_stock_data(symbol_full, period="1y"):
+    """載入股票數據（經由本地日K資料庫）"""
+    data = get_history(symbol_full, period=period)
+    if data.empty:
+        raise ValueError(f"無法獲取股票數據: {symbol_full}")
+    return data
+
+# 4. 計算指標函式
+def calculate_metrics(actual_prices, predicted_prices):
+    """計算預測指標"""
+    if len(actual_prices) > 0 and len(predicted_prices) > 0:
+        mse = np.mean((actual_prices - predicted_prices.flatten())**2)
+        rmse = np.sqrt(mse)
+        accuracy = max(0, 100 - min(100, (rmse / np.mean(actual_prices)) * 100))
+    else:
+        accuracy = 0
+        rmse = 0
+    
+    return accuracy, rmse
+
+def get_sentiment_data(symbol_full, include_sentiment):
+    """
+    獲取股票情感數據，回傳 (每日情感, 影響最大的新聞, 平均情感)
+
+    每日情感對齊到最近一年日K的交易日，與訓練、預測使用的價格序列一一對應
+    """
+    if not include_sentiment:
+        return None, None, None
+    
+    try:
+        top_news, avg_sentiment = sentiment_summary(symbol_full)
+        dates = load_stock_data(symbol_full, "1y").index
+        sentiment_trend = [float(s) for s in sentiment_store.daily_series(symbol_full, dates)]
+        return sentiment_trend, top_news, avg_sentiment
+    except Exception as e:
+        print(f"無法獲取情感數據: {e}, 將不使用情感分析")
+        return None, None, None
+
+def train_model(symbol_full, include_sentiment, prediction_days=60):
+    """背景訓練工作（有推論服務時在推論服務訓練，否則在目前行程載入 stockLSTM 與 TensorFlow）"""
+    return inference_client.run_task("train_model", symbol_full, include_sentiment, prediction_days)
+
+def recent_period(market):
+    """預測時讀取的近期日K期間（台股交易日較少，取較長的期間）"""
+    return "6mo" if market == 'TW' else "3mo"
+
+# 預設的 LSTM 模式：symbol 為每檔股票一個模型，global 為全域模型（可用 ?model= 覆寫）
+LSTM_MODEL_MODE = os.environ.get('STOCK_LSTM_MODEL', 'symbol')
+
+# 5. 主API函式 - 大幅精簡
+def lstm_predict_stock(symbol, market='US'):
+    try:
+        # 參數處理
+        if market == 'TW':
+            symbol_full = f"{symbol}.TW"
+        else:
+            symbol_full = symbol
+            
+        prediction_days = 60
+        
+        force_retrain = request.args.get('retrain', 'false').lower() == 'true'
+        include_sentiment = request.args.get('sentiment', 'true').lower() == 'true'
+
+        model_mode = request.args.get('model', LSTM_MODEL_MODE)
+        if model_mode not in ('symbol', 'global'):
+            return jsonify({"error": f"不支援的 model: {model_mode}，可用值: symbol, global"}), 400
+
+        # 全域模型：任何股票都直接使用同一個模型，不需要先訓練
+        if model_mode == 'global':
+            if not registry.exists(GLOBAL_SYMBOL, False):
+                return jsonify({"error": "尚未訓練全域模型，請先呼叫 POST /api/lstm_global/train"}), 404
+            sentiment_data, top_5_news, avg_sentiment = get_sentiment_data(symbol_full, include_sentiment)
+            return lstm_response(handle_global_model(symbol_full, market, prediction_days,
+                                                     sentiment_data, top_5_news))
+
+        # 沒有模型或要求重新訓練時排入背景訓練，不在請求中訓練
+        has_model = registry.exists(symbol_full, include_sentiment)
+        training_job = None
+        if not has_model or force_retrain:
+            try:
+                training_job, _ = training_queue.submit(
+                    symbol_full, include_sentiment,
+                    train_model, symbol_full, include_sentiment, prediction_days
+                )
+            except QueueFull as e:
+                return jsonify({"error": str(e)}), 503
+            if not has_model:
+                # 尚無模型可用，回傳工作編號讓前端查詢進度
+                return jsonify({"status": "training", "training_job": training_job}), 202
+
+        # 獲取情感數據
+        sentiment_data, top_5_news, avg_sentiment = get_sentiment_data(symbol_full, include_sentiment)
+        
+        # 重新訓練期間先以現有模型預測
+        response = handle_existing_model(symbol_full, market, prediction_days,
+                                        sentiment_data, include_sentiment, top_5_news)
+        if training_job is not None:
+            response["training_job"] = training_job
+        
+        return lstm_response(response)
+
+    except InferenceUnavailable as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        import traceback
+        print(f"LSTM預測錯誤: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({"error": f"預測失敗: {str(e)}"}), 500
+
+# 批次預測最多的股票數量
+MAX_BATCH_SYMBOLS = 50
+
+# 批次預測時同時準備資料（情感、訓練工作）並送出推論的執行緒數量
+BATCH_WORKERS = int(os.environ.get('STOCK_LSTM_BATCH_WORKERS', '8'))
+
+def symbol_market(symbol, market=None):
+    """
+    回傳 (完整代號, 市場)
+
+    群組只保存代號，未指定市場時以數字開頭的代號視為台股（與前端切換市場的判斷相同）
+    """
+    symbol = symbol.strip().upper()
+    if symbol.endswith('.TW'):
+        return symbol, 'TW'
+    market = market or ('TW' if symbol[:1].isdigit() else 'US')
+    return (f"{symbol}.TW" if market == 'TW' else symbol), market
+
+def predict_one(symbol_full, market, include_sentiment, model_mode, recent_data, prediction_days=60):
+    """批次預測中的一檔股票，回傳輸出的一行（預測結果、訓練工作或錯誤）"""
+    try:
+        if model_mode == 'symbol' and not registry.exists(symbol_full, include_sentiment):
+            try:
+                training_job, _ = training_queue.submit(
+                    symbol_full, include_sentiment,
+                    train_model, symbol_full, include_sentiment, prediction_days
+                )
+            except QueueFull as e:
+                return {"symbol": symbol_full, "error": str(e)}
+            return {"symbol": symbol_full, "status": "training", "training_job": training_job}
+
+        sentiment_data, top_5_news, _ = get_sentiment_data(symbol_full, include_sentiment)
+        if model_mode == 'global':
+            return handle_global_model(symbol_full, market, prediction_days,
+                                       sentiment_data, top_5_news, recent_data)
+        return handle_existing_model(symbol_full, market, prediction_days, sentiment_data,
+                                     include_sentiment, top_5_news, recent_data)
+    except Exception as e:
+        print(f"批次 LSTM 預測 {symbol_full} 錯誤: {str(e)}")
+        return {"symbol": symbol_full, "error": f"預測失敗: {str(e)}"}
+
+def lstm_predict_batch(symbols, market=None):
+    """
+    批次預測多檔股票，以 NDJSON 串流輸出（每檔股票完成時送出一行）
+
+    參數:
+    - symbols: 股票代號列表（台股可不帶 .TW）
+    - market: TW / US，未指定時依代號判斷
+    查詢參數 sentiment、model 與單檔預測相同；沒有模型的股票排入背景訓練並輸出 {"status": "training"}
+    """
+    if not isinstance(symbols, list) or not all(isinstance(s, str) and s.strip() for s in symbols):
+        return jsonify({"error": "symbols 必須是股票代號列表"}), 400
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return jsonify({"error": f"一次最多預測 {MAX_BATCH_SYMBOLS} 檔股票"}), 400
+    if market not in (None, 'TW', 'US'):
+        return jsonify({"error": f"不支援的 market: {market}，可用值: TW, US"}), 400
+
+    include_sentiment = request.args.get('sentiment', 'true').lower() == 'true'
+    model_mode = request.args.get('model', LSTM_MODEL_MODE)
+    if model_mode not in ('symbol', 'global'):
+        return jsonify({"error": f"不支援的 model: {model_mode}，可用值: symbol, global"}), 400
+    if model_mode == 'global' and not registry.exists(GLOBAL_SYMBOL, False):
+        return jsonify({"error": "尚未訓練全域模型，請先呼叫 POST /api/lstm_global/train"}), 404
+
+    targets = dict(symbol_market(symbol, market) for symbol in symbols)
+
+    def generate():
+        start = time.perf_counter()
+
+        # 所有股票的近期日K一次更新（依市場的期間分組），之後讀取情感用的 1y 日K直接命中本地資料庫
+        histories = {}
+        for period in {recent_period(m) for m in targets.values()}:
+            group = [s for s, m in targets.items() if recent_period(m) == period]
+            histories.update(get_histories(group, period))
+
+        counts = {"predicted": 0, "training": 0, "error": 0}
+        with ThreadPoolExecutor(max_workers=max(1, min(BATCH_WORKERS, len(targets)))) as pool:
+            futures = [
+                pool.submit(predict_one, symbol_full, market, include_sentiment, model_mode,
+                            histories[symbol_full])
+                for symbol_full, market in targets.items()
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                if "error" in result:
+                    counts["error"] += 1
+                elif result.get("status") == "training":
+                    counts["training"] += 1
+                else:
+                    counts["predicted"] += 1
+                yield json.dumps(result, cls=NpEncoder, ensure_ascii=False) + "\n"
+
+        yield json.dumps({"done": True, **counts,
+                          "seconds": round(time.perf_counter() - start, 3)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def lstm_response(response):
+    """依 Accept 標頭輸出預測結果；二進位格式時歷史價格為欄位，其餘欄位放在 meta"""
+    fmt = preferred_format()
+    if fmt != JSON_MIMETYPE:
+        historical = response["historical_data"]
+        meta = {k: v for k, v in response.items() if k != "historical_data"}
+        return binary_response(fmt, {"dates": historical["dates"], "prices": historical["prices"]}, meta=meta)
+    return jsonify(response)
+
+# 6. 處理現有模型的函式
+def handle_existing_model(symbol_full, market, prediction_days, sentiment_data,
+                         include_sentiment, top_5_news, recent_data=None):
+    """使用現有模型預測（模型與縮放器由推論服務的模型登錄表提供；批次預測時傳入已讀取的近期日K）"""
+    # 獲取近期數據
+    if recent_data is None:
+        recent_data = load_stock_data(symbol_full, recent_period(market))
+    
+    if recent_data.empty:
+        raise ValueError(f"無法獲取近期數據: {symbol_full}")
+    
+    # 確保有足夠的數據
+    closes = recent_data['Close'].to_numpy(dtype=np.float64)
+    if len(closes) <= prediction_days:
+        raise ValueError(f"數據不足以進行預測 (需要至少 {prediction_days + 1} 個數據點)")
+
+    # 近期每個視窗的單步預測（評估準確性）與未來 7 天的價格，一次交給推論服務
+    result = inference_client.forecast(symbol_full, include_sentiment, closes, sentiment_data)
+    predicted_prices = result["predicted"]
+    future_prices = np.asarray(result["future"]).reshape(-1, 1)
+    sentiment_model = result["sentiment_model"]
+    model_mtime = result["model_mtime"]
+    
+    # 計算預測準確性
+    if len(predicted_prices) > 0:
+        actual_prices = closes[-len(predicted_prices):]
+        accuracy, rmse = calculate_metrics(actual_prices, predicted_prices)
+    else:
+        accuracy, rmse = 0, 0
+    
+    # 計算未來日期
+    last_date = recent_data.index[-1]
+    future_dates = generate_future_dates(last_date)
+    
+    # 獲取當前情感值
+    current_sentiment = sentiment_data[-1] if sentiment_data is not None else 0
+    
+    # 計算價格變化百分比
+    current_price = float(recent_data['Close'].iloc[-1])
+    next_price = float(future_prices[0][0]) if len(future_prices) > 0 else current_price
+    price_change = ((next_price - current_price) / current_price) * 100
+    
+    # 計算歷史資料
+    historical_dates = recent_data.index[-30:].strftime('%Y-%m-%d').tolist()
+    historical_prices = recent_data['Close'].iloc[-30:].tolist()
+    
+    # 創建模型信息
+    model_info = {
+        "last_updated": datetime.fromtimestamp(model_mtime).strftime('%Y-%m-%d'),
+        "prediction_days": prediction_days,
+        "includes_sentiment": sentiment_model and sentiment_data is not None
+    }
+    
+    # 創建情感數據
+    sentiment_viz_data = None
+    if sentiment_data is not None:
+        sentiment_viz_data = {
+            "recent": [float(s) for s in sentiment_data[-30:]] if len(sentiment_data) >= 30 else [float(s) for s in sentiment_data],
+            "future": [float(s) for s in sentiment_data[-7:]] if len(sentiment_data) >= 7 else [float(s) for s in sentiment_data[:7]]
+        }
+    
+    return format_response(
+        symbol_full, current_price, next_price, price_change,
+        accuracy, current_sentiment, rmse,
+        historical_dates, historical_prices,
+        future_dates, future_prices,
+        model_info, sentiment_viz_data, top_5_news
+    )
+
+# 6b. 使用全域模型預測
+def handle_global_model(symbol_full, market, prediction_days, sentiment_data, top_5_news, recent_data=None):
+    """以全域模型預測任一股票（價格以視窗最後收盤價歸一化，不需要個別縮放器）"""
+    if recent_data is None:
+        recent_data = load_stock_data(symbol_full, recent_period(market))
+    if recent_data.empty:
+        raise ValueError(f"無法獲取近期數據: {symbol_full}")
+    closes = recent_data['Close'].to_numpy(dtype=np.float64)
+
+    # 近期每個視窗的單步預測（評估準確性）與未來價格，一次交給推論服務
+    result = inference_client.forecast_global(symbol_full, closes)
+    window = result["window"]
+    accuracy, rmse = calculate_metrics(closes[window:], np.asarray(result["predicted"]))
+    future_prices = np.asarray(result["future"]).reshape(-1, 1)
+    future_dates = generate_future_dates(recent_data.index[-1])
+    model_mtime = result["model_mtime"]
+
+    current_sentiment = sentiment_data[-1] if sentiment_data is not None else 0
+    current_price = float(closes[-1])
+    next_price = float(future_prices[0][0])
+    price_change = ((next_price - current_price) / current_price) * 100
+
+    historical_dates = recent_data.index[-30:].strftime('%Y-%m-%d').tolist()
+    historical_prices = recent_data['Close'].iloc[-30:].tolist()
+
+    model_info = {
+        "last_updated": datetime.fromtimestamp(model_mtime).strftime('%Y-%m-%d'),
+        "prediction_days": window,
+        "includes_sentiment": False,
+        "model": "global",
+        "trained_symbols": result["trained_symbols"],
+    }
+
+    sentiment_viz_data = None
+    if sentiment_data is not None:
+        sentiment_viz_data = {
+            "recent": [float(s) for s in sentiment_data[-30:]],
+            "future": [float(s) for s in sentiment_data[-7:]]
+        }
+
+    return format_response(
+        symbol_full, current_price, next_price, price_change,
+        accuracy, current_sentiment, rmse,
+        historical_dates, historical_prices,
+        future_dates, future_prices,
+        model_info, sentiment_viz_data, top_5_news
+    )
+
+# 8. 格式化響應的函式
+def format_response(symbol, current_price, next_price, price_change, accuracy, 
+                   sentiment_score, rmse, historical_dates, historical_prices, 
+                   future_dates, future_prices, model_info, sentiment_data=None, top_5_news=None):
+    """格式化API響應"""
+    response = {
+        "symbol": symbol,
+        "current_price": current_price,
+        "predicted_next_price": next_price,
+        "price_change_percent": float(price_change),
+        "prediction_accuracy": float(accuracy),
+        "sentiment_score": float(sentiment_score),
+        "sentiment_impact": "高" if abs(sentiment_score) > 0.2 else "中" if abs(sentiment_score) > 0.05 else "低",
+        "rmse": float(rmse),
+        "signal": "買入" if price_change > 0 else "賣出",
+        "historical_data": {
+            "dates": historical_dates,
+            "prices": [float(p) for p in historical_prices]
+        },
+        "future_predictions": [
+            {"date": date, "price": round(float(price[0]), 2)} 
+            for date, price in zip(future_dates, future_prices)
+        ],
+        "model_info": model_info
+    }
+    
+    if sentiment_data is not None:
+        response["sentiment_data"] = sentiment_data
+
+    if top_5_news:
+        response["top_5_news"] = [
+            {
+                "title": item["title"],
+                "impact": float(item["impact"]),
+                "impact_direction": "正面" if item["impact"] > 0 else "負面" if item["impact"] < 0 else "中性",
+                "link": item["link"],
+                "publish_time": item["publish_time"],
+            }
+            for item in top_5_news
+        ]
+    
+    return response
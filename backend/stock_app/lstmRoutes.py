@@ -0,0 +1,179 @@
+"""
+LSTM 預測與新聞情感的 API 路由
+
+stockLSTM 在匯入時會載入 TensorFlow/Keras 與 sklearn，原本由 stock_app/__init__.py 無條件匯入，
+連只需要報價、分類資料的 worker 也要等數秒才能啟動，並佔用這些套件的記憶體。
+這裡註冊的路由都不需要 TF：
+- /api/lstm_predict 由 lstmPredict 準備資料，推論交給推論服務 (inferenceClient)；
+  /api/lstm_predict/batch 一次預測多檔股票，以 NDJSON 逐檔串流輸出
+- /api/stock_sentiment 由 newsSentiment 讀取已評分的新聞，第一次評分新聞時才載入 NLTK；
+  結果以 cached_route 保存 SENTIMENT_TTL 秒（背景 ingester 每 30 分鐘才更新一次新聞）
+- 訓練工作、排程更新狀態、已載入模型等查詢直接在這裡處理
+- /api/lstm_backtest 的滾動前進回測由 backtestEngine 在背景工作的行程池中執行
+- 背景排程與訓練工作傳入的是 inferenceClient.run_task 的包裝函數：有推論服務時在推論服務執行，
+  否則實際執行時才在目前行程匯入 stockLSTM / globalModel
+- 有推論服務時，每天的模型排程更新由推論服務執行（/api/lstm_retrain 也轉送給推論服務），web worker 不會載入 TF 微調模型；
+  沒有推論服務時（python app.py、無 AF_UNIX 的 Windows）在 web worker 啟動排程，以檔案鎖確保只有一個 worker 執行
+背景執行緒在 blueprint 註冊到 app 時才啟動（推論服務匯入 stock_app 時不會啟動）；
+STOCK_PRELOAD_ML=1 時另外在背景匯入 stockLSTM，第一個訓練工作不必等待載入。
+"""
+import multiprocessing
+import os
+import threading
+import time
+
+from flask import jsonify, request # type: ignore
+
+from . import stock_app_blueprint
+from . import sentimentStore as sentiment_store
+from . import inferenceClient as inference_client
+from .lstmPredict import lstm_predict_stock as predict_stock, lstm_predict_batch as predict_batch
+from .newsSentiment import analysis_stock_sentiment as stock_sentiment, score_news
+from .modelRegistry import GLOBAL_SYMBOL, registry
+from .trainingQueue import training_queue, QueueFull
+from .ttlCache import cached_route
+from .retrainScheduler import start_scheduler, start_retraining, job_status as retrain_status
+from . import backtestEngine as backtest_engine
+
+# 啟動後是否立即在背景載入 stockLSTM (TF)
+PRELOAD_ML = os.environ.get('STOCK_PRELOAD_ML', '0') == '1'
+
+# 新聞情感結果的保存秒數
+SENTIMENT_TTL = 60 * 60
+
+# 有推論服務時是否仍在 web worker 啟動每天的模型排程更新（預設由推論服務執行）
+RETRAIN_IN_WEB = os.environ.get('STOCK_RETRAIN_IN_WEB', '0') == '1'
+
+_load_lock = threading.Lock()
+_stock_lstm = None
+
+def lstm_module():
+    """回傳 stockLSTM 模組，第一次呼叫時才匯入（TensorFlow、sklearn）"""
+    global _stock_lstm
+    if _stock_lstm is None:
+        with _load_lock:
+            if _stock_lstm is None:
+                start = time.perf_counter()
+                from . import stockLSTM
+                print(f"已載入 LSTM 訓練模組 ({time.perf_counter() - start:.1f} 秒)")
+                _stock_lstm = stockLSTM
+    return _stock_lstm
+
+def fine_tune_model(symbol_full, include_sentiment):
+    return inference_client.run_task("fine_tune_model", symbol_full, include_sentiment)
+
+def current_model_rmse(symbol_full, include_sentiment):
+    return inference_client.run_task("current_model_rmse", symbol_full, include_sentiment)
+
+def train_global_model(symbols=None):
+    return inference_client.run_task("train_global_model", symbols)
+
+# API 路由：新聞情感
+@stock_app_blueprint.route('/api/stock_sentiment/<symbol>', methods=['GET'])
+@cached_route('sentiment', SENTIMENT_TTL)
+def analysis_stock_sentiment(symbol):
+    return stock_sentiment(symbol)
+
+# API 路由：LSTM 預測
+@stock_app_blueprint.route('/api/lstm_predict/<symbol>/<market>', methods=['GET'])
+def lstm_predict_stock(symbol, market='US'):
+    return predict_stock(symbol, market)
+
+# API 路由：批次 LSTM 預測，body 為 {"symbols": [...], "market": "TW" | "US"}（market 可省略），回傳 NDJSON
+@stock_app_blueprint.route('/api/lstm_predict/batch', methods=['POST'])
+def lstm_predict_batch():
+    data = request.get_json(silent=True) or {}
+    return predict_batch(data.get('symbols'), data.get('market'))
+
+def run_backtest(symbol_full, mode, period, train_bars, test_bars):
+    """背景回測工作，工作結果只記錄摘要（完整結果由 /api/lstm_backtest 讀取）"""
+    result = backtest_engine.run_backtest(symbol_full, mode, period, train_bars, test_bars)
+    return {key: result[key] for key in ("version", "data_through", "overall", "seconds")}
+
+# API 路由：滾動前進回測，查詢參數 mode (retrain/fine_tune)、period、train_bars、test_bars
+# 已有相同模型版本與資料日期的結果時直接回傳，否則排入回測佇列並回傳 202 與工作編號（以 /api/lstm_jobs 查詢）
+@stock_app_blueprint.route('/api/lstm_backtest/<symbol>/<market>', methods=['GET'])
+def lstm_backtest(symbol, market='US'):
+    symbol_full = f"{symbol}.TW" if market == 'TW' else symbol
+    params = (
+        request.args.get('mode', 'retrain'),
+        request.args.get('period', '5y'),
+        request.args.get('train_bars', backtest_engine.TRAIN_BARS, type=int),
+        request.args.get('test_bars', backtest_engine.TEST_BARS, type=int),
+    )
+    try:
+        result, version = backtest_engine.find_result(symbol_full, *params)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if result is not None:
+        return jsonify(result)
+
+    try:
+        job, _ = backtest_engine.backtest_queue.submit(f"backtest:{symbol_full}:{version}", False,
+                                                       run_backtest, symbol_full, *params)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({"status": "running", "version": version, "training_job": job}), 202
+
+# API 路由：已載入的 LSTM 模型與命中次數（使用推論服務時為推論服務的登錄表與批次統計）
+@stock_app_blueprint.route('/api/lstm_models', methods=['GET'])
+def get_lstm_models():
+    return jsonify(inference_client.server_stats() or registry.stats())
+
+# API 路由：在背景訓練全域模型，body 可指定 {"symbols": [...]}，未指定時使用市值最大的美股
+@stock_app_blueprint.route('/api/lstm_global/train', methods=['POST'])
+def train_lstm_global():
+    symbols = (request.get_json(silent=True) or {}).get('symbols') or None
+    try:
+        job, created = training_queue.submit(GLOBAL_SYMBOL, False, train_global_model, symbols)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({"created": created, "training_job": job}), 202
+
+# API 路由：訓練工作狀態
+@stock_app_blueprint.route('/api/lstm_jobs/<job_id>', methods=['GET'])
+def get_lstm_job(job_id):
+    job = training_queue.status(job_id)
+    if job is None:
+        return jsonify({"error": f"找不到訓練工作: {job_id}"}), 404
+    return jsonify(job)
+
+# API 路由：最近的訓練工作
+@stock_app_blueprint.route('/api/lstm_jobs', methods=['GET'])
+def get_lstm_jobs():
+    return jsonify(training_queue.recent(request.args.get('limit', 50, type=int)))
+
+# API 路由：立即執行一次模型排程更新（微調過期或誤差惡化的模型）
+@stock_app_blueprint.route('/api/lstm_retrain', methods=['POST'])
+def trigger_lstm_retrain():
+    started = inference_client.start_retraining()
+    if started is None:
+        # 沒有推論服務：在目前行程微調（第一次呼叫時載入 TensorFlow）
+        started = start_retraining(fine_tune_model, current_model_rmse)
+    return jsonify({"started": started, "retrain": retrain_status()}), 202 if started else 409
+
+# API 路由：模型排程更新進度
+@stock_app_blueprint.route('/api/lstm_retrain/status', methods=['GET'])
+def get_lstm_retrain_status():
+    return jsonify(retrain_status())
+
+@stock_app_blueprint.record_once
+def start_background_jobs(state):
+    """blueprint 第一次註冊到 app 時啟動背景執行緒"""
+    # 回測行程池的子行程（spawn）會重新匯入主程式，不在子行程中啟動背景工作
+    if multiprocessing.parent_process() is not None:
+        return
+
+    # 在背景預先載入最常使用的模型（STOCK_PREWARM_MODELS > 0 時，會在背景載入 TF；使用推論服務時由推論服務載入）
+    if not inference_client.use_remote():
+        registry.prewarm_async()
+
+    if PRELOAD_ML:
+        threading.Thread(target=lstm_module, name='ml-preload', daemon=True).start()
+
+    # 每天離峰時段微調過期或誤差惡化的模型（有推論服務時由推論服務執行；STOCK_RETRAIN_HOUR < 0 時停用）
+    if RETRAIN_IN_WEB or not inference_client.use_remote():
+        start_scheduler(fine_tune_model, current_model_rmse)
+
+    # 背景更新最近被查詢過的股票的新聞情感（STOCK_SENTIMENT_INTERVAL <= 0 時停用）
+    sentiment_store.start_ingester(score_news)
@@ -0,0 +1,247 @@
+"""
+LSTM 模型登錄表
+
+每次 /api/lstm_predict 都呼叫 load_model 並重新 unpickle 縮放器，
+反序列化三層 LSTM 需要數百毫秒，且 TF 圖形記憶體會隨時間累積。
+這裡以 (symbol, with_sentiment) 為鍵保留已載入的模型與縮放器：
+- 估計的參數記憶體超過 MAX_REGISTRY_BYTES 時淘汰最久未使用的模型
+- 模型或縮放器檔案的 mtime 改變（重新訓練、排程更新）時自動重新載入；
+  寫入一律經過 save_model_files（暫存檔 + os.replace），不會載入到寫到一半的檔案
+- 記錄每個模型的使用次數，啟動時可預先載入最常用的 PREWARM_MODELS 個
+
+TensorFlow 只在實際載入模型時才匯入，查詢登錄表狀態、模型檔案與 meta 不需要載入 TF。
+"""
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+# 在模型登錄表與 MODEL_DIR 中代表全域模型的名稱
+GLOBAL_SYMBOL = '__global__'
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), 'models')
+os.makedirs(MODEL_DIR, exist_ok=True)
+
+USAGE_PATH = os.path.join(os.path.dirname(__file__), 'data', 'model_usage.json')
+
+# 已載入模型的記憶體上限（以參數數量估算，位元組）
+MAX_REGISTRY_BYTES = 512 * 1024 * 1024
+
+# 啟動時預先載入的模型數量，0 表示不預先載入
+PREWARM_MODELS = int(os.environ.get('STOCK_PREWARM_MODELS', '0'))
+
+# 每累積多少次使用紀錄寫回 USAGE_PATH
+USAGE_FLUSH_EVERY = 20
+
+def get_model_path(symbol, with_sentiment=True):
+    """獲取模型路徑，帶有是否包含情感分析的選項"""
+    suffix = "_with_sentiment" if with_sentiment else ""
+    return os.path.join(MODEL_DIR, f"{symbol}_lstm_model{suffix}.keras")
+
+def get_scaler_path(symbol, with_sentiment=True):
+    """獲取縮放器路徑，帶有是否包含情感分析的選項"""
+    suffix = "_with_sentiment" if with_sentiment else ""
+    return os.path.join(MODEL_DIR, f"{symbol}_scaler{suffix}.pkl")
+
+def get_meta_path(symbol, with_sentiment=True):
+    """模型中繼資料（訓練資料的最後日期、基準 RMSE）路徑"""
+    suffix = "_with_sentiment" if with_sentiment else ""
+    return os.path.join(MODEL_DIR, f"{symbol}_meta{suffix}.json")
+
+def read_model_meta(symbol, with_sentiment=True):
+    """讀取模型中繼資料，沒有時回傳空 dict"""
+    path = get_meta_path(symbol, with_sentiment)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def save_model_files(symbol, with_sentiment, model, scaler, meta=None):
+    """
+    先寫入暫存檔再以 os.replace 替換模型、縮放器與中繼資料
+
+    讀取端（登錄表、其他 worker）不會讀到寫到一半的檔案；
+    縮放器先於模型替換，登錄表以模型 mtime 偵測到更新時兩者都已是新版
+    """
+    model_path = get_model_path(symbol, with_sentiment)
+    scaler_path = get_scaler_path(symbol, with_sentiment)
+    tag = f"{os.getpid()}.{threading.get_ident()}.tmp"
+
+    # Keras 依副檔名決定格式，暫存檔同樣以 .keras 結尾
+    tmp_model_path = f"{model_path[:-len('.keras')]}.{tag}.keras"
+    tmp_scaler_path = f"{scaler_path}.{tag}"
+    model.save(tmp_model_path)
+    with open(tmp_scaler_path, 'wb') as f:
+        pickle.dump(scaler, f)
+
+    os.replace(tmp_scaler_path, scaler_path)
+    os.replace(tmp_model_path, model_path)
+    if meta is not None:
+        meta_path = get_meta_path(symbol, with_sentiment)
+        tmp_meta_path = f"{meta_path}.{tag}"
+        with open(tmp_meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_meta_path, meta_path)
+
+def load_model_files(symbol, with_sentiment=True):
+    """直接從檔案載入 (model, scaler)，不經過登錄表（例如微調時需要獨立的模型副本）"""
+    from tensorflow.keras.models import load_model # type: ignore
+
+    # 只用於推論，不需要重建優化器狀態；微調時由呼叫端重新 compile
+    model = load_model(get_model_path(symbol, with_sentiment), compile=False)
+    with open(get_scaler_path(symbol, with_sentiment), 'rb') as f:
+        scaler = pickle.load(f)
+    return model, scaler
+
+def _model_bytes(model):
+    # float32 權重，另外預留一倍給 LSTM 的暫存張量
+    return model.count_params() * 4 * 2
+
+def _mtimes(model_path, scaler_path):
+    return os.path.getmtime(model_path), os.path.getmtime(scaler_path)
+
+class ModelRegistry:
+    def __init__(self, max_bytes=MAX_REGISTRY_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 同一個行程的多個執行緒不同時寫入 USAGE_PATH（暫存檔名只以 pid 區分）
+        self._flush_lock = threading.Lock()
+        # (symbol, with_sentiment) -> {"model", "scaler", "mtimes", "bytes"}，順序為 LRU 順序
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._key_locks = {}
+        self._usage = {}
+        self._pending_usage = 0
+        self._stats = {"hits": 0, "loads": 0, "reloads": 0, "evictions": 0}
+
+    def _key_lock(self, key):
+        """同一個模型同時只允許一個執行緒載入"""
+        with self._lock:
+            if key not in self._key_locks:
+                self._key_locks[key] = threading.Lock()
+            return self._key_locks[key]
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry["bytes"]
+
+    def _store(self, key, model, scaler, mtimes):
+        size = _model_bytes(model)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {"model": model, "scaler": scaler, "mtimes": mtimes, "bytes": size}
+            self._bytes += size
+            # 超過上限時淘汰最久未使用的模型（至少保留剛載入的這一個）
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def exists(self, symbol, with_sentiment=True):
+        return os.path.exists(get_model_path(symbol, with_sentiment)) and \
+            os.path.exists(get_scaler_path(symbol, with_sentiment))
+
+    def get(self, symbol, with_sentiment=True, record=True):
+        """
+        取得 (model, scaler, 模型檔案 mtime)
+
+        模型檔案不存在時拋出 FileNotFoundError；record=False 時不計入使用次數
+        """
+        key = (symbol, with_sentiment)
+        model_path = get_model_path(symbol, with_sentiment)
+        scaler_path = get_scaler_path(symbol, with_sentiment)
+        if record:
+            self._record_usage(key)
+
+        with self._key_lock(key):
+            mtimes = _mtimes(model_path, scaler_path)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry["mtimes"] == mtimes:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry["model"], entry["scaler"], mtimes[0]
+                self._stats["reloads" if entry is not None else "loads"] += 1
+
+            print(f"載入模型 {model_path}")
+            model, scaler = load_model_files(symbol, with_sentiment)
+            self._store(key, model, scaler, mtimes)
+            return model, scaler, mtimes[0]
+
+    def put(self, symbol, with_sentiment, model, scaler):
+        """訓練完成並存檔後直接放入登錄表，避免下一次請求重新載入"""
+        key = (symbol, with_sentiment)
+        mtimes = _mtimes(get_model_path(symbol, with_sentiment), get_scaler_path(symbol, with_sentiment))
+        self._store(key, model, scaler, mtimes)
+
+    def invalidate(self, symbol, with_sentiment=True):
+        with self._lock:
+            if (symbol, with_sentiment) in self._entries:
+                self._remove((symbol, with_sentiment))
+
+    def _record_usage(self, key):
+        with self._lock:
+            name = f"{key[0]}|{int(key[1])}"
+            self._usage[name] = self._usage.get(name, 0) + 1
+            self._pending_usage += 1
+            if self._pending_usage < USAGE_FLUSH_EVERY:
+                return
+            usage, self._usage, self._pending_usage = self._usage, {}, 0
+        self._flush_usage(usage)
+
+    def _flush_usage(self, usage):
+        """將本行程累積的使用次數加到 USAGE_PATH（各 worker 共用）"""
+        with self._flush_lock:
+            try:
+                counts = self.usage_counts()
+                for name, count in usage.items():
+                    counts[name] = counts.get(name, 0) + count
+                tmp_path = f"{USAGE_PATH}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(counts, f)
+                os.replace(tmp_path, USAGE_PATH)
+            except OSError as e:
+                print(f"寫入模型使用紀錄失敗: {e}")
+
+    def usage_counts(self):
+        if not os.path.exists(USAGE_PATH):
+            return {}
+        try:
+            with open(USAGE_PATH, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def prewarm(self, limit=PREWARM_MODELS):
+        """預先載入最常使用的模型"""
+        counts = self.usage_counts()
+        for name in sorted(counts, key=counts.get, reverse=True)[:limit]:
+            symbol, with_sentiment = name.rsplit('|', 1)
+            if not self.exists(symbol, bool(int(with_sentiment))):
+                continue
+            try:
+                self.get(symbol, bool(int(with_sentiment)), record=False)
+            except Exception as e:
+                print(f"預先載入模型 {symbol} 失敗: {e}")
+
+    def prewarm_async(self, limit=PREWARM_MODELS):
+        if limit <= 0:
+            return None
+        thread = threading.Thread(target=self.prewarm, args=(limit,), name='model-prewarm', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._stats,
+                models=[f"{symbol}{' (sentiment)' if s else ''}" for symbol, s in self._entries],
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+            )
+
+registry = ModelRegistry()
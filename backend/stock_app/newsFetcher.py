@@ -0,0 +1,216 @@
+"""
+新聞列表與文章內容的抓取
+
+analysis_stock_sentiment 原本逐篇抓取最多 20 篇文章，且每次請求都重新抓取：
+- 文章內容不會改變，以 URL 為鍵快取 ARTICLE_TTL；沒有取出正文（付費牆、版面改變）時只保存 EMPTY_ARTICLE_TTL
+- 新聞列表頁以股票代號為鍵快取 NEWS_LIST_TTL（短 TTL，新新聞很快就會出現）
+- 未快取的文章以 ThreadPoolExecutor 同時抓取，速率由 yahoo_session 依主機共用的
+  token bucket 控制（所有 worker 共用額度），不再逐篇等待
+
+HTML 解析 (parse_news_list, extract_article_text) 與網路請求分開，BeautifulSoup 在第一次解析時才匯入；
+NEWS_BASE_URL 可由 STOCK_NEWS_BASE_URL 指向本地的 HTML 測試伺服器。
+"""
+import os
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+from .rateLimiter import yahoo_session, retry_on_429
+from .ttlCache import cached
+
+NEWS_BASE_URL = os.environ.get('STOCK_NEWS_BASE_URL', 'https://finance.yahoo.com')
+
+# 新聞列表頁的保存秒數
+NEWS_LIST_TTL = 10 * 60
+
+# 文章內容的保存秒數（文章發布後不會改變）
+ARTICLE_TTL = 7 * 24 * 60 * 60
+
+# 沒有取出正文時的保存秒數（可能只是暫時失敗，與新聞列表相同，很快會重新抓取）
+EMPTY_ARTICLE_TTL = NEWS_LIST_TTL
+
+# 每次分析最多抓取的文章數量
+MAX_ARTICLES = 20
+
+# 同時抓取文章的執行緒數量（實際速率仍受 yahoo_web / default 預算限制）
+ARTICLE_WORKERS = 5
+
+REQUEST_TIMEOUT = 15
+
+# 新聞列表的選擇器
+NEWS_SELECTORS = [
+    'li.js-stream-content',
+    'content yf-1y7058a',
+    'div.content.yf-1y7058a, li.js-stream-content'
+]
+
+# 文章正文的選擇器（不同網站可能有不同的結構）
+ARTICLE_SELECTORS = [
+    'div[data-test-locator="articleBody"]',
+    'div.caas-body',
+    'div.article-body',
+    'div[class*="content"]',
+    'article',
+    'div[itemprop="articleBody"]'
+]
+
+def browser_headers():
+    """模擬瀏覽器的請求頭，每次使用不同的 Chrome 版本"""
+    return {
+        "User-Agent": f"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{random.randint(90, 108)}.0.{random.randint(4000, 5000)}.{random.randint(0, 150)} Safari/537.36",
+        "Accept-Language": "en-US,en;q=0.9",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+        "Connection": "keep-alive",
+        "Upgrade-Insecure-Requests": "1",
+        "Cache-Control": "max-age=0",
+        "Referer": "https://www.google.com/search?q=finance"
+    }
+
+def process_time_text(time_text):
+    """處理從Yahoo Finance獲取的時間文本，轉換為標準格式"""
+    if not time_text:
+        return ""
+
+    try:
+        # 解析來源和時間
+        source_time_parts = time_text.split('•')
+        if len(source_time_parts) > 1:
+            source = source_time_parts[0].strip()
+            time_part = source_time_parts[1].strip()
+        else:
+            source = ""
+            time_part = time_text.strip()
+
+        # 處理時間格式
+        if "hours ago" in time_part or "hour ago" in time_part:
+            hour_match = re.search(r'(\d+)\s*hour', time_part)
+            if hour_match:
+                hours = int(hour_match.group(1))
+                result = f"{hours}小時前"
+                return f"{source} • {result}" if source else result
+
+        elif "minutes ago" in time_part or "minute ago" in time_part:
+            minute_match = re.search(r'(\d+)\s*minute', time_part)
+            if minute_match:
+                minutes = int(minute_match.group(1))
+                result = f"{minutes}分鐘前"
+                return f"{source} • {result}" if source else result
+
+        elif "days ago" in time_part or "day ago" in time_part:
+            day_match = re.search(r'(\d+)\s*day', time_part)
+            if day_match:
+                days = int(day_match.group(1))
+                result = f"{days}天前"
+                return f"{source} • {result}" if source else result
+
+        return time_text
+    except Exception as e:
+        print(f"處理時間文本出錯: {str(e)}")
+        return time_text
+
+def _soup(html):
+    """解析 HTML（第一次解析時才匯入 BeautifulSoup，匯入路由時不需要載入 bs4）"""
+    from bs4 import BeautifulSoup # type: ignore
+    return BeautifulSoup(html, 'html.parser')
+
+def parse_news_list(html, base_url=NEWS_BASE_URL):
+    """從新聞列表頁解析 [{title, link, publish_time}, ...]"""
+    soup = _soup(html)
+    news_items = []
+    news_containers = []
+
+    # 嘗試多種選擇器來獲取標題和連結
+    for selector in NEWS_SELECTORS:
+        elements = soup.select(selector)
+        if elements:
+            news_containers.extend(elements)
+            print(f"使用選擇器 {selector} 獲取新聞項目")
+
+    for container in news_containers:
+        title_element = container.find('h3') or container.find('a[data-test="mega-headline"]')
+        if not title_element:
+            continue
+
+        title = title_element.get_text().strip()
+
+        # 找尋連結
+        link_element = container.select_one('a[href]')
+        link = link_element.get('href') if link_element else None
+        if link and not link.startswith(('http://', 'https://')):
+            link = urljoin(base_url, link)
+
+        # 查找發布時間和來源
+        time_text = ""
+        time_element = container.select_one('.caas-attr-time-style') or container.select_one('.publishing') or container.select_one('div[class*="Fz(12px)"]')
+        if time_element:
+            time_text = time_element.get_text().strip()
+
+        if title and len(title) > 10 and link:
+            news_items.append({
+                'title': title,
+                'link': link,
+                'publish_time': process_time_text(time_text)
+            })
+
+    # 如果主選擇器沒有找到足夠的新聞，嘗試備用選擇器
+    if len(news_items) < 5:
+        for headline in soup.select('h3, h4'):
+            link_parent = headline.find_parent('a', href=True)
+            if link_parent:
+                title = headline.get_text().strip()
+                link = link_parent.get('href')
+
+                if link and not link.startswith(('http://', 'https://')):
+                    link = urljoin(base_url, link)
+
+                if title and len(title) > 10 and link:
+                    news_items.append({'title': title, 'link': link, 'publish_time': ""})
+
+    return news_items
+
+def extract_article_text(html):
+    """從文章頁面取出正文段落，找不到時回傳空字串"""
+    article_soup = _soup(html)
+    article_text = ""
+    for selector in ARTICLE_SELECTORS:
+        content_div = article_soup.select_one(selector)
+        if content_div:
+            # 提取所有段落
+            paragraphs = content_div.find_all('p')
+            if paragraphs:
+                article_text = ' '.join([p.get_text().strip() for p in paragraphs])
+                if len(article_text) > 100:  # 確保文章內容有最小長度
+                    break
+    return article_text
+
+@cached('news_list', NEWS_LIST_TTL)
+@retry_on_429(max_retries=5, budget='yahoo_web')
+def fetch_news_list(symbol, base_url=NEWS_BASE_URL):
+    """股票的新聞列表（快取 NEWS_LIST_TTL 秒）"""
+    news_url = f"{base_url}/quote/{symbol}/news"
+    print(f"嘗試連接 {news_url}...")
+    response = yahoo_session.get(news_url, headers=browser_headers(), timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return parse_news_list(response.text, base_url)
+
+@cached('article', ARTICLE_TTL, empty_ttl=EMPTY_ARTICLE_TTL)
+def fetch_article(url):
+    """文章正文（以 URL 為鍵快取；請求失敗時拋出例外，不寫入快取；空的正文只快取 EMPTY_ARTICLE_TTL）"""
+    response = yahoo_session.get(url, headers=browser_headers(), timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return extract_article_text(response.text)
+
+def _fetch_article_safe(url):
+    try:
+        return fetch_article(url)
+    except Exception as e:
+        print(f"獲取文章時出錯: {str(e)}")
+        return ""
+
+def fetch_articles(urls, max_workers=ARTICLE_WORKERS):
+    """同時抓取多篇文章，回傳與 urls 順序相同的正文（失敗為空字串）"""
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls)), thread_name_prefix='news-article') as executor:
+        return list(executor.map(_fetch_article_safe, urls))
@@ -0,0 +1,207 @@
+"""
+新聞情感分析（VADER）
+
+NLTK 與 VADER 詞典只在第一次評分新聞時載入（_analyzer），
+匯入這個模組、讀取 sentimentStore 中已評分的新聞都不需要 NLTK。
+"""
+import logging
+import re
+import threading
+import time
+
+import pandas as pd # type: ignore
+
+from . import sentimentStore as sentiment_store
+from .sentimentScoring import score_news_batch
+
+# 權重細節只在 DEBUG 等級輸出（背景 ingester 每次評分都會呼叫 calculate_balanced_sentiment）
+logger = logging.getLogger(__name__)
+
+_sid = None
+_sid_lock = threading.Lock()
+
+def _analyzer():
+    """VADER 分析器，第一次呼叫時載入 NLTK（缺少詞典時下載 vader_lexicon）"""
+    global _sid
+    if _sid is None:
+        with _sid_lock:
+            if _sid is None:
+                import nltk # type: ignore
+                from nltk.sentiment.vader import SentimentIntensityAnalyzer # type: ignore
+                try:
+                    nltk.data.find('vader_lexicon')
+                except LookupError:
+                    nltk.download('vader_lexicon')
+                _sid = SentimentIntensityAnalyzer()
+    return _sid
+
+# 計算平均情感時納入最近幾天的新聞
+RECENT_NEWS_DAYS = 7
+
+def vader_compound(text):
+    """VADER 原始情感分數"""
+    return _analyzer().polarity_scores(text)['compound']
+
+def score_news(symbols, titles, contents):
+    """
+    新聞評分（sentimentStore 的 scorer），回傳每則新聞的 (標題分數, 綜合分數)
+
+    symbols 為每則新聞的股票代號；標題與文章段落（可來自多檔股票）一次交給 sentimentScoring 批次評分
+    """
+    title_scores, combined = score_news_batch(titles, symbols, contents, vader_compound)
+    return list(zip(title_scores.tolist(), combined.tolist()))
+
+def _display_time(headline, now):
+    """新聞時間顯示為「來源 • N小時前」，calculate_balanced_sentiment 依此計算時間權重"""
+    hours = int(max(0, now - headline["published_at"]) // 3600)
+    text = f"{hours}小時前" if hours > 0 else f"{int(max(0, now - headline['published_at']) // 60)}分鐘前"
+    return f"{headline['source']} • {text}" if headline["source"] else text
+
+def sentiment_summary(symbol):
+    """
+    回傳 (影響最大的 5 則新聞, 最近新聞的平均情感)
+
+    由 sentimentStore 讀取；第一次查詢的股票先同步抓取一次，之後由背景 ingester 更新
+    """
+    sentiment_store.track(symbol)
+    try:
+        sentiment_store.ensure_ingested(symbol, score_news)
+    except Exception as e:
+        print(f"爬取 {symbol} 新聞列表時出錯: {str(e)}")
+
+    now = time.time()
+    headlines = sentiment_store.recent_headlines(symbol, RECENT_NEWS_DAYS, now)
+    for headline in headlines:
+        headline["publish_time"] = _display_time(headline, now)
+
+    # 計算最終加權平均情感分數
+    avg_sentiment = calculate_balanced_sentiment(
+        [h["score"] for h in headlines], [h["publish_time"] for h in headlines], [h["title"] for h in headlines]
+    )
+    top_5_news = [
+        {"title": h["title"], "impact": h["impact"], "link": h["link"], "publish_time": h["publish_time"]}
+        for h in sorted(headlines, key=lambda x: abs(x['impact']), reverse=True)[:5]
+    ]
+    return top_5_news, avg_sentiment
+
+def analysis_stock_sentiment(symbol, days=30):
+    """最近 days 個交易日的每日情感、影響最大的新聞與平均情感"""
+    top_5_news, avg_sentiment = sentiment_summary(symbol)
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    return {
+        "sentiment_trend": [float(s) for s in sentiment_store.daily_series(symbol, dates)],
+        "top_news": top_5_news,
+        "avg_sentiment": avg_sentiment
+    }
+
+def _log_weights(debug_info, strong_negative_count, total_weight, final_score):
+    """以 DEBUG 等級輸出情感分析的權重細節（前 10 則）"""
+    lines = [
+        "情感分析權重細節:",
+        f"{'標題':<35} {'原始分數':>10} {'時間權重':>10} {'情感權重':>10} {'綜合權重':>10} {'加權分數':>10}",
+        "-" * 90,
+    ]
+    for item in debug_info[:10]:
+        lines.append(f"{item['title']:<35} {item['score']:>10.4f} {item['time_weight']:>10.4f} {item['sentiment_weight']:>10.4f} {item['combined_weight']:>10.4f} {item['weighted_score']:>10.4f}")
+    if len(debug_info) > 10:
+        lines.append(f"...以及其他 {len(debug_info)-10} 項")
+    lines.append(f"強負面文章數量: {strong_negative_count}")
+    lines.append(f"總權重: {total_weight:.4f}")
+    lines.append(f"最終情感分數: {final_score:.4f}")
+    logger.debug("\n".join(lines))
+
+def calculate_balanced_sentiment(scores, times=None, titles=None):
+    """
+    計算更均衡的情感平均值，考慮時間衰減和負面新聞放大
+    
+    參數:
+    - scores: 情感分數列表
+    - times: 對應的發布時間信息（可選）
+    - titles: 對應的標題（可選，logger 為 DEBUG 等級時輸出權重細節）
+    """
+    if not scores:
+        return 0.0
+    
+    # 1. 時間權重：根據是否有時間信息計算時間衰減權重
+    time_weights = []
+    if times:
+        # 解析時間信息并計算相對權重
+        for time_info in times:
+            if "小時前" in str(time_info):
+                try:
+                    hours = int(re.search(r'(\d+)小時前', str(time_info)).group(1))
+                    # 新聞越新權重越大，24小時內權重遞減
+                    # 24小時前權重0.5，1小時前權重接近1.0
+                    time_weight = 0.5 + 0.5 * (1.0 - min(24.0, float(hours)) / 24.0)
+                except:
+                    time_weight = 0.7  # 默認時間權重
+            elif "分鐘前" in str(time_info):
+                time_weight = 1.0  # 非常新的新聞
+            else:
+                time_weight = 0.7  # 默認時間權重
+            time_weights.append(time_weight)
+    else:
+        # 沒有時間信息，使用平等權重
+        time_weights = [1.0] * len(scores)
+    
+    # 2. 情感權重：負面消息給予更大權重
+    sentiment_weights = []
+    for score in scores:
+        if score < -0.2:  # 明顯負面
+            # 負面程度越高，權重越大 (-1的權重為2.5，-0.2的權重為1.1)
+            sentiment_weight = 1.0 + min(1.5, abs(score) * 1.5)
+        elif score < 0:  # 輕微負面
+            sentiment_weight = 1.0 + abs(score) * 0.5
+        elif score > 0.5:  # 強烈正面
+            sentiment_weight = 0.9  # 降低強烈正面的權重
+        elif score > 0:  # 輕微正面
+            sentiment_weight = 0.95
+        else:  # 中性
+            sentiment_weight = 0.8
+        sentiment_weights.append(sentiment_weight)
+    
+    # 3. 計算加權分數
+    weighted_scores = []
+    total_weight = 0
+    
+    # 調試信息（只在 DEBUG 等級收集）
+    debug = bool(titles) and logger.isEnabledFor(logging.DEBUG)
+    debug_info = []
+    
+    for i, score in enumerate(scores):
+        # 計算這個分數的綜合權重
+        combined_weight = time_weights[i] * sentiment_weights[i]
+        weighted_score = score * combined_weight
+        
+        weighted_scores.append(weighted_score)
+        total_weight += combined_weight
+        
+        # 收集調試信息
+        if debug and i < len(titles):
+            short_title = titles[i][:30] + "..." if len(titles[i]) > 30 else titles[i]
+            debug_info.append({
+                "title": short_title,
+                "score": score,
+                "time_weight": time_weights[i],
+                "sentiment_weight": sentiment_weights[i],
+                "combined_weight": combined_weight,
+                "weighted_score": weighted_score
+            })
+    
+    # 計算加權平均
+    if total_weight > 0:
+        final_score = sum(weighted_scores) / total_weight
+    else:
+        final_score = 0.0
+    
+    # 強負面懲罰：如果有多個顯著負面文章(20%文章強烈負面),進一步降低分數
+    strong_negative_count = sum(1 for s in scores if s < -0.5)
+    if strong_negative_count >= max(2, len(scores) * 0.2):
+        negative_penalty = min(0.15, 0.05 * strong_negative_count)
+        final_score -= negative_penalty
+    
+    if debug:
+        _log_weights(debug_info, strong_negative_count, total_weight, final_score)
+    
+    # 限制最終分數在 -1 到 1 之間
+    return max(-1.0, min(1.0, final_score))
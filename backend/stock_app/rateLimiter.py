@@ -0,0 +1,260 @@
+"""
+Yahoo 請求的共用速率限制
+
+所有 yfinance 與新聞爬蟲的 HTTP 請求都經由 RateLimitedSession 發出，
+依主機 (host) 對應的 token bucket 取得額度後才送出：
+- RateLimitedSession 繼承 curl_cffi 的 Session 並模擬 Chrome 的 TLS 指紋 (impersonate="chrome")，
+  yfinance 需要這種 session，Yahoo 會以 429 或缺少 crumb 拒絕一般 requests 的 session
+- 每個預算 (budget) 以固定速率補充 token，容量決定可承受的突發請求數
+- 收到 429 時依 Retry-After（沒有則以指數退避）暫停該預算，所有執行緒一起等待
+- 預算狀態存放在 data/rate_limits.db (SQLite)，多個 gunicorn worker 共用同一份額度
+
+/api/rate_limits 回傳目前各預算的 token 數、需等待秒數與統計。
+"""
+import functools
+import os
+import random
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from curl_cffi import requests as curl_requests # type: ignore
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'data', 'rate_limits.db')
+
+# 預算名稱 -> (每秒補充的 token 數, 容量)
+BUDGETS = {
+    'yahoo_api': (2.0, 10),   # query1/query2：報價、歷史資料、.info
+    'yahoo_web': (1.0, 5),    # finance.yahoo.com 網頁：新聞列表與文章
+    'default': (2.0, 10),     # 其他主機（新聞來源網站等）
+}
+
+# 主機 -> 預算名稱，未列出的主機使用 default
+HOST_BUDGETS = {
+    'query1.finance.yahoo.com': 'yahoo_api',
+    'query2.finance.yahoo.com': 'yahoo_api',
+    'fc.yahoo.com': 'yahoo_api',
+    'guce.yahoo.com': 'yahoo_api',
+    'finance.yahoo.com': 'yahoo_web',
+}
+
+# 沒有 Retry-After 時，第一次 429 暫停的秒數（之後每次加倍）
+DEFAULT_BACKOFF = 2.0
+MAX_BACKOFF = 120.0
+
+# RateLimitedSession 遇到 429 時自動重試的次數
+MAX_RETRIES = 5
+
+def budget_for(url):
+    host = urlparse(url).hostname or ''
+    return HOST_BUDGETS.get(host, 'default')
+
+def parse_retry_after(value):
+    """解析 Retry-After 標頭（秒數或 HTTP 日期），無法解析時回傳 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RateLimiter:
+    """以 SQLite 保存狀態的跨行程 token bucket"""
+
+    def __init__(self, db_path=DB_PATH, budgets=BUDGETS):
+        self.db_path = db_path
+        self.budgets = budgets
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        # 本行程的統計
+        self._stats = {name: {"requests": 0, "throttled": 0, "waited_seconds": 0.0} for name in budgets}
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    blocked_until REAL NOT NULL DEFAULT 0,
+                    backoff REAL NOT NULL DEFAULT 0
+                )
+            """)
+            self._local.conn = conn
+        return conn
+
+    def _load(self, conn, name, now):
+        """讀取預算狀態並依經過時間補充 token（需在交易中呼叫）"""
+        rate, capacity = self.budgets[name]
+        row = conn.execute(
+            "SELECT tokens, updated_at, blocked_until, backoff FROM buckets WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            return capacity, 0.0, 0.0
+        tokens, updated_at, blocked_until, backoff = row
+        tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+        return tokens, blocked_until, backoff
+
+    def _save(self, conn, name, tokens, now, blocked_until, backoff):
+        conn.execute(
+            "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?)",
+            (name, tokens, now, blocked_until, backoff)
+        )
+
+    def _record(self, name, **deltas):
+        with self._stats_lock:
+            for key, value in deltas.items():
+                self._stats[name][key] += value
+
+    def acquire(self, name='default'):
+        """取得一個 token，額度不足或預算被暫停時阻塞等待"""
+        rate, _ = self.budgets[name]
+        conn = self._connect()
+        waited = 0.0
+        while True:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, blocked_until, backoff = self._load(conn, name, now)
+                if now >= blocked_until and tokens >= 1:
+                    self._save(conn, name, tokens - 1, now, blocked_until, backoff)
+                    conn.execute("COMMIT")
+                    self._record(name, requests=1, waited_seconds=waited)
+                    return waited
+                self._save(conn, name, tokens, now, blocked_until, backoff)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            wait = max(blocked_until - now, (1 - tokens) / rate, 0.01)
+            # 加上少量隨機時間，避免多個等待者同時醒來
+            wait = min(wait, 1.0) + random.uniform(0, 0.05)
+            time.sleep(wait)
+            waited += wait
+
+    def penalize(self, name='default', retry_after=None):
+        """
+        收到 429 時暫停整個預算
+
+        有 Retry-After 時依其秒數暫停，否則使用指數退避；回傳暫停秒數
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            tokens, blocked_until, backoff = self._load(conn, name, now)
+            if retry_after is None:
+                backoff = min(MAX_BACKOFF, backoff * 2 if backoff else DEFAULT_BACKOFF)
+                delay = backoff
+            else:
+                delay = retry_after
+            blocked_until = max(blocked_until, now + delay)
+            self._save(conn, name, 0.0, now, blocked_until, backoff)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._record(name, throttled=1)
+        print(f"Rate limit hit ({name}), pausing {delay:.2f} seconds...")
+        return delay
+
+    def wait(self, name='default'):
+        """等待預算解除暫停（不消耗 token）"""
+        conn = self._connect()
+        row = conn.execute("SELECT blocked_until FROM buckets WHERE name = ?", (name,)).fetchone()
+        delay = (row[0] - time.time()) if row else 0
+        if delay > 0:
+            time.sleep(delay)
+            self._record(name, waited_seconds=delay)
+
+    def reset_backoff(self, name='default'):
+        """請求成功後清除指數退避"""
+        conn = self._connect()
+        conn.execute("UPDATE buckets SET backoff = 0 WHERE name = ? AND backoff > 0", (name,))
+
+    def metrics(self):
+        """各預算目前的 token 數、需等待秒數與本行程統計"""
+        conn = self._connect()
+        now = time.time()
+        result = {}
+        for name, (rate, capacity) in self.budgets.items():
+            conn.execute("BEGIN")
+            try:
+                tokens, blocked_until, backoff = self._load(conn, name, now)
+            finally:
+                conn.execute("COMMIT")
+            wait = max(blocked_until - now, (1 - tokens) / rate if tokens < 1 else 0.0, 0.0)
+            with self._stats_lock:
+                stats = dict(self._stats[name])
+            result[name] = {
+                "rate": rate,
+                "capacity": capacity,
+                "tokens": round(tokens, 3),
+                "wait_seconds": round(wait, 3),
+                "blocked_until": blocked_until if blocked_until > now else None,
+                **stats,
+            }
+        return result
+
+limiter = RateLimiter()
+
+class RateLimitedSession(curl_requests.Session):
+    """每個請求送出前先向對應主機的預算取得 token，429 時暫停預算並重試"""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('impersonate', 'chrome')
+        super().__init__(**kwargs)
+
+    def request(self, method, url, *args, **kwargs):
+        name = budget_for(url)
+        for attempt in range(MAX_RETRIES + 1):
+            limiter.acquire(name)
+            response = super().request(method, url, *args, **kwargs)
+            if response.status_code != 429:
+                if attempt:
+                    limiter.reset_backoff(name)
+                return response
+            if attempt == MAX_RETRIES:
+                return response
+            limiter.penalize(name, parse_retry_after(response.headers.get('Retry-After')))
+        return response
+
+def is_rate_limit_error(e):
+    """判斷例外是否由 429 造成（requests 的 HTTPError 或 yfinance 的 YFRateLimitError 等）"""
+    response = getattr(e, 'response', None)
+    if response is not None and getattr(response, 'status_code', None) == 429:
+        return True
+    return type(e).__name__ == 'YFRateLimitError' or '429' in str(e) or 'Too Many Requests' in str(e)
+
+# 請求重試裝飾器：429 時暫停共用預算（而非各自 sleep），等額度恢復後重試
+def retry_on_429(max_retries=5, budget='yahoo_api'):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            for i in range(max_retries):
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    if not is_rate_limit_error(e) or i == max_retries - 1:
+                        raise
+                    response = getattr(e, 'response', None)
+                    retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+                    limiter.penalize(budget, retry_after)
+                    # 等待預算恢復後再重試
+                    limiter.wait(budget)
+        return wrapper
+    return decorator
+
+# 所有模組共用的 session，傳給 yfinance 及新聞爬蟲
+# （瀏覽器標頭由 impersonate 產生，與 TLS 指紋一致，不另外覆寫 User-Agent）
+yahoo_session = RateLimitedSession()
@@ -0,0 +1,233 @@
+"""
+LSTM 模型排程更新
+
+已保存的模型原本會一直使用到用戶端傳入 retrain=true 為止，資料越來越舊、誤差逐漸變大。
+這裡每天在離峰時段 (RETRAIN_HOUR) 檢查 MODEL_DIR 中的模型：
+- 訓練資料的最後日期距今超過 STALE_TRADING_DAYS 個交易日
+- 或最近 RMSE_EVAL_BARS 根K棒的 RMSE 超過訓練時基準的 RMSE_DEGRADATION 倍
+符合條件的模型以保存的權重為起點，只用新的K棒微調（由呼叫端提供 fine_tune 函數），
+同時微調的數量由 RETRAIN_WORKERS 限制，新檔案以 save_model_files 原子替換。
+
+排程執行緒由推論服務啟動；沒有推論服務時（或 STOCK_RETRAIN_IN_WEB=1）由每個 web worker 啟動，
+以檔案鎖確保同一時間只有一個行程執行更新；進度寫在 data/retrain_status.json，任一 worker 都能查詢。
+全域模型 (__global__) 需要多檔股票一起訓練，不在這裡微調。
+"""
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .fileLock import acquire_file_lock, release_file_lock
+from .modelRegistry import GLOBAL_SYMBOL, MODEL_DIR, read_model_meta, get_model_path
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+STATUS_PATH = os.path.join(DATA_DIR, 'retrain_status.json')
+LOCK_PATH = os.path.join(DATA_DIR, 'retrain.lock')
+
+# 訓練資料超過幾個交易日未更新就微調
+STALE_TRADING_DAYS = int(os.environ.get('STOCK_RETRAIN_STALE_DAYS', '5'))
+
+# 最近的 RMSE 超過基準的幾倍視為誤差惡化
+RMSE_DEGRADATION = 1.5
+
+# 計算滾動 RMSE 使用的K棒數量
+RMSE_EVAL_BARS = 20
+
+# 每天執行更新的時間（本地時間，時）；設為 -1 停用排程，只能手動觸發
+RETRAIN_HOUR = int(os.environ.get('STOCK_RETRAIN_HOUR', '2'))
+
+# 同時微調的模型數量
+RETRAIN_WORKERS = int(os.environ.get('STOCK_RETRAIN_WORKERS', '2'))
+
+# 模型檔名：{symbol}_lstm_model[_with_sentiment].keras
+MODEL_FILE_PATTERN = re.compile(r'^(?P<symbol>.+)_lstm_model(?P<sentiment>_with_sentiment)?\.keras$')
+
+_local_lock = threading.Lock()
+_scheduler = None
+
+def _write_json_atomic(path, data):
+    """先寫入暫存檔再取代，避免讀取到寫到一半的檔案"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _update_status(**fields):
+    status = read_status()
+    status.update(fields)
+    _write_json_atomic(STATUS_PATH, status)
+
+def read_status():
+    status = {
+        "state": "idle",
+        "started_at": None,
+        "finished_at": None,
+        "candidates": [],
+        "processed": 0,
+        "results": {},
+        "error": None,
+    }
+    if os.path.exists(STATUS_PATH):
+        try:
+            with open(STATUS_PATH, 'r', encoding='utf-8') as f:
+                status.update(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            pass
+    return status
+
+def is_running():
+    """是否有任一行程正在執行更新"""
+    if _local_lock.locked():
+        return True
+    handle = acquire_file_lock(LOCK_PATH)
+    if handle is None:
+        return True
+    release_file_lock(handle)
+    return False
+
+def job_status():
+    """更新進度，並辨識因行程中止而停在 running 的狀態"""
+    status = read_status()
+    status["next_run"] = next_run_time().isoformat(timespec='seconds') if RETRAIN_HOUR >= 0 else None
+    if status["state"] == "running" and not is_running():
+        status["state"] = "interrupted"
+    return status
+
+def list_models():
+    """MODEL_DIR 中的個股模型 [(symbol, with_sentiment), ...]，不含全域模型"""
+    models = []
+    for name in sorted(os.listdir(MODEL_DIR)):
+        match = MODEL_FILE_PATTERN.match(name)
+        if match is None or match.group('symbol') == GLOBAL_SYMBOL:
+            continue
+        models.append((match.group('symbol'), match.group('sentiment') is not None))
+    return models
+
+def trained_through(symbol, with_sentiment):
+    """模型訓練資料的最後日期；舊模型沒有中繼資料時以模型檔案的修改日期代替"""
+    meta = read_model_meta(symbol, with_sentiment)
+    if meta.get("trained_through"):
+        return meta["trained_through"]
+    return datetime.fromtimestamp(os.path.getmtime(get_model_path(symbol, with_sentiment))).strftime('%Y-%m-%d')
+
+def trading_days_since(date, today=None):
+    """date（不含）到 today（不含）之間的交易日（週一至週五）數量"""
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    start = (datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    return max(0, int(np.busday_count(start, today)))
+
+def find_candidates(evaluate=None, stale_days=STALE_TRADING_DAYS):
+    """
+    需要微調的模型 [(symbol, with_sentiment, 原因), ...]
+
+    evaluate(symbol, with_sentiment) 回傳目前最近 RMSE_EVAL_BARS 根K棒的 RMSE；
+    只對未過期且有基準 RMSE 的模型計算
+    """
+    candidates = []
+    for symbol, with_sentiment in list_models():
+        try:
+            age = trading_days_since(trained_through(symbol, with_sentiment))
+            if age > stale_days:
+                candidates.append((symbol, with_sentiment, f"stale ({age} trading days)"))
+                continue
+
+            baseline = read_model_meta(symbol, with_sentiment).get("rmse")
+            if evaluate is None or not baseline:
+                continue
+            rmse = evaluate(symbol, with_sentiment)
+            if rmse is not None and rmse > baseline * RMSE_DEGRADATION:
+                candidates.append((symbol, with_sentiment, f"rmse {rmse:.4f} > {RMSE_DEGRADATION} x {baseline:.4f}"))
+        except Exception as e:
+            print(f"檢查模型 {symbol} 失敗: {e}")
+    return candidates
+
+def run_retraining(fine_tune, evaluate=None, max_workers=RETRAIN_WORKERS):
+    """
+    找出需要更新的模型並以 fine_tune(symbol, with_sentiment) 微調，回傳 {模型: 結果}
+
+    呼叫端需持有 LOCK_PATH 檔案鎖
+    """
+    candidates = find_candidates(evaluate)
+    _update_status(candidates=[f"{s}{' (sentiment)' if ws else ''}: {reason}" for s, ws, reason in candidates])
+    print(f"模型排程更新：{len(candidates)} 個模型需要微調")
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='lstm-retrain') as executor:
+        futures = {executor.submit(fine_tune, symbol, with_sentiment): (symbol, with_sentiment)
+                   for symbol, with_sentiment, _ in candidates}
+        for future in as_completed(futures):
+            symbol, with_sentiment = futures[future]
+            name = f"{symbol}{' (sentiment)' if with_sentiment else ''}"
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"微調模型 {name} 失敗: {e}")
+                results[name] = {"error": str(e)}
+            _update_status(processed=len(results), results=results)
+    return results
+
+def start_retraining(fine_tune, evaluate=None):
+    """
+    在背景執行緒啟動一次更新
+
+    回傳 True 表示已啟動；已有更新在執行（本行程或其他 worker）時回傳 False
+    """
+    if not _local_lock.acquire(blocking=False):
+        return False
+    handle = acquire_file_lock(LOCK_PATH)
+    if handle is None:
+        _local_lock.release()
+        return False
+
+    _update_status(
+        state="running",
+        started_at=datetime.now().isoformat(timespec='seconds'),
+        finished_at=None,
+        candidates=[],
+        processed=0,
+        results={},
+        error=None,
+    )
+    thread = threading.Thread(target=_run, args=(handle, fine_tune, evaluate), name='lstm-retrain', daemon=True)
+    thread.start()
+    return True
+
+def _run(handle, fine_tune, evaluate):
+    try:
+        run_retraining(fine_tune, evaluate)
+        _update_status(state="completed", finished_at=datetime.now().isoformat(timespec='seconds'))
+    except Exception as e:
+        print(f"模型排程更新失敗: {e}")
+        _update_status(state="failed", error=str(e), finished_at=datetime.now().isoformat(timespec='seconds'))
+    finally:
+        release_file_lock(handle)
+        _local_lock.release()
+
+def next_run_time(now=None):
+    """下一次排程更新的時間"""
+    now = now or datetime.now()
+    run_at = now.replace(hour=max(RETRAIN_HOUR, 0), minute=0, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return run_at
+
+def _scheduler_loop(fine_tune, evaluate):
+    while True:
+        time.sleep(max(1, (next_run_time() - datetime.now()).total_seconds()))
+        # 其他 worker 已在執行時直接略過，等下一次排程
+        start_retraining(fine_tune, evaluate)
+
+def start_scheduler(fine_tune, evaluate=None):
+    """啟動每天離峰時段執行更新的排程執行緒（RETRAIN_HOUR < 0 時不啟動）"""
+    global _scheduler
+    if RETRAIN_HOUR < 0 or (_scheduler is not None and _scheduler.is_alive()):
+        return _scheduler
+    _scheduler = threading.Thread(target=_scheduler_loop, args=(fine_tune, evaluate),
+                                  name='lstm-retrain-scheduler', daemon=True)
+    _scheduler.start()
+    return _scheduler
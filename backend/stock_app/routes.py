@@ -1,129 +1,70 @@
-import requests # type: ignore
 import json
-import math
-import random
 import numpy as np
-import time
 import os
 from flask import jsonify, request # type: ignore
 import yfinance as yf # type: ignore
 import pandas as pd # type: ignore
-from functools import wraps
-from talib import SMA, EMA, WMA, KAMA, RSI, STOCH, STOCHRSI, STOCHF, MACD # type: ignore
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from . import stock_app_blueprint
-
-# 更完整的 headers
-headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-    "Accept-Language": "en-US,en;q=0.5",
-    "Accept-Encoding": "gzip, deflate, br",
-    "Connection": "keep-alive",
-    "Upgrade-Insecure-Requests": "1",
-    "Cache-Control": "max-age=0"
-}
-
-# 整合快取機制
-_cache = {
-    'categories': {
-        'data': None,
-        'timestamp': None
-    },
-    'tw_categories': {
-        'data': None,
-        'timestamp': None
-    }
-}
-
-# 建立 session 並更新 headers
-session = requests.Session()
-session.headers.update(headers)
-
-# 傳入自定義 session 給 yfinance
-yf.Ticker.session = session
-
-# 自定義 JSON 編碼器，處理 NaN 值
-class NpEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, np.integer):
-            return int(obj)
-        elif isinstance(obj, np.floating):
-            return float(obj) if not np.isnan(obj) else None
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        elif pd.isna(obj):
-            return None
-        return super(NpEncoder, self).default(obj)
-
-# 請求重試裝飾器
-def retry_on_429(max_retries=5, initial_delay=1):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            delay = initial_delay
-            for i in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except requests.exceptions.RequestException as e:
-                    if i == max_retries - 1:  # 最後一次重試
-                        raise e
-                    if "429" in str(e):
-                        # 指數退避 + 隨機延遲
-                        sleep_time = delay + random.uniform(0, 1)
-                        print(f"Rate limit hit, waiting {sleep_time:.2f} seconds...")
-                        time.sleep(sleep_time)
-                        delay *= 2  # 指數增長延遲時間
-                    else:
-                        raise e
-        return wrapper
-    return decorator
-
-# 快取裝飾器 
-def cache_data(cache_key, duration=24*60*60):  # 預設24小時
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            cache = _cache[cache_key]
-            now = datetime.now()
-            
-            # 檢查快取是否有效
-            if (cache['data'] is not None and 
-                cache['timestamp'] is not None and 
-                (now - cache['timestamp']).total_seconds() < duration):
-                print(f"返回快取的 {cache_key} 資料，更新於 {cache['timestamp']}")
-                return cache['data']
-            
-            # 執行原始函數獲取新數據
-            result = func(*args, **kwargs)
-            
-            # 更新快取
-            _cache[cache_key]['data'] = result
-            _cache[cache_key]['timestamp'] = now
-            
-            return result
-        return wrapper
-    return decorator
-
-# 快取美股分類資料
-def cache_categories(duration=24*60*60):
-    return cache_data('categories', duration)
-
-# 快取台股分類資料
-def cache_tw_categories(duration=24*60*60):
-    return cache_data('tw_categories', duration)
+from .stockStore import get_history, PERIODS, INTERVALS, INTRADAY_INTERVALS
+from .indicatorEngine import indicator, compute_indicators
+from .serializer import columns_response
+from .downsample import ohlc_buckets, lttb_indices
+from .rateLimiter import yahoo_session as session, retry_on_429, limiter
+from .singleFlight import single_flight
+from .ttlCache import cache, cached, cached_route, history_ttl, QUOTE_TTL
+from .categoryJob import load_snapshot, snapshot_is_stale, start_refresh, job_status
+
+# 台股分類資料每天更新一次
+TW_CATEGORIES_TTL = 24 * 60 * 60
+
+# 日K類圖表依市場交易時間決定保存時間，分鐘線與開盤中使用短 TTL
+def chart_history_ttl(market='US', interval='1d', **_):
+    return history_ttl(market, interval)
+
+# 美股分類資料由背景工作更新，短時間內重複讀取同一份檔案
+cached_snapshot = cached('us_categories', QUOTE_TTL)(load_snapshot)
+
+# 解析圖表路由的 period / interval / max_points 查詢參數
+def parse_chart_args(default_period):
+    period = request.args.get('period', default_period)
+    interval = request.args.get('interval', '1d')
+    max_points = request.args.get('max_points', type=int)
+
+    if period not in PERIODS:
+        raise ValueError(f"不支援的 period: {period}，可用值: {', '.join(PERIODS)}")
+    if interval not in INTERVALS:
+        raise ValueError(f"不支援的 interval: {interval}，可用值: {', '.join(INTERVALS)}")
+    if max_points is not None and max_points < 3:
+        raise ValueError("max_points 必須至少為 3")
+    return period, interval, max_points
+
+# 日線只輸出日期，分鐘線/小時線需包含時間
+def format_dates(index, interval):
+    if interval in INTRADAY_INTERVALS:
+        return index.strftime('%Y-%m-%d %H:%M').tolist()
+    return index.strftime('%Y-%m-%d').tolist()
+
+# 取得股票基本資料，同時對同一檔股票的請求只會發出一次
+@single_flight('info')
+def fetch_info(symbol):
+    return yf.Ticker(symbol, session=session).info
 
 @stock_app_blueprint.route('/api/stock_data/<symbol>/<market>', methods=['GET'])
-@retry_on_429(max_retries=10, initial_delay=2) 
+@cached_route('stock_data', QUOTE_TTL)  # 含即時報價
+@retry_on_429(max_retries=10)
 def get_stock_chart_data(symbol, market = 'US'):
     if market == 'TW':
         symbol = f"{symbol}.TW"
+
+    try:
+        period, interval, max_points = parse_chart_args("1mo")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    stock = yf.Ticker(symbol)
-    data = stock.history(period="1mo")  # 獲取過去一個月的數據
-    info = stock.info
+    data = get_history(symbol, period=period, interval=interval)  # 預設獲取過去一個月的數據
+    info = fetch_info(symbol)
     
     if not info:
         print(f"Invalid symbol: {symbol}")
@@ -136,8 +77,12 @@ def get_stock_chart_data(symbol, market = 'US'):
     if data.empty:
         return jsonify({"error": "No data found for symbol"}), 429
     
+    # 點數超過 max_points 時以 LTTB 降採樣收盤價折線
+    if max_points:
+        data = data.iloc[lttb_indices(data['Close'].to_numpy(), max_points)]
+
     # 只取日期和收盤價
-    dates = data.index.strftime('%Y-%m-%d').tolist()
+    dates = format_dates(data.index, interval)
     close_prices = data['Close'].tolist()
 
     return jsonify({
@@ -147,260 +92,211 @@ def get_stock_chart_data(symbol, market = 'US'):
         "current_price": current_price
     })
 
+# 批次報價每次請求最多的股票數量
+MAX_BATCH_SYMBOLS = 200
+
+# 一次下載多檔股票的歷史資料，回傳 {symbol: DataFrame}
+@retry_on_429(max_retries=10)
+def download_histories(symbols, period="1mo"):
+    data = yf.download(
+        symbols,
+        period=period,
+        group_by='ticker',
+        auto_adjust=True,
+        threads=True,
+        progress=False,
+        session=session
+    )
+    if data is None or data.empty:
+        return {}
+
+    histories = {}
+    if isinstance(data.columns, pd.MultiIndex):
+        available = set(data.columns.get_level_values(0))
+        for symbol in symbols:
+            if symbol in available:
+                histories[symbol] = data[symbol].dropna(subset=['Close'])
+    elif len(symbols) == 1:
+        histories[symbols[0]] = data.dropna(subset=['Close'])
+    return histories
+
+# 由日K資料計算報價（取代 .info 的 currentPrice / previousClose）
+def summarize_history(data):
+    close_prices = data['Close'].tolist()
+    current_price = close_prices[-1]
+    previous_close = close_prices[-2] if len(close_prices) > 1 else current_price
+    change = round((current_price - previous_close) / previous_close * 100, 2) if previous_close else 0
+    return {
+        "dates": data.index.strftime('%Y-%m-%d').tolist(),
+        "close_prices": close_prices,
+        "change": change,
+        "current_price": current_price
+    }
+
+@stock_app_blueprint.route('/api/stock_data/batch', methods=['POST'])
+def get_batch_stock_chart_data():
+    """一次取得多檔股票的近一個月收盤價與漲跌幅，供熱力圖使用"""
+    try:
+        payload = request.get_json(silent=True) or {}
+        symbols = payload.get('symbols') or []
+        market = payload.get('market', 'US')
+
+        if not isinstance(symbols, list) or not symbols:
+            return jsonify({"error": "symbols 必須為非空的股票代號列表"}), 400
+        if len(symbols) > MAX_BATCH_SYMBOLS:
+            return jsonify({"error": f"每次最多查詢 {MAX_BATCH_SYMBOLS} 檔股票"}), 400
+
+        # 去除重複代號並保留原始順序
+        symbols = list(dict.fromkeys(str(s).strip() for s in symbols if str(s).strip()))
+        tickers = {f"{s}.TW" if market == 'TW' else s: s for s in symbols}
+
+        histories = download_histories(list(tickers.keys()), period="1mo")
+
+        stocks = {}
+        failed = []
+        for ticker, symbol in tickers.items():
+            data = histories.get(ticker)
+            if data is None or data.empty:
+                failed.append(symbol)
+                continue
+            stocks[symbol] = summarize_history(data)
+
+        return jsonify({"stocks": stocks, "failed": failed})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# /api/ma 回傳的指標欄位
+MA_INDICATORS = {
+    "sma_5": indicator('SMA', timeperiod=5),
+    "sma_20": indicator('SMA', timeperiod=20),
+    "sma_60": indicator('SMA', timeperiod=60),
+    "ema_5": indicator('EMA', timeperiod=5),
+    "ema_20": indicator('EMA', timeperiod=20),
+    "wma_5": indicator('WMA', timeperiod=5),
+    "wma_20": indicator('WMA', timeperiod=20),
+    "kama_5": indicator('KAMA', timeperiod=5),
+    "kama_20": indicator('KAMA', timeperiod=20),
+    "rsi_6": indicator('RSI', timeperiod=6),
+    "rsi_24": indicator('RSI', timeperiod=24),
+    "macd": indicator('MACD', 0, fastperiod=12, slowperiod=26, signalperiod=9),  # DIF
+    "macd_signal": indicator('MACD', 1, fastperiod=12, slowperiod=26, signalperiod=9),  # MACD
+    "slowk": indicator('STOCH', 0, fastk_period=9, slowk_period=3, slowd_period=3),
+    "slowd": indicator('STOCH', 1, fastk_period=9, slowk_period=3, slowd_period=3),
+    "stochrsi_fastk": indicator('STOCHRSI', 0, timeperiod=6, fastk_period=9),
+    "stochrsi_fastd": indicator('STOCHRSI', 1, timeperiod=6, fastk_period=9),
+    "stochf_fastk": indicator('STOCHF', 0, fastk_period=9, fastd_period=3),
+    "stochf_fastd": indicator('STOCHF', 1, fastk_period=9, fastd_period=3),
+}
+
+# /api/bias 回傳的指標欄位
+BIAS_INDICATORS = {
+    "sma_5": indicator('SMA', timeperiod=5),
+    "sma_20": indicator('SMA', timeperiod=20),
+    "sma_60": indicator('SMA', timeperiod=60),
+    "bias_10": indicator('BIAS', timeperiod=10),
+    "bias_20": indicator('BIAS', timeperiod=20),
+}
+
 @stock_app_blueprint.route('/api/ma/<symbol>/<market>', methods=['GET'])
+@cached_route('ma', chart_history_ttl)
 def get_stock_machart_data(symbol, market = 'US'):
+    try:
+        period, interval, max_points = parse_chart_args("6mo")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         if market == 'TW':
             symbol = f"{symbol}.TW"
         
-        # 獲取股票數據
-        stock = yf.Ticker(symbol)
-        data = stock.history(period="6mo")  # 過去6個月的數據
+        # 獲取股票數據（預設過去6個月）
+        data = get_history(symbol, period=period, interval=interval)
         if data.empty:
             return jsonify({"error": "No data available for the symbol"}), 404
 
-        # 數據處理
-        data['SMA_5'] = SMA(data['Close'], timeperiod=5)
-        data['SMA_20'] = SMA(data['Close'], timeperiod=20)
-        data['SMA_60'] = SMA(data['Close'], timeperiod=60)
-        data['EMA_5'] = EMA(data['Close'], timeperiod=5)
-        data['EMA_20'] = EMA(data['Close'], timeperiod=20)
-        data['WMA_5'] = WMA(data['Close'], timeperiod=5)
-        data['WMA_20'] = WMA(data['Close'], timeperiod=20)
-        data['KAMA_5'] = KAMA(data['Close'], timeperiod=5)
-        data['KAMA_20'] = KAMA(data['Close'], timeperiod=20)
-        data['RSI_6'] = RSI(data['Close'], timeperiod=6)
-        data['RSI_24'] = RSI(data['Close'], timeperiod=24)
-        macd, macd_signal, macd_hist = MACD(data['Close'], fastperiod=12, slowperiod=26, signalperiod=9)
-        data['MACD'] = macd # DIF
-        data['MACD_Signal'] = macd_signal # MACD
-        slowk, slowd = STOCH(data['High'], data['Low'], data['Close'], fastk_period=9, slowk_period=3, slowd_period=3)
-        data['SlowK'] = slowk
-        data['SlowD'] = slowd
-        fastk, fastd = STOCHRSI(data['Close'], timeperiod=6, fastk_period=9)
-        data['STOCHRSI_FastK'] = fastk
-        data['STOCHRSI_FastD'] = fastd
-        fastk, fastd = STOCHF(data['High'], data['Low'], data['Close'], fastk_period=9, fastd_period=3)
-        data['STOCHF_FastK'] = fastk
-        data['STOCHF_FastD'] = fastd
-
-        # 將 NaN 值轉換為 None
-        data = data.where(pd.notnull(data), None)
-
-        # 數據格式化
-        data = data.reset_index()
+        # 數據處理：以完整解析度計算指標後再降採樣
+        indicators = compute_indicators(symbol, data, MA_INDICATORS.values())
+        data, positions = ohlc_buckets(data, max_points or 0)
+
+        # 數據格式化（NaN 由序列化層轉為 null）
         result = {
-            "dates": data['Date'].dt.strftime('%Y-%m-%d').tolist(),
-            "open_prices": data['Open'].tolist(),
-            "high_prices": data['High'].tolist(),
-            "low_prices": data['Low'].tolist(),
-            "close_prices": data['Close'].tolist(),
-            "sma_5": [None if pd.isna(x) else x for x in data['SMA_5'].tolist()],
-            "sma_20": [None if pd.isna(x) else x for x in data['SMA_20'].tolist()],
-            "sma_60": [None if pd.isna(x) else x for x in data['SMA_60'].tolist()],
-            "ema_5": [None if pd.isna(x) else x for x in data['EMA_5'].tolist()],
-            "ema_20": [None if pd.isna(x) else x for x in data['EMA_20'].tolist()],
-            "wma_5": [None if pd.isna(x) else x for x in data['WMA_5'].tolist()],
-            "wma_20": [None if pd.isna(x) else x for x in data['WMA_20'].tolist()],
-            "kama_5": [None if pd.isna(x) else x for x in data['KAMA_5'].tolist()],
-            "kama_20": [None if pd.isna(x) else x for x in data['KAMA_20'].tolist()],
-            "rsi_6": [None if pd.isna(x) else x for x in data['RSI_6'].tolist()],
-            "rsi_24": [None if pd.isna(x) else x for x in data['RSI_24'].tolist()],
-            "macd": [None if pd.isna(x) else x for x in data['MACD'].tolist()],
-            "macd_signal": [None if pd.isna(x) else x for x in data['MACD_Signal'].tolist()],
-            "slowk": [None if pd.isna(x) else x for x in data['SlowK'].tolist()],
-            "slowd": [None if pd.isna(x) else x for x in data['SlowD'].tolist()],
-            "stochrsi_fastk": [None if pd.isna(x) else x for x in data['STOCHRSI_FastK'].tolist()],
-            "stochrsi_fastd": [None if pd.isna(x) else x for x in data['STOCHRSI_FastD'].tolist()],
-            "stochf_fastk": [None if pd.isna(x) else x for x in data['STOCHF_FastK'].tolist()],
-            "stochf_fastd": [None if pd.isna(x) else x for x in data['STOCHF_FastD'].tolist()],
-            "volumes": data['Volume'].tolist(),
+            "dates": format_dates(data.index, interval),
+            "open_prices": data['Open'].to_numpy(),
+            "high_prices": data['High'].to_numpy(),
+            "low_prices": data['Low'].to_numpy(),
+            "close_prices": data['Close'].to_numpy(),
         }
-        return jsonify(result)
+        for key, spec in MA_INDICATORS.items():
+            result[key] = indicators[spec][positions]
+        result["volumes"] = data['Volume'].to_numpy()
+        return columns_response(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @stock_app_blueprint.route('/api/bias/<symbol>/<market>', methods=['GET'])
+@cached_route('bias', chart_history_ttl)
 def get_stock_biaschart_data(symbol, market = 'US'):
     try:
-        # 獲取股票數據
+        period, interval, max_points = parse_chart_args("6mo")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        # 獲取股票數據（預設過去6個月）
         if market == 'TW':
             symbol = f"{symbol}.TW"
-        stock = yf.Ticker(symbol)
-        data = stock.history(period="6mo")  # 過去6個月的數據
+        data = get_history(symbol, period=period, interval=interval)
         if data.empty:
             return jsonify({"error": "No data available for the symbol"}), 404
 
-        # 數據處理
-        data['SMA_5'] = SMA(data['Close'], timeperiod=5)
-        data['SMA_10'] = SMA(data['Close'], timeperiod=10)
-        data['SMA_20'] = SMA(data['Close'], timeperiod=20)
-        data['SMA_60'] = SMA(data['Close'], timeperiod=60)
-        data[['SMA_10', 'SMA_20']] = data[['SMA_10', 'SMA_20']].ffill()
-
-        # 計算BIAS
-        data['BIAS_10'] = (data['Close'] - SMA(data['Close'], timeperiod=10)) / SMA(data['Close'], timeperiod=10) * 100
-        data['BIAS_20'] = (data['Close'] - SMA(data['Close'], timeperiod=20)) / SMA(data['Close'], timeperiod=20) * 100
+        # 數據處理（SMA 與 /api/ma 共用計算結果），以完整解析度計算後再降採樣
+        indicators = compute_indicators(symbol, data, BIAS_INDICATORS.values())
+        bias_diff = indicators[BIAS_INDICATORS["bias_10"]] - indicators[BIAS_INDICATORS["bias_20"]]
+        data, positions = ohlc_buckets(data, max_points or 0)
 
-        data['BIAS_DIFF'] = data['BIAS_10'] - data['BIAS_20']
-
-        # 將 NaN 值轉換為 None
-        data = data.where(pd.notnull(data), None)
-
-        # 數據格式化
-        data = data.reset_index()
+        # 數據格式化（NaN 由序列化層轉為 null）
         result = {
-            "dates": data['Date'].dt.strftime('%Y-%m-%d').tolist(),
-            "close_prices": data['Close'].tolist(),
-            "open_prices": data['Open'].tolist(),
-            "high_prices": data['High'].tolist(),
-            "low_prices": data['Low'].tolist(),
-            "sma_5": [None if pd.isna(x) else x for x in data['SMA_5'].tolist()],
-            "sma_20": [None if pd.isna(x) else x for x in data['SMA_20'].tolist()],
-            "sma_60": [None if pd.isna(x) else x for x in data['SMA_60'].tolist()],
-            "bias_10": [None if pd.isna(x) else x for x in data['BIAS_10'].tolist()],
-            "bias_20": [None if pd.isna(x) else x for x in data['BIAS_20'].tolist()],
-            "bias_diff": [None if pd.isna(x) else x for x in data['BIAS_DIFF'].tolist()],
+            "dates": format_dates(data.index, interval),
+            "close_prices": data['Close'].to_numpy(),
+            "open_prices": data['Open'].to_numpy(),
+            "high_prices": data['High'].to_numpy(),
+            "low_prices": data['Low'].to_numpy(),
         }
-        return jsonify(result)
+        for key, spec in BIAS_INDICATORS.items():
+            result[key] = indicators[spec][positions]
+        result["bias_diff"] = bias_diff[positions]
+        return columns_response(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # API 路由：獲取美股分類資料
+# 立即回傳上一次完成的結果與更新進度，資料過期時在背景啟動更新
 @stock_app_blueprint.route('/api/categories', methods=['GET'])
-@retry_on_429(max_retries=10, initial_delay=2)  # 增加重試次數和初始延遲
-@cache_categories(duration=1*60*60) 
 def get_stock_categories():
     try:
-        base_dir = os.path.abspath(os.path.dirname(__file__))
-        csv_path = os.path.join(base_dir, 'data', 'us_stock_list.csv')
-        json_path = os.path.join(base_dir, 'data', 'us_stock_categories.json')
-        progress_path = os.path.join(base_dir, 'data', 'fetch_progress.json')
-
-        # 檢查進度文件
-        if os.path.exists(progress_path):
-            try:
-                with open(progress_path, 'r') as f:
-                    progress_data = json.load(f)
-                    if progress_data.get('date') == datetime.now().strftime('%Y-%m-%d') and 'last_processed' not in progress_data:
-                        data = progress_data.get('data', [])
-                        # 只依照 symbol 排序
-                        sorted_data = sorted(data, key=lambda x: x.get('ticker', ''))
-
-                        # 儲存排序後的資料
-                        progress_data['data'] = sorted_data
-                        with open(progress_path, 'w') as f:
-                            json.dump(progress_data, f)
-                            
-                        return jsonify(sorted_data)
-            except json.JSONDecodeError:
-                # 如果 JSON 檔案是空的或格式錯誤，創建新的進度檔案
-                progress_data = {
-                    "date": datetime.now().strftime('%Y-%m-%d'),
-                    "data": [],
-                    "last_processed": None
-                }
-                with open(progress_path, 'w') as f:
-                    json.dump(progress_data, f)
-
-        df = pd.read_csv(csv_path)
-        total_stocks = len(df)
-        batch_size = 100  # 減少每批次的大小
-        num_batches = math.ceil(total_stocks / batch_size)
-
-        stock_data = []
-        delay_between_batches = 10  # 增加批次之間的延遲時間
-        
-        # 繼續處理未完成的進度
-        last_processed = None
-        if os.path.exists(progress_path):
-            with open(progress_path, 'r') as f:
-                progress_data = json.load(f)
-                if progress_data.get('date') == datetime.now().strftime('%Y-%m-%d'):
-                    stock_data = progress_data.get('data', [])
-                    last_processed = progress_data.get('last_processed')
-
-        def fetch_stock_data(symbol):
-            retries = 10
-            base_delay = 2
-            while retries > 0:
-                try:
-                    time.sleep(base_delay + random.uniform(0, 1))  # 添加隨機延遲
-                    stock = yf.Ticker(symbol)
-                    info = stock.info
-                    if not info:
-                        print(f"Invalid symbol: {symbol}")
-                        return None
-                    
-                    previous_close = info.get("previousClose", 0)
-                    current_price = info.get("currentPrice", 0)
-                    change = round((current_price - previous_close) / previous_close * 100, 2)
-                    
-                    return {
-                        "ticker": symbol,
-                        "name": info.get("shortName", "N/A"),
-                        "sector": info.get("sector", "Unknown"),
-                        "industry": info.get("industry", "Unknown"),
-                        "marketCap": info.get("marketCap", 0),
-                        "change": change,
-                        "current_price": current_price,
-                        "date": datetime.now().strftime('%Y-%m-%d')
-                    }
-                except Exception as e:
-                    if "429" in str(e):
-                        print(f"Rate limit hit for {symbol}, retrying in {base_delay} seconds...")
-                        time.sleep(base_delay)
-                        base_delay *= 2
-                        retries -= 1
-                    else:
-                        print(f"Error fetching data for {symbol}: {e}")
-                        break
-            return None
-
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            for batch_num in range(num_batches):
-                start_idx = batch_num * batch_size
-                end_idx = min((batch_num + 1) * batch_size, total_stocks)
-                batch_df = df.iloc[start_idx:end_idx]
-                
-                # 跳過已處理的股票
-                if last_processed:
-                    batch_df = batch_df[batch_df['Symbol'] > last_processed]
-
-                futures = {executor.submit(fetch_stock_data, row['Symbol']): row['Symbol'] for index, row in batch_df.iterrows()}
-                for future in as_completed(futures):
-                    result = future.result()
-                    if result:
-                        stock_data.append(result)
-                        # 每成功獲取一筆數據就保存進度
-                        progress = {
-                            "date": datetime.now().strftime('%Y-%m-%d'),
-                            "data": stock_data,
-                            "last_processed": futures[future]
-                        }
-                        with open(progress_path, 'w') as f:
-                            json.dump(progress, f)
-
-                print(f"Completed batch {batch_num + 1}/{num_batches}")
-                time.sleep(delay_between_batches)
-        # 所有批次完成後，儲存最終結果（不含 last_processed）
-        sorted_data = sorted(stock_data, key=lambda x: x.get('ticker', ''))
-        final_progress = {
-            "date": datetime.now().strftime('%Y-%m-%d'),
-            "data": sorted_data
-        }
-        with open(progress_path, 'w') as f:
-            json.dump(final_progress, f)
-
-        # 保存最終結果
-        with open(json_path, 'w') as f:
-            json.dump(sorted_data, f)
-
-        return jsonify(sorted_data)
-
+        stocks, updated_at = cached_snapshot()
+        if snapshot_is_stale(updated_at):
+            start_refresh()
+
+        return jsonify({
+            "stocks": stocks,
+            "updated_at": updated_at.isoformat(timespec='seconds') if updated_at else None,
+            "refresh": job_status()
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# API 路由：美股分類資料更新進度
+@stock_app_blueprint.route('/api/categories/status', methods=['GET'])
+def get_stock_categories_status():
+    return jsonify(job_status())
+
+# API 路由：手動啟動美股分類資料更新
+@stock_app_blueprint.route('/api/categories/refresh', methods=['POST'])
+def refresh_stock_categories():
+    started = start_refresh()
+    return jsonify({"started": started, "refresh": job_status()}), 202 if started else 409
+
 # 從 stockTW.py 整合的函數：更新台股列表
 def update_twse_stock_list():
     """
@@ -437,8 +333,8 @@ def update_tw_stocks():
 
 # API 路由：獲取台股分類資料
 @stock_app_blueprint.route('/api/tw_categories', methods=['GET'])
-@retry_on_429(max_retries=5, initial_delay=2)
-@cache_tw_categories(duration=24*60*60)  
+@cached_route('tw_categories', TW_CATEGORIES_TTL)
+@retry_on_429(max_retries=5)
 def get_tw_stock_categories():
     try:
         base_dir = os.path.abspath(os.path.dirname(__file__))
@@ -533,4 +429,14 @@ def get_tw_stock_categories():
         return jsonify(categories)
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+# API 路由：Yahoo 請求速率限制的目前狀態
+@stock_app_blueprint.route('/api/rate_limits', methods=['GET'])
+def get_rate_limits():
+    return jsonify(limiter.metrics())
+
+# API 路由：快取命中率與大小
+@stock_app_blueprint.route('/api/cache_stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(cache.stats())
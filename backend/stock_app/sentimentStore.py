@@ -0,0 +1,303 @@
+"""
+每日新聞情感資料庫
+
+原本 get_sentiment_data 要求 365 天的情感資料，但 analysis_stock_sentiment 每次都重新爬取新聞，
+再以一個平均分數加上正弦波與隨機雜訊產生趨勢（失敗時甚至重設全域 NumPy 亂數種子）。
+這裡改為以 SQLite (data/sentiment.db) 保存每檔股票真實的每日情感：
+- 每則新聞（以連結識別）只評分一次，依發布日期累加到 daily 表
+- 背景 ingester 每 INGEST_INTERVAL 秒更新最近 TRACK_DAYS 天內被查詢過的股票，
+  多個 gunicorn worker 以檔案鎖確保同一時間只有一個行程在抓取
+- 讀取時以一次索引查詢取出日期區間，對齊到呼叫端的交易日；
+  沒有新聞的日期沿用前一天的分數並以 CARRY_DECAY 逐日衰減回中性 0
+
+新聞評分需要 NLTK，由 newsSentiment 以 scorer(symbols, titles, contents) 傳入（第一次評分時才載入 NLTK）
+（symbols 為每則新聞的股票代號，背景更新時多檔股票的新聞一起評分），
+回傳每則新聞的 (標題分數, 綜合分數)。
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd # type: ignore
+
+from .fileLock import acquire_file_lock, release_file_lock
+from .newsFetcher import fetch_news_list, fetch_articles, MAX_ARTICLES
+from .singleFlight import single_flight
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+DB_PATH = os.path.join(DATA_DIR, 'sentiment.db')
+LOCK_PATH = os.path.join(DATA_DIR, 'sentiment_ingest.lock')
+
+# 背景更新的間隔秒數（新聞列表快取 NEWS_LIST_TTL 為 10 分鐘）
+INGEST_INTERVAL = int(os.environ.get('STOCK_SENTIMENT_INTERVAL', str(30 * 60)))
+
+# 最近幾天內被查詢過的股票才持續更新
+TRACK_DAYS = 30
+
+# 沒有新聞的日期，前一天分數的保留比例
+CARRY_DECAY = 0.8
+
+_ingester = None
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS headlines (
+            symbol TEXT NOT NULL,
+            link TEXT NOT NULL,
+            title TEXT,
+            source TEXT,
+            published_at REAL,
+            title_score REAL,
+            score REAL,
+            PRIMARY KEY (symbol, link)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS headlines_published ON headlines (symbol, published_at)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily (
+            symbol TEXT NOT NULL,
+            date TEXT NOT NULL,
+            score_sum REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (symbol, date)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS symbols (
+            symbol TEXT PRIMARY KEY,
+            requested_at REAL,
+            ingested_at REAL
+        )
+    """)
+    return conn
+
+def published_at(publish_time, now=None):
+    """
+    將新聞列表的相對時間（「來源 • 3小時前」）轉換為時間戳記
+
+    無法解析時視為 now（第一次看到這則新聞的時間）
+    """
+    now = now or time.time()
+    for pattern, seconds in ((r'(\d+)\s*分鐘前', 60), (r'(\d+)\s*小時前', 3600), (r'(\d+)\s*天前', 86400)):
+        match = re.search(pattern, publish_time or "")
+        if match:
+            return now - int(match.group(1)) * seconds
+    return now
+
+def _source(publish_time):
+    parts = (publish_time or "").split('•')
+    return parts[0].strip() if len(parts) > 1 else ""
+
+def track(symbol):
+    """記錄股票被查詢，背景 ingester 會持續更新最近被查詢過的股票"""
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO symbols (symbol, requested_at) VALUES (?, ?) "
+                "ON CONFLICT(symbol) DO UPDATE SET requested_at = excluded.requested_at",
+                (symbol, time.time())
+            )
+    finally:
+        conn.close()
+
+def last_ingested(symbol):
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT ingested_at FROM symbols WHERE symbol = ?", (symbol,)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+def _new_items(symbol):
+    """股票新聞列表中尚未保存的新聞"""
+    news_items = fetch_news_list(symbol)[:MAX_ARTICLES]
+
+    conn = _connect()
+    try:
+        known = {row[0] for row in conn.execute("SELECT link FROM headlines WHERE symbol = ?", (symbol,))}
+    finally:
+        conn.close()
+
+    new_items, seen = [], set()
+    for news in news_items:
+        if news['link'] in known or news['link'] in seen:
+            continue
+        seen.add(news['link'])
+        new_items.append(news)
+    return new_items
+
+def _save(symbol, new_items, scores, now):
+    conn = _connect()
+    try:
+        with conn:
+            for news, (title_score, score) in zip(new_items, scores):
+                timestamp = published_at(news.get('publish_time'), now)
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO headlines VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (symbol, news['link'], news['title'], _source(news.get('publish_time')),
+                     timestamp, float(title_score), float(score))
+                )
+                if cursor.rowcount == 0:
+                    # 其他行程已寫入同一則新聞
+                    continue
+                conn.execute(
+                    "INSERT INTO daily VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT(symbol, date) DO UPDATE SET score_sum = score_sum + excluded.score_sum, count = count + 1",
+                    (symbol, datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d'), float(score))
+                )
+            conn.execute(
+                "INSERT INTO symbols (symbol, ingested_at) VALUES (?, ?) "
+                "ON CONFLICT(symbol) DO UPDATE SET ingested_at = excluded.ingested_at",
+                (symbol, now)
+            )
+    finally:
+        conn.close()
+
+def ingest_many(symbols, scorer):
+    """
+    抓取多檔股票的新聞列表，只評分尚未保存的新聞並累加到每日分數，回傳 {股票: 新增的新聞數量}
+
+    所有股票的新聞一起抓取文章、一起交給 scorer(每則新聞的股票代號, 標題, 文章內容) 批次評分
+    """
+    collected = {}
+    for symbol in symbols:
+        try:
+            collected[symbol] = _new_items(symbol)
+        except Exception as e:
+            print(f"爬取 {symbol} 新聞列表時出錯: {e}")
+
+    items = [(symbol, news) for symbol, new_items in collected.items() for news in new_items]
+    scores = []
+    if items:
+        contents = fetch_articles([news['link'] for _, news in items])
+        scores = scorer([symbol for symbol, _ in items], [news['title'] for _, news in items], contents)
+
+    now = time.time()
+    added, offset = {}, 0
+    for symbol, new_items in collected.items():
+        _save(symbol, new_items, scores[offset:offset + len(new_items)], now)
+        offset += len(new_items)
+        added[symbol] = len(new_items)
+        print(f"{symbol} 新增 {len(new_items)} 則新聞情感")
+    return added
+
+def ingest(symbol, scorer):
+    """抓取單檔股票的新聞，回傳新增的新聞數量；新聞列表抓取失敗時拋出例外"""
+    new_items = _new_items(symbol)
+    scores = []
+    if new_items:
+        contents = fetch_articles([news['link'] for news in new_items])
+        scores = scorer([symbol] * len(new_items), [news['title'] for news in new_items], contents)
+    _save(symbol, new_items, scores, time.time())
+    print(f"{symbol} 新增 {len(new_items)} 則新聞情感")
+    return len(new_items)
+
+@single_flight('sentiment_ingest')
+def ensure_ingested(symbol, scorer):
+    """尚未抓取過的股票先同步抓取一次，之後由背景 ingester 更新"""
+    if last_ingested(symbol) is None:
+        ingest(symbol, scorer)
+
+def daily_series(symbol, dates):
+    """
+    對齊到 dates（交易日）的每日情感，回傳 float32 陣列
+
+    每個日期的分數為當天新聞的平均；兩個交易日之間（含週末）的新聞併入下一個交易日，
+    最後一個交易日之後的新聞併入最後一個交易日（預測時使用最新的情感）；
+    沒有新聞的日期沿用前一個分數並乘上 CARRY_DECAY
+    """
+    dates = pd.DatetimeIndex(dates).normalize()
+    series = np.zeros(len(dates), dtype=np.float32)
+    if len(dates) == 0:
+        return series
+
+    # 第一個交易日之前一段時間的新聞也納入，讓開頭不是從 0 開始
+    start = (dates[0] - timedelta(days=7)).strftime('%Y-%m-%d')
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT date, score_sum, count FROM daily WHERE symbol = ? AND date >= ? ORDER BY date",
+            (symbol, start)
+        ).fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        return series
+
+    # 每則新聞歸到發布日期當天或之後的第一個交易日
+    news_dates = pd.DatetimeIndex([row[0] for row in rows])
+    positions = np.minimum(np.searchsorted(dates.values, news_dates.values), len(dates) - 1)
+    sums = np.bincount(positions, weights=[row[1] for row in rows], minlength=len(dates))
+    counts = np.bincount(positions, weights=[row[2] for row in rows], minlength=len(dates))
+
+    previous = 0.0
+    for i in range(len(dates)):
+        previous = sums[i] / counts[i] if counts[i] else previous * CARRY_DECAY
+        series[i] = previous
+    return series
+
+def recent_headlines(symbol, days=7, now=None):
+    """最近 days 天的新聞 [{title, impact, score, link, source, published_at}, ...]，新到舊"""
+    now = now or time.time()
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT title, title_score, score, link, source, published_at FROM headlines "
+            "WHERE symbol = ? AND published_at >= ? ORDER BY published_at DESC",
+            (symbol, now - days * 86400)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [
+        {"title": title, "impact": title_score, "score": score, "link": link,
+         "source": source, "published_at": timestamp}
+        for title, title_score, score, link, source, timestamp in rows
+    ]
+
+def _tracked_symbols(now):
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT symbol FROM symbols WHERE requested_at >= ? AND (ingested_at IS NULL OR ingested_at < ?)",
+            (now - TRACK_DAYS * 86400, now - INGEST_INTERVAL)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+def ingest_tracked(scorer):
+    """更新所有最近被查詢過、且超過 INGEST_INTERVAL 未更新的股票（已有其他行程在更新時略過）"""
+    handle = acquire_file_lock(LOCK_PATH)
+    if handle is None:
+        return 0
+    try:
+        symbols = _tracked_symbols(time.time())
+        if symbols:
+            ingest_many(symbols, scorer)
+        return len(symbols)
+    finally:
+        release_file_lock(handle)
+
+def _ingest_loop(scorer):
+    while True:
+        try:
+            ingest_tracked(scorer)
+        except Exception as e:
+            print(f"新聞情感背景更新失敗: {e}")
+        time.sleep(INGEST_INTERVAL)
+
+def start_ingester(scorer):
+    """啟動背景 ingester 執行緒（INGEST_INTERVAL <= 0 時不啟動）"""
+    global _ingester
+    if INGEST_INTERVAL <= 0 or (_ingester is not None and _ingester.is_alive()):
+        return _ingester
+    _ingester = threading.Thread(target=_ingest_loop, args=(scorer,), name='sentiment-ingester', daemon=True)
+    _ingester.start()
+    return _ingester
@@ -0,0 +1,200 @@
+"""
+回應序列化
+
+指標路由的回應是多個等長的數值欄位。這裡直接從 NumPy float 陣列一次輸出整個欄位，
+NaN / inf 轉為 JSON null，不再逐一元素以 Python 判斷 pd.isna。
+安裝 orjson 時使用其 NumPy 序列化，否則使用以 NumPy 向量化處理的標準庫實作。
+
+用戶端可透過 Accept 標頭改為取得二進位欄位格式（需安裝對應套件，否則回傳 JSON）：
+- application/vnd.apache.arrow.stream: Arrow IPC stream，日期為 date32 欄位，空值以 validity bitmap 表示
+- application/x-msgpack: 以 msgpack 封裝的型別化陣列 bytes 與 validity bitmap
+"""
+import json
+
+import numpy as np
+import pandas as pd # type: ignore
+from flask import current_app, request # type: ignore
+
+try:
+    import orjson # type: ignore
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa # type: ignore
+except ImportError:
+    pa = None
+
+try:
+    import msgpack # type: ignore
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+
+# 自定義 JSON 編碼器，處理 NumPy 型別與 NaN 值
+class NpEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, np.integer):
+            return int(obj)
+        elif isinstance(obj, np.floating):
+            return float(obj) if np.isfinite(obj) else None
+        elif isinstance(obj, np.ndarray):
+            if obj.dtype.kind == 'f':
+                return np.where(np.isfinite(obj), obj, None).tolist()
+            return obj.tolist()
+        elif isinstance(obj, (pd.Series, pd.Index)):
+            return self.default(obj.to_numpy())
+        elif isinstance(obj, pd.Timestamp):
+            return obj.strftime('%Y-%m-%d')
+        elif pd.isna(obj):
+            return None
+        return super(NpEncoder, self).default(obj)
+
+def _as_array(value):
+    if isinstance(value, (pd.Series, pd.Index)):
+        return value.to_numpy()
+    return value
+
+def _float_array_json(values):
+    """將 float 陣列轉為 JSON 陣列文字，NaN / inf 輸出為 null"""
+    values = np.where(np.isfinite(values), values, np.nan)
+    # float 的 repr 為合法 JSON 數字，只有 NaN 會輸出為 'nan'
+    return '[' + ','.join(map(repr, values.tolist())).replace('nan', 'null') + ']'
+
+def dumps_columns(columns):
+    """
+    將 {欄位名稱: 陣列或列表} 序列化為 JSON bytes
+
+    float 陣列的 NaN / inf 一律輸出為 null，其餘值交由 NpEncoder 處理
+    """
+    if orjson is not None:
+        prepared = {}
+        for key, value in columns.items():
+            value = _as_array(value)
+            if isinstance(value, np.ndarray):
+                if value.dtype.kind == 'f':
+                    # orjson 會將 NaN 輸出為 null，inf 先轉為 NaN
+                    value = np.where(np.isfinite(value), value, np.nan)
+                value = np.ascontiguousarray(value)
+            prepared[key] = value
+        return orjson.dumps(prepared, option=orjson.OPT_SERIALIZE_NUMPY, default=NpEncoder().default)
+
+    parts = []
+    for key, value in columns.items():
+        value = _as_array(value)
+        if isinstance(value, np.ndarray) and value.dtype.kind == 'f':
+            encoded = _float_array_json(value.astype(np.float64, copy=False))
+        else:
+            encoded = json.dumps(value, cls=NpEncoder, ensure_ascii=False)
+        parts.append(json.dumps(str(key), ensure_ascii=False) + ':' + encoded)
+    return ('{' + ','.join(parts) + '}').encode('utf-8')
+
+def preferred_format():
+    """依 Accept 標頭選擇回應格式，JSON 為預設值"""
+    available = [JSON_MIMETYPE]
+    if pa is not None:
+        available.append(ARROW_MIMETYPE)
+    if msgpack is not None:
+        available.append(MSGPACK_MIMETYPE)
+    return request.accept_mimetypes.best_match(available, default=JSON_MIMETYPE)
+
+def _typed_columns(columns, index_key):
+    """
+    拆分為日期索引與型別化數值欄位
+
+    回傳 (日線為 1970-01-01 起算天數的 int32 陣列、含時間則為秒數的 int64 陣列,
+          {名稱: (值陣列, 有效值遮罩)})
+    """
+    index = np.asarray(columns[index_key], dtype='datetime64[s]')
+    if (index == index.astype('datetime64[D]')).all():
+        index = index.astype('datetime64[D]').astype(np.int32)
+    else:
+        # 分鐘線等含時間的索引，改以 1970-01-01 起算秒數表示
+        index = index.astype(np.int64)
+    typed = {}
+    for key, value in columns.items():
+        if key == index_key:
+            continue
+        values = np.asarray(_as_array(value))
+        if values.dtype == object:
+            # 由 Python 列表而來的欄位，None 視為空值
+            values = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        if values.dtype.kind == 'f':
+            values = values.astype(np.float64, copy=False)
+            valid = np.isfinite(values)
+            values = np.where(valid, values, 0.0)
+        else:
+            values = values.astype(np.int64, copy=False)
+            valid = np.ones(len(values), dtype=bool)
+        typed[key] = (values, valid)
+    return index, typed
+
+def dumps_arrow(columns, index_key='dates', meta=None):
+    """序列化為 Arrow IPC stream，meta 以 JSON 存放在 schema metadata"""
+    index, typed = _typed_columns(columns, index_key)
+    if index.dtype == np.int32:
+        arrays = [pa.array(index, type=pa.int32()).cast(pa.date32())]
+    else:
+        arrays = [pa.array(index, type=pa.int64()).cast(pa.timestamp('s'))]
+    names = [index_key]
+    for key, (values, valid) in typed.items():
+        arrays.append(pa.array(values, mask=~valid))
+        names.append(key)
+
+    metadata = {'meta': json.dumps(meta or {}, cls=NpEncoder, ensure_ascii=False)}
+    batch = pa.RecordBatch.from_arrays(arrays, names=names)
+    batch = batch.replace_schema_metadata(metadata)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+def dumps_msgpack(columns, index_key='dates', meta=None):
+    """
+    序列化為 msgpack：
+    {"length", "index": {"name", "dtype": "date32" 或 "timestamp[s]", "data"},
+     "columns": {名稱: {"dtype", "data", "validity"}}, "meta"}
+    data 為 little-endian 原始 bytes，validity 為 LSB 優先的 bitmap（與 Arrow 相同）
+    """
+    index, typed = _typed_columns(columns, index_key)
+    payload = {
+        "length": len(index),
+        "index": {
+            "name": index_key,
+            "dtype": "date32" if index.dtype == np.int32 else "timestamp[s]",
+            "data": index.astype(index.dtype.newbyteorder('<')).tobytes(),
+        },
+        "columns": {
+            key: {
+                "dtype": "float64" if values.dtype.kind == 'f' else "int64",
+                "data": values.astype(values.dtype.newbyteorder('<')).tobytes(),
+                "validity": np.packbits(valid, bitorder='little').tobytes(),
+            }
+            for key, (values, valid) in typed.items()
+        },
+        "meta": json.loads(json.dumps(meta or {}, cls=NpEncoder)),
+    }
+    return msgpack.packb(payload, use_bin_type=True)
+
+def binary_response(fmt, columns, index_key='dates', meta=None, status=200):
+    """以 Arrow 或 msgpack 建立回應，columns 為等長欄位，其餘欄位放在 meta"""
+    if fmt == ARROW_MIMETYPE:
+        body = dumps_arrow(columns, index_key, meta)
+    else:
+        body = dumps_msgpack(columns, index_key, meta)
+    response = current_app.response_class(body, status=status, mimetype=fmt)
+    response.vary.add('Accept')
+    return response
+
+def columns_response(columns, status=200, index_key='dates'):
+    """以欄位資料建立 Flask 回應，依 Accept 標頭選擇 JSON 或二進位格式"""
+    fmt = preferred_format()
+    if fmt != JSON_MIMETYPE:
+        return binary_response(fmt, columns, index_key, status=status)
+    response = current_app.response_class(dumps_columns(columns), status=status, mimetype=JSON_MIMETYPE)
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,84 @@
+"""
+相同上游請求的合併 (single-flight)
+
+多位使用者同時開啟同一檔股票時，每個 Flask 執行緒原本都會各自呼叫
+yf.Ticker(...).history / .info 或完整的新聞情感爬蟲。
+以 (種類, 參數) 為鍵，同一時間只有第一個呼叫者（leader）真正執行，
+其餘呼叫者等待同一個 Future 並共用結果；執行完畢後即移除，不做快取。
+
+leader 拋出例外時，等待中的呼叫者會收到同一個例外。
+"""
+import copy
+import functools
+import inspect
+import threading
+from concurrent.futures import Future
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        # 執行次數與共用結果的次數
+        self._stats = {"executed": 0, "shared": 0}
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        執行 func(*args, **kwargs)，相同 key 正在執行時改為等待其結果
+
+        回傳 (結果, 是否為共用結果)
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self._stats["executed"] += 1
+            else:
+                self._stats["shared"] += 1
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+flights = SingleFlight()
+
+def single_flight(kind, group=flights):
+    """
+    裝飾器：以 (kind, 正規化後的參數) 合併同時進行的相同呼叫
+
+    等待者取得的是結果的複本 (copy.copy，DataFrame 為深複製)，
+    避免呼叫端修改共用的物件
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # 套用預設值，讓 f("AAPL") 與 f(symbol="AAPL") 使用相同的鍵
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (kind, tuple(bound.arguments.items()))
+            result, shared = group.do(key, func, *args, **kwargs)
+            return copy.copy(result) if shared else result
+        return wrapper
+    return decorator
@@ -0,0 +1,379 @@
+"""
+本地日K資料庫
+
+以 SQLite 保存每檔股票的每日 OHLCV，圖表路由與 LSTM 都經由 get_history 讀取。
+只有資料庫尚未涵蓋的日期區間才會向 Yahoo 下載並寫回，重複讀取直接由磁碟提供。
+多檔股票（例如一個群組的批次預測）經由 get_histories，缺少的區間合併成一次下載。
+
+Yahoo 的日K為還原權值後的價格，除權息或分割後所有舊K棒都會改變。
+每次下載都與資料庫重疊一根已收盤的K棒，收盤價不同時刪除該股票的資料並重新下載整段區間，
+避免新舊還原權值混在同一個序列中（例如 10:1 分割時價格突然變為十分之一）。
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+
+import pandas as pd # type: ignore
+import yfinance as yf # type: ignore
+
+from .rateLimiter import yahoo_session
+from .singleFlight import single_flight
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'data', 'ohlcv.db')
+
+# 第一次下載某檔股票時至少抓取的天數，之後 1mo/3mo/6mo/1y 及 LSTM 的長期訓練都能直接命中
+MIN_HISTORY_DAYS = 5 * 365
+
+# 距離上次更新超過此秒數，才重新下載最後一根 K 棒之後的資料
+REFRESH_SECONDS = 15 * 60
+
+# 重疊K棒的收盤價相對差異超過此值，視為還原權值已改變
+ADJUSTMENT_TOLERANCE = 1e-4
+
+PERIOD_DAYS = {
+    '1d': 7,
+    '5d': 7,
+    '1mo': 31,
+    '3mo': 92,
+    '6mo': 183,
+    '1y': 366,
+    '2y': 731,
+    '5y': 1827,
+    '10y': 3653,
+}
+
+# 以K棒數量計算的 period：在 PERIOD_DAYS 的日數內只取最後幾根（'1d' 為最近一個交易日，週末、假日也有資料）
+PERIOD_BARS = {'1d': 1}
+
+# 可用的 period 與 interval（與 yfinance 相同）
+PERIODS = ('1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'ytd', 'max')
+INTERVALS = ('1m', '2m', '5m', '15m', '30m', '60m', '90m', '1h', '1d', '5d', '1wk', '1mo', '3mo')
+INTRADAY_INTERVALS = ('1m', '2m', '5m', '15m', '30m', '60m', '90m', '1h')
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+def _symbol_lock(symbol):
+    """同一檔股票在同一時間只允許一個執行緒更新資料"""
+    with _locks_guard:
+        if symbol not in _locks:
+            _locks[symbol] = threading.Lock()
+        return _locks[symbol]
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily_bars (
+            symbol TEXT NOT NULL,
+            date TEXT NOT NULL,
+            open REAL, high REAL, low REAL, close REAL, volume REAL,
+            PRIMARY KEY (symbol, date)
+        )
+    """)
+    # covered_from: 已下載過的最早日期（即使該股票當時尚未上市）
+    # full_history: 是否已下載過 period="max"
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS symbols (
+            symbol TEXT PRIMARY KEY,
+            covered_from TEXT,
+            full_history INTEGER DEFAULT 0,
+            updated_at REAL
+        )
+    """)
+    return conn
+
+def period_start(period, today=None):
+    """將 yfinance 的 period 字串轉換為起始日期，'max' 回傳 None"""
+    today = today or datetime.now().date()
+    if period == 'max':
+        return None
+    if period == 'ytd':
+        return today.replace(month=1, day=1)
+    if period not in PERIOD_DAYS:
+        raise ValueError(f"不支援的期間: {period}")
+    return today - timedelta(days=PERIOD_DAYS[period])
+
+def _period_bars(data, period):
+    """PERIOD_BARS 中的 period 只保留最後幾根 K 棒"""
+    return data.tail(PERIOD_BARS[period]) if period in PERIOD_BARS else data
+
+def _download(symbol, start=None, end=None):
+    """向 Yahoo 下載指定區間的日K，start 為 None 時下載全部歷史"""
+    stock = yf.Ticker(symbol, session=yahoo_session)
+    if start is None:
+        data = stock.history(period="max")
+    else:
+        data = stock.history(start=start.strftime('%Y-%m-%d'),
+                             end=end.strftime('%Y-%m-%d') if end else None)
+    if data.empty:
+        return data
+    return data[COLUMNS].dropna(subset=['Close'])
+
+def _download_many(symbols, start=None, end=None):
+    """以一次 yf.download 下載多檔股票的日K，回傳 {symbol: DataFrame}（沒有資料的股票不在結果中）"""
+    if start is None:
+        range_args = {"period": "max"}
+    else:
+        range_args = {"start": start.strftime('%Y-%m-%d'), "end": end.strftime('%Y-%m-%d') if end else None}
+    data = yf.download(
+        symbols,
+        group_by='ticker',
+        auto_adjust=True,
+        threads=True,
+        progress=False,
+        session=yahoo_session,
+        **range_args
+    )
+    if data is None or data.empty:
+        return {}
+
+    histories = {}
+    if isinstance(data.columns, pd.MultiIndex):
+        available = set(data.columns.get_level_values(0))
+        for symbol in symbols:
+            if symbol in available:
+                histories[symbol] = data[symbol][COLUMNS].dropna(subset=['Close'])
+    elif len(symbols) == 1:
+        histories[symbols[0]] = data[COLUMNS].dropna(subset=['Close'])
+    return histories
+
+def _save_bars(conn, symbol, data):
+    if data.empty:
+        return
+    dates = data.index.strftime('%Y-%m-%d')
+    rows = [
+        (symbol, date, float(o), float(h), float(l), float(c), float(v))
+        for date, o, h, l, c, v in zip(dates, data['Open'], data['High'], data['Low'],
+                                       data['Close'], data['Volume'])
+    ]
+    conn.executemany(
+        "INSERT OR REPLACE INTO daily_bars VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+    )
+
+def _save_meta(conn, symbol, covered_from, full_history):
+    conn.execute(
+        "INSERT OR REPLACE INTO symbols VALUES (?, ?, ?, ?)",
+        (symbol, covered_from.strftime('%Y-%m-%d') if covered_from else None,
+         int(full_history), time.time())
+    )
+
+def _load_meta(conn, symbol):
+    row = conn.execute(
+        "SELECT covered_from, full_history, updated_at FROM symbols WHERE symbol = ?",
+        (symbol,)
+    ).fetchone()
+    if row is None:
+        return None
+    covered_from = datetime.strptime(row[0], '%Y-%m-%d').date() if row[0] else None
+    return {"covered_from": covered_from, "full_history": bool(row[1]), "updated_at": row[2]}
+
+def _last_date(conn, symbol):
+    row = conn.execute(
+        "SELECT MAX(date) FROM daily_bars WHERE symbol = ?", (symbol,)
+    ).fetchone()
+    return datetime.strptime(row[0], '%Y-%m-%d').date() if row and row[0] else None
+
+def _reference_bar(conn, symbol, oldest=False):
+    """
+    檢查還原權值用的已收盤K棒 (date, close)，沒有時回傳 None
+
+    oldest=True 時為第一根；否則為倒數第二根（最後一根可能為盤中未收盤資料）
+    """
+    if oldest:
+        query = "SELECT date, close FROM daily_bars WHERE symbol = ? ORDER BY date LIMIT 1"
+    else:
+        query = "SELECT date, close FROM daily_bars WHERE symbol = ? ORDER BY date DESC LIMIT 1 OFFSET 1"
+    row = conn.execute(query, (symbol,)).fetchone()
+    if row is None:
+        return None
+    return datetime.strptime(row[0], '%Y-%m-%d').date(), row[1]
+
+def _adjustment_changed(data, reference):
+    """新下載的資料在 reference 日期的收盤價是否與資料庫不同"""
+    if reference is None or data.empty:
+        return False
+    date, close = reference
+    closes = data['Close'][data.index.strftime('%Y-%m-%d') == date.strftime('%Y-%m-%d')]
+    if closes.empty:
+        return False
+    return abs(float(closes.iloc[0]) - close) > ADJUSTMENT_TOLERANCE * abs(close)
+
+def _rebuild(conn, symbol, start):
+    """還原權值已改變：刪除該股票的K棒，從 start（None 為全部歷史）重新下載"""
+    print(f"{symbol} 的還原權值已改變（除權息或分割），重新下載日K資料")
+    data = _download(symbol, start)
+    if data.empty:
+        return
+    conn.execute("DELETE FROM daily_bars WHERE symbol = ?", (symbol,))
+    _save_bars(conn, symbol, data)
+    _save_meta(conn, symbol, start, start is None)
+
+def _load_bars(conn, symbol, start=None):
+    query = "SELECT date, open, high, low, close, volume FROM daily_bars WHERE symbol = ?"
+    params = [symbol]
+    if start is not None:
+        query += " AND date >= ?"
+        params.append(start.strftime('%Y-%m-%d'))
+    query += " ORDER BY date"
+
+    data = pd.read_sql_query(query, conn, params=params)
+    data.columns = ['Date'] + COLUMNS
+    data['Date'] = pd.to_datetime(data['Date'])
+    data['Volume'] = data['Volume'].fillna(0).astype('int64')
+    return data.set_index('Date')
+
+def _sync(conn, symbol, start):
+    """補齊資料庫缺少的區間：前段歷史與最新 K 棒"""
+    today = datetime.now().date()
+    meta = _load_meta(conn, symbol)
+
+    if meta is None:
+        # 第一次下載：至少抓 MIN_HISTORY_DAYS 天
+        fetch_start = None if start is None else min(start, today - timedelta(days=MIN_HISTORY_DAYS))
+        data = _download(symbol, fetch_start)
+        if data.empty:
+            return
+        _save_bars(conn, symbol, data)
+        _save_meta(conn, symbol, fetch_start, fetch_start is None)
+        conn.commit()
+        return
+
+    covered_from = meta['covered_from']
+    full_history = meta['full_history']
+
+    # 要求的起點早於已涵蓋範圍：只下載前面缺少的部分，另外包含已保存的第一根K棒用來檢查還原權值
+    if not full_history and (start is None or start < covered_from):
+        first = _reference_bar(conn, symbol, oldest=True)
+        data = _download(symbol, start, first[0] + timedelta(days=1) if first else covered_from)
+        if _adjustment_changed(data, first):
+            _rebuild(conn, symbol, start)
+            conn.commit()
+            return
+        _save_bars(conn, symbol, data)
+        covered_from = start
+        full_history = start is None
+
+    # 最新資料：從倒數第二根 K 棒（最後一根可能為盤中未收盤資料）重新下載到今天
+    if time.time() - meta['updated_at'] > REFRESH_SECONDS:
+        reference = _reference_bar(conn, symbol)
+        since = reference[0] if reference else (_last_date(conn, symbol) or today)
+        data = _download(symbol, since, today + timedelta(days=1))
+        if _adjustment_changed(data, reference):
+            _rebuild(conn, symbol, None if full_history else covered_from)
+            conn.commit()
+            return
+        _save_bars(conn, symbol, data)
+
+    _save_meta(conn, symbol, covered_from, full_history)
+    conn.commit()
+
+def _sync_many(conn, symbols, start):
+    """
+    補齊多檔股票缺少的區間，下載方式與 _sync 相同，但同一類的下載合併成一次 yf.download：
+    - 第一次下載的股票：一次下載 MIN_HISTORY_DAYS 天（或全部歷史）
+    - 需要更新最新 K 棒的股票：從其中最早的倒數第二根 K 棒一次下載到今天，
+      還原權值已改變的股票再逐檔經由 _rebuild 重新下載
+    需要補前段歷史的股票（要求的起點早於已涵蓋範圍）較少見，仍逐檔經由 _sync 更新
+    """
+    today = datetime.now().date()
+    new_symbols = []
+    stale = {}
+
+    for symbol in symbols:
+        meta = _load_meta(conn, symbol)
+        if meta is None:
+            new_symbols.append(symbol)
+        elif not meta['full_history'] and (start is None or start < meta['covered_from']):
+            _sync(conn, symbol, start)
+        elif time.time() - meta['updated_at'] > REFRESH_SECONDS:
+            stale[symbol] = (_reference_bar(conn, symbol), meta)
+
+    if new_symbols:
+        fetch_start = None if start is None else min(start, today - timedelta(days=MIN_HISTORY_DAYS))
+        histories = _download_many(new_symbols, fetch_start)
+        for symbol in new_symbols:
+            data = histories.get(symbol)
+            if data is None or data.empty:
+                continue
+            _save_bars(conn, symbol, data)
+            _save_meta(conn, symbol, fetch_start, fetch_start is None)
+
+    if stale:
+        since = min(reference[0] if reference else (_last_date(conn, symbol) or today)
+                    for symbol, (reference, _) in stale.items())
+        histories = _download_many(list(stale), since, today + timedelta(days=1))
+        for symbol, (reference, meta) in stale.items():
+            data = histories.get(symbol)
+            if data is not None and _adjustment_changed(data, reference):
+                _rebuild(conn, symbol, None if meta['full_history'] else meta['covered_from'])
+                continue
+            if data is not None:
+                _save_bars(conn, symbol, data)
+            _save_meta(conn, symbol, meta['covered_from'], meta['full_history'])
+
+    conn.commit()
+
+def get_histories(symbols, period="1y"):
+    """
+    一次讀取多檔股票的日K，回傳 {symbol: DataFrame}（沒有資料的股票為空 DataFrame）
+
+    批次預測一個群組時使用：資料庫缺少的區間合併成一到兩次 yf.download，
+    不必對每檔股票各自呼叫 get_history 與 Yahoo。
+    更新期間持有所有股票的鎖（依代號排序取得，不會與其他呼叫互相等待而卡住）
+    """
+    symbols = list(dict.fromkeys(symbols))
+    start = period_start(period)
+
+    with ExitStack() as stack:
+        for symbol in sorted(symbols):
+            stack.enter_context(_symbol_lock(symbol))
+        conn = _connect()
+        try:
+            try:
+                _sync_many(conn, symbols, start)
+            except Exception as e:
+                # 下載失敗時仍回傳資料庫中已有的資料
+                conn.rollback()
+                print(f"批次更新 {len(symbols)} 檔股票日K資料失敗，使用本地資料: {e}")
+            return {symbol: _period_bars(_load_bars(conn, symbol, start), period) for symbol in symbols}
+        finally:
+            conn.close()
+
+@single_flight('history')
+def get_history(symbol, period="1y", interval="1d"):
+    """
+    讀取股票K線資料，回傳與 yf.Ticker.history 相同欄位的 DataFrame
+
+    參數:
+    - symbol: 完整股票代號（台股需帶 .TW）
+    - period: yfinance 的期間字串，例如 1mo、6mo、1y、max
+    - interval: K 棒週期，只有日線 (1d) 經由本地資料庫，其餘直接向 Yahoo 下載
+
+    同時對相同 (symbol, period, interval) 的呼叫會合併為一次讀取與下載
+    """
+    if interval != '1d':
+        data = yf.Ticker(symbol, session=yahoo_session).history(period=period, interval=interval)
+        if data.empty:
+            return data
+        return data[COLUMNS].dropna(subset=['Close'])
+
+    start = period_start(period)
+
+    with _symbol_lock(symbol):
+        conn = _connect()
+        try:
+            try:
+                _sync(conn, symbol, start)
+            except Exception as e:
+                # 下載失敗時仍回傳資料庫中已有的資料
+                conn.rollback()
+                print(f"更新 {symbol} 日K資料失敗，使用本地資料: {e}")
+            return _period_bars(_load_bars(conn, symbol, start), period)
+        finally:
+            conn.close()
@@ -0,0 +1,214 @@
+"""
+LSTM 背景訓練佇列
+
+訓練三層 LSTM 最多 25 個 epoch 需要數十秒到數分鐘，不在請求執行緒中進行：
+- 以 ThreadPoolExecutor 執行，同時訓練的數量由 TRAINING_WORKERS 限制
+- 等待中與執行中的工作超過 MAX_PENDING_JOBS 時拒絕新工作 (QueueFull)
+- 同一個 (symbol, with_sentiment) 已有等待中或執行中的工作時，直接回傳該工作（不重複訓練）
+- 訓練工作的函數經由 inferenceClient.run_task 在推論服務訓練，佇列的執行緒只等待結果；
+  沒有推論服務時才在目前行程訓練（web worker 會載入 TensorFlow）
+
+工作狀態存放在 data/training_jobs.db，任一 gunicorn worker 都能查詢與去重。
+執行中的行程每 HEARTBEAT_SECONDS 秒更新心跳，心跳逾時的工作視為 interrupted（行程已中止）。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'data', 'training_jobs.db')
+
+# 每個行程同時訓練的模型數量
+TRAINING_WORKERS = int(os.environ.get('STOCK_TRAINING_WORKERS', '1'))
+
+# 每個行程最多接受的等待中 + 執行中工作數量
+MAX_PENDING_JOBS = 20
+
+HEARTBEAT_SECONDS = 30
+HEARTBEAT_TIMEOUT = 4 * HEARTBEAT_SECONDS
+
+# 完成的工作紀錄保留天數
+JOB_RETENTION_DAYS = 7
+
+ACTIVE_STATES = ('queued', 'running')
+
+class QueueFull(Exception):
+    pass
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            symbol TEXT NOT NULL,
+            with_sentiment INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            pid INTEGER,
+            created_at REAL,
+            started_at REAL,
+            finished_at REAL,
+            heartbeat_at REAL,
+            error TEXT,
+            result TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (symbol, with_sentiment, state)")
+    return conn
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds') if timestamp else None
+
+def _find_active(conn, symbol, with_sentiment, now):
+    """相同模型等待中或執行中（心跳未逾時）的工作"""
+    placeholders = ', '.join('?' * len(ACTIVE_STATES))
+    return conn.execute(
+        f"SELECT * FROM jobs WHERE symbol = ? AND with_sentiment = ? AND state IN ({placeholders}) "
+        f"AND heartbeat_at > ? ORDER BY created_at DESC LIMIT 1",
+        (symbol, int(with_sentiment), *ACTIVE_STATES, now - HEARTBEAT_TIMEOUT)
+    ).fetchone()
+
+def _row_to_job(row):
+    (job_id, symbol, with_sentiment, state, pid, created_at, started_at,
+     finished_at, heartbeat_at, error, result) = row
+    if state in ACTIVE_STATES and time.time() - (heartbeat_at or 0) > HEARTBEAT_TIMEOUT:
+        state = 'interrupted'
+    return {
+        "job_id": job_id,
+        "symbol": symbol,
+        "with_sentiment": bool(with_sentiment),
+        "state": state,
+        "created_at": _iso(created_at),
+        "started_at": _iso(started_at),
+        "finished_at": _iso(finished_at),
+        "error": error,
+        "result": json.loads(result) if result else None,
+    }
+
+class TrainingQueue:
+    def __init__(self, max_workers=TRAINING_WORKERS, max_pending=MAX_PENDING_JOBS):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='lstm-train')
+        self._lock = threading.Lock()
+        self._active = set()
+        self._heartbeat = None
+
+    def _update(self, job_id, **fields):
+        conn = _connect()
+        try:
+            assignments = ', '.join(f"{name} = ?" for name in fields)
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        finally:
+            conn.close()
+
+    def _ensure_heartbeat(self):
+        if self._heartbeat is None or not self._heartbeat.is_alive():
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='lstm-train-heartbeat', daemon=True)
+            self._heartbeat.start()
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            with self._lock:
+                active = list(self._active)
+            if not active:
+                continue
+            conn = _connect()
+            try:
+                conn.executemany("UPDATE jobs SET heartbeat_at = ? WHERE id = ?",
+                                 [(time.time(), job_id) for job_id in active])
+            finally:
+                conn.close()
+
+    def submit(self, symbol, with_sentiment, func, *args):
+        """
+        排入訓練工作 func(*args)，回傳 (工作狀態, 是否為新工作)
+
+        已有相同 (symbol, with_sentiment) 的工作在等待或執行時回傳該工作；
+        本行程的工作數量已滿時拋出 QueueFull
+        """
+        now = time.time()
+        job_id = None
+        conn = _connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = _find_active(conn, symbol, with_sentiment, now)
+                if row is not None:
+                    conn.execute("COMMIT")
+                    return _row_to_job(row), False
+
+                with self._lock:
+                    full = len(self._active) >= self.max_pending
+                    if not full:
+                        job_id = uuid.uuid4().hex
+                        self._active.add(job_id)
+                if full:
+                    conn.execute("ROLLBACK")
+                    raise QueueFull(f"訓練佇列已滿（{self.max_pending} 個工作）")
+
+                conn.execute(
+                    "INSERT INTO jobs (id, symbol, with_sentiment, state, pid, created_at, heartbeat_at) "
+                    "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                    (job_id, symbol, int(with_sentiment), os.getpid(), now, now)
+                )
+                conn.execute("DELETE FROM jobs WHERE finished_at < ?", (now - JOB_RETENTION_DAYS * 86400,))
+                conn.execute("COMMIT")
+            except QueueFull:
+                raise
+            except Exception:
+                conn.execute("ROLLBACK")
+                with self._lock:
+                    self._active.discard(job_id)
+                raise
+        finally:
+            conn.close()
+
+        self._ensure_heartbeat()
+        self._executor.submit(self._run, job_id, func, args)
+        return self.status(job_id), True
+
+    def _run(self, job_id, func, args):
+        self._update(job_id, state='running', started_at=time.time(), heartbeat_at=time.time())
+        try:
+            result = func(*args)
+            self._update(job_id, state='completed', finished_at=time.time(),
+                         result=json.dumps(result, ensure_ascii=False) if result is not None else None)
+        except Exception as e:
+            print(f"訓練工作 {job_id} 失敗: {e}")
+            self._update(job_id, state='failed', finished_at=time.time(), error=str(e))
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+
+    def status(self, job_id):
+        """回傳工作狀態，不存在時為 None"""
+        conn = _connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return _row_to_job(row) if row else None
+
+    def active_job(self, symbol, with_sentiment):
+        """相同模型正在等待或執行中的工作，沒有時為 None"""
+        conn = _connect()
+        try:
+            row = _find_active(conn, symbol, with_sentiment, time.time())
+        finally:
+            conn.close()
+        return _row_to_job(row) if row else None
+
+    def recent(self, limit=50):
+        conn = _connect()
+        try:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        finally:
+            conn.close()
+        return [_row_to_job(row) for row in rows]
+
+training_queue = TrainingQueue()
@@ -0,0 +1,122 @@
+"""
+TTL + LRU 快取
+
+取代 routes.py 中只有固定鍵值的 _cache：
+- 每個項目有自己的到期時間，ttl 可為秒數或依參數計算秒數的函數
+- 以位元組數估算大小，總量超過 MAX_CACHE_BYTES 時淘汰最久未使用的項目
+- 實際儲存交由 cacheBackend（行程內、SQLite 檔案或 Redis），多個 worker 可共用同一份快取
+- 快取鍵包含函數參數（路由則包含路徑參數、查詢參數與回應格式）
+- 記錄命中、未命中、淘汰與過期次數，/api/cache_stats 可查詢
+
+報價類資料使用 QUOTE_TTL；日K歷史在收盤後到下一次開盤前不會改變，
+因此以 history_ttl 計算：開盤中使用短 TTL，收盤後保留到下一次開盤。
+"""
+import copy
+import functools
+import inspect
+from datetime import datetime, time as dtime, timedelta
+from zoneinfo import ZoneInfo
+
+from flask import current_app, request # type: ignore
+
+from .serializer import preferred_format
+from .cacheBackend import create_backend
+
+# 報價、盤中資料的保存秒數
+QUOTE_TTL = 60
+
+# 各市場的交易時間（不含假日）
+MARKET_HOURS = {
+    'US': (ZoneInfo('America/New_York'), dtime(9, 30), dtime(16, 0)),
+    'TW': (ZoneInfo('Asia/Taipei'), dtime(9, 0), dtime(13, 30)),
+}
+
+def _next_weekday_open(now, open_time):
+    """now 之後（不含當下）最近一個平日的開盤時間"""
+    day = now.date()
+    while True:
+        candidate = datetime.combine(day, open_time, tzinfo=now.tzinfo)
+        if candidate > now and candidate.weekday() < 5:
+            return candidate
+        day += timedelta(days=1)
+
+def market_is_open(market='US', now=None):
+    tz, open_time, close_time = MARKET_HOURS.get(market, MARKET_HOURS['US'])
+    now = (now or datetime.now(tz)).astimezone(tz)
+    return now.weekday() < 5 and open_time <= now.time() < close_time
+
+def history_ttl(market='US', interval='1d', now=None):
+    """
+    日K歷史的保存秒數
+
+    分鐘線或開盤中使用 QUOTE_TTL，收盤後保留到下一次開盤（最後一根 K 棒已確定）
+    """
+    if interval != '1d' or market_is_open(market, now):
+        return QUOTE_TTL
+    tz, open_time, _ = MARKET_HOURS.get(market, MARKET_HOURS['US'])
+    now = (now or datetime.now(tz)).astimezone(tz)
+    return max(QUOTE_TTL, (_next_weekday_open(now, open_time) - now).total_seconds())
+
+# 依 STOCK_CACHE_BACKEND 建立，預設為所有 worker 共用的 SQLite 後端
+cache = create_backend()
+
+def _resolve_ttl(ttl, *args, **kwargs):
+    return ttl(*args, **kwargs) if callable(ttl) else ttl
+
+def cached(kind, ttl, empty_ttl=None):
+    """
+    快取一般函數的回傳值，鍵為 (kind, 正規化後的參數)
+
+    ttl 為秒數，或接收與原函數相同參數的函數；命中時回傳複本 (copy.copy)
+    empty_ttl 不為 None 時，空的回傳值（空字串、空列表等）改為保存 empty_ttl 秒（0 為不快取）
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (kind, tuple(bound.arguments.items()))
+            hit, value = cache.get(key)
+            if hit:
+                return copy.copy(value)
+            value = func(*args, **kwargs)
+            if empty_ttl is not None and not value:
+                cache.set(key, value, empty_ttl)
+            else:
+                cache.set(key, value, _resolve_ttl(ttl, *args, **kwargs))
+            return value
+        return wrapper
+    return decorator
+
+def cached_route(kind, ttl):
+    """
+    快取 Flask 路由的回應，只保存狀態碼 200 的回應內容
+
+    鍵為 (kind, 路徑參數, 查詢參數, 回應格式)；
+    ttl 為秒數，或接收路徑參數與查詢參數（關鍵字引數）的函數
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(**view_args):
+            key = (
+                kind,
+                tuple(sorted(view_args.items())),
+                tuple(sorted(request.args.items(multi=True))),
+                preferred_format(),
+            )
+            hit, entry = cache.get(key)
+            if hit:
+                body, status, headers = entry
+                return current_app.response_class(body, status=status, headers=headers)
+
+            response = current_app.make_response(func(**view_args))
+            if response.status_code == 200 and not response.is_streamed:
+                body = response.get_data()
+                ttl_seconds = _resolve_ttl(ttl, **view_args, **request.args.to_dict())
+                cache.set(key, (body, response.status_code, list(response.headers)),
+                          ttl_seconds, size=len(body))
+            return response
+        return wrapper
+    return decorator
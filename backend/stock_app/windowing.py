@@ -0,0 +1,31 @@
+"""
+LSTM 輸入視窗
+
+以 numpy.lib.stride_tricks.sliding_window_view 建立 (N, window, 1) 的視窗張量，
+回傳的是原陣列的唯讀 view，不會像逐一切片再 np.array 那樣複製每個視窗。
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+def make_windows(values, window):
+    """
+    建立預測用的視窗：第 i 個視窗為 values[i:i + window]，預測目標為 values[i + window]
+
+    參數:
+    - values: 長度 L 的一維陣列，或 (L, 1) 的欄位
+    - window: 視窗長度
+
+    回傳 (L - window, window, 1) 的 view；L <= window 時為空陣列
+    """
+    values = np.asarray(values).reshape(-1)
+    count = len(values) - window
+    if count <= 0:
+        return np.empty((0, window, 1), dtype=values.dtype)
+    # 最後一個值沒有對應的預測目標，不需要以它結尾的視窗
+    return sliding_window_view(values[:-1], window)[:, :, np.newaxis]
+
+def make_training_windows(values, window):
+    """回傳 (x, y)：x 為 make_windows 的視窗，y 為每個視窗的下一個值"""
+    values = np.asarray(values).reshape(-1)
+    x = make_windows(values, window)
+    return x, values[window:window + len(x)]
@@ -0,0 +1,29 @@
+"""
+測試共用設定：關閉背景排程與新聞 ingester，快取使用行程內後端，推論在目前行程執行
+"""
+import os
+
+os.environ.setdefault("STOCK_SENTIMENT_INTERVAL", "0")
+os.environ.setdefault("STOCK_RETRAIN_HOUR", "-1")
+os.environ.setdefault("STOCK_CACHE_BACKEND", "memory")
+os.environ.setdefault("STOCK_INFERENCE", "local")
+
+import pytest
+from flask import Flask
+
+
+@pytest.fixture(scope="session")
+def app():
+    from stock_app import stock_app_blueprint
+
+    app = Flask(__name__)
+    app.register_blueprint(stock_app_blueprint, url_prefix='/stock_app')
+    return app
+
+
+@pytest.fixture
+def client(app):
+    from stock_app.ttlCache import cache
+
+    cache.invalidate()
+    return app.test_client()
@@ -0,0 +1,161 @@
+"""
+TTL + LRU 快取後端、cached 裝飾器與 single-flight
+
+執行方式（於 backend 目錄）:
+    python -m pytest tests
+"""
+import threading
+import time
+import types
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from stock_app import cacheBackend, ttlCache
+from stock_app.cacheBackend import MemoryBackend, SQLiteBackend
+from stock_app.singleFlight import SingleFlight, single_flight
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手動推進的時鐘，取代 cacheBackend 使用的 time 模組"""
+    fake = types.SimpleNamespace(now=1_000_000.0)
+    fake.time = lambda: fake.now
+    monkeypatch.setattr(cacheBackend, "time", fake)
+    return fake
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path, clock):
+    if request.param == "memory":
+        return MemoryBackend(max_bytes=1000)
+    return SQLiteBackend(db_path=str(tmp_path / "cache.db"), max_bytes=1000)
+
+
+def test_entry_expires_after_ttl(backend, clock):
+    backend.set(("quote", "AAA"), {"price": 1.0}, ttl=60)
+    assert backend.get(("quote", "AAA")) == (True, {"price": 1.0})
+
+    clock.now += 61
+    assert backend.get(("quote", "AAA")) == (False, None)
+    assert backend.stats()["kinds"]["quote"]["expirations"] == 1
+
+
+def test_non_positive_ttl_is_not_stored(backend):
+    backend.set(("quote", "AAA"), 1, ttl=0)
+    assert backend.get(("quote", "AAA")) == (False, None)
+
+
+def test_least_recently_used_entry_is_evicted(backend, clock):
+    value = b"x" * 400
+    backend.set(("chart", "A"), value, ttl=3600)
+    clock.now += 1
+    backend.set(("chart", "B"), value, ttl=3600)
+
+    # 使用 A 之後，B 成為最久未使用的項目（超過 ACCESS_GRANULARITY 才會更新 SQLite 的存取時間）
+    clock.now += cacheBackend.ACCESS_GRANULARITY + 1
+    assert backend.get(("chart", "A"))[0]
+    clock.now += 1
+    backend.set(("chart", "C"), value, ttl=3600)
+
+    assert backend.get(("chart", "A"))[0]
+    assert not backend.get(("chart", "B"))[0]
+    assert backend.get(("chart", "C"))[0]
+    stats = backend.stats()
+    assert stats["bytes"] <= 1000
+    assert stats["kinds"]["chart"]["evictions"] == 1
+
+
+def test_invalidate_by_kind(backend):
+    backend.set(("quote", "AAA"), 1, ttl=60)
+    backend.set(("chart", "AAA"), 2, ttl=60)
+    backend.invalidate("quote")
+    assert not backend.get(("quote", "AAA"))[0]
+    assert backend.get(("chart", "AAA"))[0]
+
+
+def test_cached_decorator_keys_on_normalized_arguments(monkeypatch):
+    monkeypatch.setattr(ttlCache, "cache", MemoryBackend())
+    calls = []
+
+    @ttlCache.cached("lookup", 60)
+    def lookup(symbol, market="US"):
+        calls.append((symbol, market))
+        return [symbol, market]
+
+    assert lookup("AAA") == lookup(symbol="AAA", market="US") == ["AAA", "US"]
+    lookup("AAA", "TW")
+    assert calls == [("AAA", "US"), ("AAA", "TW")]
+
+
+def test_history_ttl_lasts_until_next_open():
+    tz = ZoneInfo("America/New_York")
+    # 週五收盤後：保留到週一開盤
+    friday_evening = datetime(2024, 6, 7, 18, 0, tzinfo=tz)
+    assert ttlCache.history_ttl("US", "1d", friday_evening) == (2 * 24 + 15.5) * 3600
+    # 盤中或分鐘線使用短 TTL
+    assert ttlCache.history_ttl("US", "1d", datetime(2024, 6, 7, 11, 0, tzinfo=tz)) == ttlCache.QUOTE_TTL
+    assert ttlCache.history_ttl("US", "5m", friday_evening) == ttlCache.QUOTE_TTL
+
+
+def test_single_flight_runs_concurrent_calls_once():
+    group = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    @single_flight("history", group=group)
+    def fetch(symbol):
+        calls.append(symbol)
+        started.set()
+        release.wait(5)
+        return {"symbol": symbol}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(fetch("AAA")))
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(fetch("AAA"))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while group.stats()["shared"] < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert calls == ["AAA"]
+    assert results == [{"symbol": "AAA"}] * 4
+    # 等待者取得複本，不共用同一個物件
+    assert len({id(result) for result in results}) == 4
+    assert group.stats() == {"executed": 1, "shared": 3, "in_flight": 0}
+
+
+def test_single_flight_shares_the_leaders_exception():
+    group = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("429")
+
+    errors = []
+
+    def call():
+        try:
+            group.do("key", fail)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    while group.stats()["shared"] < 1:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert errors == ["429", "429"]
@@ -0,0 +1,67 @@
+"""
+美股分類資料更新：從當日檢查點繼續時略過已完成的股票
+
+執行方式（於 backend 目錄）:
+    python -m pytest tests
+"""
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from stock_app import categoryJob
+
+SYMBOLS = ["AAA", "BBB", "CCC", "DDD", "EEE"]
+
+
+@pytest.fixture
+def job(tmp_path, monkeypatch):
+    for name, filename in [("CSV_PATH", "us_stock_list.csv"), ("JSON_PATH", "us_stock_categories.json"),
+                           ("PROGRESS_PATH", "fetch_progress.json"), ("CHECKPOINT_PATH", "fetch_progress.jsonl"),
+                           ("STATUS_PATH", "category_refresh_status.json")]:
+        monkeypatch.setattr(categoryJob, name, str(tmp_path / filename))
+    (tmp_path / "us_stock_list.csv").write_text("Symbol\n" + "\n".join(SYMBOLS) + "\n")
+
+    fetched = []
+
+    def fetch(symbol):
+        fetched.append(symbol)
+        return {"ticker": symbol, "marketCap": 1}
+
+    monkeypatch.setattr(categoryJob, "fetch_stock_data", fetch)
+    return fetched
+
+
+def write_checkpoint(date, tickers, partial_line=""):
+    with open(categoryJob.CHECKPOINT_PATH, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"date": date}) + "\n")
+        for ticker in tickers:
+            f.write(json.dumps({"ticker": ticker, "marketCap": 1}) + "\n")
+        f.write(partial_line)
+
+
+def test_resume_skips_completed_tickers(job):
+    today = datetime.now().strftime('%Y-%m-%d')
+    # 上一次中止在 DDD 寫到一半
+    write_checkpoint(today, ["AAA", "CCC"], partial_line='{"ticker": "DD')
+
+    result = categoryJob.refresh_categories()
+
+    assert sorted(job) == ["BBB", "DDD", "EEE"]
+    assert [item["ticker"] for item in result] == SYMBOLS
+    assert not os.path.exists(categoryJob.CHECKPOINT_PATH)
+    with open(categoryJob.JSON_PATH, encoding="utf-8") as f:
+        assert [item["ticker"] for item in json.load(f)] == SYMBOLS
+
+
+def test_checkpoint_from_another_day_is_ignored(job):
+    write_checkpoint("2000-01-01", ["AAA", "BBB"])
+    categoryJob.refresh_categories()
+    assert sorted(job) == SYMBOLS
+
+
+def test_load_checkpoint_ignores_partial_last_line(job):
+    today = datetime.now().strftime('%Y-%m-%d')
+    write_checkpoint(today, ["AAA"], partial_line='{"tick')
+    assert list(categoryJob.load_checkpoint(today)) == ["AAA"]
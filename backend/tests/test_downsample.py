@@ -0,0 +1,68 @@
+"""
+圖表降採樣：OHLC 分桶的日期與聚合、LTTB 保留首尾點
+
+執行方式（於 backend 目錄）:
+    python -m pytest tests
+"""
+import numpy as np
+import pandas as pd
+
+from stock_app.downsample import lttb_indices, ohlc_buckets
+
+
+def make_bars(length=100):
+    values = np.arange(length, dtype=np.float64)
+    return pd.DataFrame({
+        "Open": values, "High": values + 1, "Low": values - 1, "Close": values + 0.5, "Volume": 10.0,
+    }, index=pd.bdate_range("2024-01-01", periods=length))
+
+
+def test_ohlc_buckets_are_dated_by_their_last_bar():
+    data = make_bars()
+    aggregated, positions = ohlc_buckets(data, 10)
+
+    assert len(aggregated) == 10
+    assert list(aggregated.index) == list(data.index[positions])
+    assert positions[-1] == len(data) - 1
+    np.testing.assert_array_equal(aggregated["Close"].to_numpy(), data["Close"].to_numpy()[positions])
+
+
+def test_ohlc_buckets_aggregate_each_bucket():
+    data = make_bars()
+    aggregated, _ = ohlc_buckets(data, 10)
+
+    # 100 根分成 10 個分桶，每桶 10 根
+    first = aggregated.iloc[0]
+    assert first["Open"] == data["Open"].iloc[0]
+    assert first["High"] == data["High"].iloc[:10].max()
+    assert first["Low"] == data["Low"].iloc[:10].min()
+    assert first["Volume"] == data["Volume"].iloc[:10].sum()
+
+
+def test_ohlc_buckets_keeps_short_data():
+    data = make_bars(5)
+    aggregated, positions = ohlc_buckets(data, 10)
+    assert aggregated is data
+    assert positions.tolist() == [0, 1, 2, 3, 4]
+
+
+def test_lttb_keeps_endpoints_and_order():
+    values = np.sin(np.linspace(0, 10, 500))
+    selected = lttb_indices(values, 50)
+
+    assert len(selected) == 50
+    assert selected[0] == 0 and selected[-1] == len(values) - 1
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_lttb_keeps_spike():
+    values = np.zeros(300)
+    values[137] = 10
+    assert 137 in lttb_indices(values, 20)
+
+
+def test_lttb_handles_nan():
+    values = np.arange(100, dtype=np.float64)
+    values[:10] = np.nan
+    selected = lttb_indices(values, 10)
+    assert selected[0] == 0 and selected[-1] == 99
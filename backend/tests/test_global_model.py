@@ -0,0 +1,22 @@
+"""
+全域模型的代號編號
+
+執行方式（於 backend 目錄，需要安裝 TensorFlow）:
+    python -m pytest tests
+"""
+import pytest
+
+pytest.importorskip("tensorflow")
+
+from stock_app.globalModel import _id_inputs, symbol_id
+
+
+def test_unseen_symbol_uses_unknown_bucket():
+    symbol_ids, _ = _id_inputs(["AAPL", "NEWCO"], trained_symbols=["AAPL", "MSFT"])
+    assert symbol_ids[0, 0] == symbol_id("AAPL") != 0
+    assert symbol_ids[1, 0] == 0
+
+
+def test_no_trained_symbols_maps_everything_to_unknown():
+    symbol_ids, _ = _id_inputs(["AAPL", "2330.TW"], trained_symbols=[])
+    assert symbol_ids.tolist() == [[0], [0]]
@@ -0,0 +1,58 @@
+"""
+技術指標引擎：結果與 pandas rolling 一致、快取鍵辨識價格內容
+
+執行方式（於 backend 目錄）:
+    python -m pytest tests
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_app import indicatorEngine
+from stock_app.indicatorEngine import compute_indicators, indicator
+
+
+@pytest.fixture
+def prices():
+    rng = np.random.default_rng(0)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 120)))
+    index = pd.bdate_range("2024-01-01", periods=len(closes))
+    indicatorEngine.clear_cache()
+    return pd.DataFrame({"Open": closes, "High": closes * 1.01, "Low": closes * 0.99, "Close": closes}, index=index)
+
+
+def test_sma_matches_pandas_rolling(prices):
+    spec = indicator('SMA', timeperiod=20)
+    result = compute_indicators("AAA", prices, [spec])[spec]
+    expected = prices["Close"].rolling(20).mean().to_numpy()
+    np.testing.assert_allclose(result, expected, equal_nan=True)
+
+
+def test_bias_matches_pandas_rolling(prices):
+    spec = indicator('BIAS', timeperiod=10)
+    result = compute_indicators("AAA", prices, [spec])[spec]
+    sma = prices["Close"].rolling(10).mean()
+    expected = ((prices["Close"] - sma) / sma * 100).to_numpy()
+    np.testing.assert_allclose(result, expected, equal_nan=True)
+
+
+def test_duplicate_specs_share_one_result(prices):
+    first, second = indicator('SMA', timeperiod=5), indicator('SMA', timeperiod=5)
+    results = compute_indicators("AAA", prices, [first, second])
+    assert len(results) == 1
+
+
+def test_changed_last_bar_is_recomputed(prices):
+    spec = indicator('SMA', timeperiod=5)
+    before = compute_indicators("AAA", prices, [spec])[spec][-1]
+
+    # 盤中最後一根 K 棒更新：日期與長度不變
+    updated = prices.copy()
+    updated.iloc[-1, updated.columns.get_loc("Close")] += 5
+    after = compute_indicators("AAA", updated, [spec])[spec][-1]
+    assert after == pytest.approx(before + 1)
+
+
+def test_unknown_indicator_is_rejected():
+    with pytest.raises(ValueError):
+        indicator('FOO', timeperiod=5)
@@ -0,0 +1,49 @@
+"""
+訓練工作交給推論服務執行（以假的訓練函數測試，不需要 TensorFlow）
+
+執行方式（於 backend 目錄）:
+    python -m pytest tests
+"""
+import socket
+import threading
+import time
+
+import pytest
+
+from stock_app import inferenceClient, inferenceServer
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="推論服務需要 AF_UNIX")
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_task(task, *args):
+        calls.append((task, args, threading.current_thread().name))
+        return {"task": task}
+
+    address = str(tmp_path / "inference.sock")
+    monkeypatch.setattr(inferenceServer, "run_local_task", fake_task)
+    monkeypatch.setattr(inferenceClient, "INFERENCE_SOCKET", address)
+    monkeypatch.setattr(inferenceClient, "INFERENCE_MODE", "auto")
+    threading.Thread(target=inferenceServer.InferenceServer(address=address).serve_forever, daemon=True).start()
+    for _ in range(100):
+        if inferenceClient.use_remote():
+            break
+        time.sleep(0.01)
+    yield calls
+    inferenceClient._close()
+
+
+def test_training_task_runs_in_inference_server(server, monkeypatch):
+    monkeypatch.setattr(inferenceClient, "run_local_task", lambda *args: pytest.fail("不應在目前行程訓練"))
+    assert inferenceClient.run_task("train_model", "AAA", False, 60) == {"task": "train_model"}
+    assert server == [("train_model", ("AAA", False, 60), "inference-conn")]
+
+
+def test_training_task_runs_locally_without_server(tmp_path, monkeypatch):
+    monkeypatch.setattr(inferenceClient, "INFERENCE_SOCKET", str(tmp_path / "missing.sock"))
+    monkeypatch.setattr(inferenceClient, "INFERENCE_MODE", "auto")
+    monkeypatch.setattr(inferenceClient, "run_local_task", lambda task, *args: ("local", task, args))
+    assert inferenceClient.run_task("train_global_model", None) == ("local", "train_global_model", (None,))
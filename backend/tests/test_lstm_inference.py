@@ -0,0 +1,45 @@
+"""
+編譯後的推論函數不會讓模型常駐記憶體
+
+執行方式（於 backend 目錄，需要安裝 TensorFlow）:
+    python -m pytest tests
+"""
+import gc
+import weakref
+
+import numpy as np
+import pytest
+
+pytest.importorskip("tensorflow")
+
+from stock_app import modelRegistry
+from stock_app.lstmInference import _step_function
+
+
+class FakeModel:
+    """只有 __call__ 與 count_params 的模型，輸出為視窗最後一個值"""
+    inputs = []
+
+    def __call__(self, inputs, training=False):
+        return inputs[:, -1, :]
+
+    def count_params(self):
+        return 100
+
+
+def test_evicted_model_is_garbage_collected(monkeypatch):
+    monkeypatch.setattr(modelRegistry, "_mtimes", lambda model_path, scaler_path: (0.0, 0.0))
+    # 上限只容得下一個模型
+    registry = modelRegistry.ModelRegistry(max_bytes=modelRegistry._model_bytes(FakeModel()))
+
+    model = FakeModel()
+    registry.put("AAA", False, model, None)
+    step = _step_function(model)
+    assert np.asarray(step(np.ones((1, 3, 1), dtype=np.float32))).shape == (1, 1)
+    del step
+    ref = weakref.ref(model)
+    del model
+
+    registry.put("BBB", False, FakeModel(), None)
+    gc.collect()
+    assert ref() is None
@@ -0,0 +1,37 @@
+"""
+LSTM 路由的背景工作（不需要 TensorFlow）
+
+執行方式（於 backend 目錄）:
+    python -m pytest tests
+"""
+import pytest
+from flask import Flask
+
+from stock_app import lstmRoutes, stock_app_blueprint
+
+
+@pytest.fixture
+def started(monkeypatch):
+    calls = []
+    monkeypatch.setattr(lstmRoutes, "start_scheduler", lambda *args: calls.append(args))
+    monkeypatch.setattr(lstmRoutes.registry, "prewarm_async", lambda *args: None)
+    monkeypatch.setattr(lstmRoutes.sentiment_store, "start_ingester", lambda *args: None)
+    return calls
+
+
+def register():
+    """註冊到新的 app，觸發 record_once 的 start_background_jobs"""
+    Flask(__name__).register_blueprint(stock_app_blueprint, url_prefix='/stock_app')
+
+
+def test_scheduler_runs_in_web_worker_without_inference_server(started, monkeypatch):
+    monkeypatch.setattr(lstmRoutes.inference_client, "use_remote", lambda: False)
+    register()
+    assert len(started) == 1
+
+
+def test_scheduler_left_to_inference_server(started, monkeypatch):
+    monkeypatch.setattr(lstmRoutes.inference_client, "use_remote", lambda: True)
+    monkeypatch.setattr(lstmRoutes, "RETRAIN_IN_WEB", False)
+    register()
+    assert started == []
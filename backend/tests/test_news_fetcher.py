@@ -0,0 +1,49 @@
+"""
+新聞列表與文章的解析、快取
+
+執行方式（於 backend 目錄）:
+    python -m pytest tests
+"""
+from stock_app import newsFetcher
+
+
+def test_bs4_is_imported_only_when_parsing():
+    # 匯入 newsFetcher 時不匯入 BeautifulSoup，_soup 第一次解析時才匯入
+    assert not hasattr(newsFetcher, "BeautifulSoup")
+
+
+def test_extract_article_text_reads_article_paragraphs():
+    paragraph = "Revenue grew strongly in the quarter as demand for cloud services rose. " * 3
+    html = f'<html><body><div class="caas-body"><p>{paragraph}</p><p>Second.</p></div></body></html>'
+    assert newsFetcher.extract_article_text(html) == f"{paragraph.strip()} Second."
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+
+def test_empty_article_is_cached_briefly(monkeypatch):
+    from stock_app import cacheBackend, ttlCache
+
+    cache = cacheBackend.MemoryBackend()
+    monkeypatch.setattr(ttlCache, "cache", cache)
+    ttls = {}
+    original_set = cache.set
+    monkeypatch.setattr(cache, "set", lambda key, value, ttl, size=None: (ttls.__setitem__(key[1], ttl),
+                                                                         original_set(key, value, ttl, size)))
+    paragraph = "Revenue grew strongly in the quarter as demand for cloud services rose. " * 3
+    pages = {
+        "https://example.com/paywall": "<html><body><p>Subscribe to read</p></body></html>",
+        "https://example.com/article": f'<html><body><div class="caas-body"><p>{paragraph}</p></div></body></html>',
+    }
+    monkeypatch.setattr(newsFetcher.yahoo_session, "get", lambda url, **kwargs: FakeResponse(pages[url]))
+
+    assert newsFetcher.fetch_article("https://example.com/paywall") == ""
+    assert newsFetcher.fetch_article("https://example.com/article") == paragraph.strip()
+
+    assert ttls[(("url", "https://example.com/paywall"),)] == newsFetcher.EMPTY_ARTICLE_TTL
+    assert ttls[(("url", "https://example.com/article"),)] == newsFetcher.ARTICLE_TTL
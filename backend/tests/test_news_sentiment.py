@@ -0,0 +1,31 @@
+"""
+平均情感的權重計算不在標準輸出列印除錯資訊
+
+執行方式（於 backend 目錄）:
+    python -m pytest tests
+"""
+import logging
+
+from stock_app.newsSentiment import calculate_balanced_sentiment
+
+SCORES = [0.6, -0.7, 0.1, -0.8]
+TIMES = ["Reuters • 2小時前", "5分鐘前", "Bloomberg • 20小時前", ""]
+TITLES = ["Stock rallies", "Shares plunge after miss", "Market flat", "Downgrade"]
+
+
+def test_no_debug_output_by_default(capsys, caplog):
+    caplog.set_level(logging.INFO, logger="stock_app.newsSentiment")
+    score = calculate_balanced_sentiment(SCORES, TIMES, TITLES)
+
+    assert -1.0 <= score < 0
+    assert capsys.readouterr().out == ""
+    assert caplog.records == []
+
+
+def test_weight_details_logged_at_debug_level(caplog):
+    caplog.set_level(logging.DEBUG, logger="stock_app.newsSentiment")
+    score = calculate_balanced_sentiment(SCORES, TIMES, TITLES)
+
+    assert score == calculate_balanced_sentiment(SCORES, TIMES)
+    assert "Shares plunge after miss" in caplog.text
+    assert "最終情感分數" in caplog.text
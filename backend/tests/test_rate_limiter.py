@@ -0,0 +1,97 @@
+"""
+跨行程 token bucket：突發容量、補充速率、Retry-After 與指數退避
+
+以可手動推進的時鐘取代 time，sleep 只推進時鐘不實際等待。
+
+執行方式（於 backend 目錄）:
+    python -m pytest tests
+"""
+import types
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from stock_app import rateLimiter
+from stock_app.rateLimiter import RateLimiter, RateLimitedSession, parse_retry_after
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = types.SimpleNamespace(now=1_000_000.0, slept=0.0)
+    fake.time = lambda: fake.now
+
+    def sleep(seconds):
+        fake.now += seconds
+        fake.slept += seconds
+
+    fake.sleep = sleep
+    monkeypatch.setattr(rateLimiter, "time", fake)
+    monkeypatch.setattr(rateLimiter, "random", types.SimpleNamespace(uniform=lambda a, b: 0.0))
+    return fake
+
+
+@pytest.fixture
+def limiter(tmp_path, clock):
+    return RateLimiter(db_path=str(tmp_path / "rate_limits.db"), budgets={"test": (2.0, 3)})
+
+
+def test_burst_up_to_capacity_then_wait_for_refill(limiter, clock):
+    for _ in range(3):
+        assert limiter.acquire("test") == 0
+    # 第 4 個請求需等待補充一個 token（每秒 2 個）
+    assert limiter.acquire("test") == pytest.approx(0.5)
+
+
+def test_tokens_refill_with_elapsed_time(limiter, clock):
+    for _ in range(3):
+        limiter.acquire("test")
+    clock.now += 1.0
+    assert limiter.metrics()["test"]["tokens"] == pytest.approx(2.0)
+    # 補充不超過容量
+    clock.now += 100
+    assert limiter.metrics()["test"]["tokens"] == pytest.approx(3.0)
+
+
+def test_retry_after_pauses_the_budget(limiter, clock):
+    assert limiter.penalize("test", retry_after=5) == 5
+    assert limiter.metrics()["test"]["wait_seconds"] == pytest.approx(5)
+    assert limiter.acquire("test") >= 5
+
+
+def test_backoff_doubles_until_reset(limiter, clock):
+    assert limiter.penalize("test") == rateLimiter.DEFAULT_BACKOFF
+    assert limiter.penalize("test") == rateLimiter.DEFAULT_BACKOFF * 2
+    limiter.reset_backoff("test")
+    assert limiter.penalize("test") == rateLimiter.DEFAULT_BACKOFF
+
+
+def test_parse_retry_after(clock):
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    date = format_datetime(datetime.fromtimestamp(clock.now + 30, tz=timezone.utc), usegmt=True)
+    assert parse_retry_after(date) == pytest.approx(30, abs=1)
+
+
+def test_session_waits_retry_after_on_429(limiter, clock, monkeypatch):
+    responses = [
+        types.SimpleNamespace(status_code=429, headers={"Retry-After": "7"}),
+        types.SimpleNamespace(status_code=200, headers={}),
+    ]
+    monkeypatch.setattr(rateLimiter, "limiter", limiter)
+    monkeypatch.setattr(rateLimiter, "budget_for", lambda url: "test")
+    monkeypatch.setattr(rateLimiter.curl_requests.Session, "request",
+                        lambda self, method, url, *args, **kwargs: responses.pop(0))
+
+    response = RateLimitedSession().request("GET", "https://query1.finance.yahoo.com/v8/finance/chart/AAA")
+
+    assert response.status_code == 200
+    assert clock.slept >= 7
+    assert limiter.metrics()["test"]["throttled"] == 1
+
+
+def test_hosts_map_to_budgets():
+    assert rateLimiter.budget_for("https://query2.finance.yahoo.com/v10/x") == "yahoo_api"
+    assert rateLimiter.budget_for("https://finance.yahoo.com/quote/AAA/news") == "yahoo_web"
+    assert rateLimiter.budget_for("https://example.com/article") == "default"
@@ -0,0 +1,85 @@
+"""
+批次新聞評分與原本逐則評分的結果一致
+
+VADER 以固定的假分數取代（不需要 NLTK），分數集中在中性範圍，讓金融詞彙的調整都會被執行。
+
+執行方式（於 backend 目錄）:
+    python -m pytest tests
+"""
+import numpy as np
+
+from stock_app.sentimentScoring import (FINANCE_NEG_TERMS, FINANCE_POS_TERMS, STOCK_TERMS,
+                                        score_news_batch, term_presence)
+
+
+def polarity(text):
+    """依文字內容決定的假 VADER 分數，範圍 [-0.2, 0.2]"""
+    return (sum(map(ord, text)) % 41 - 20) / 100
+
+
+def baseline(title, symbol, content):
+    """原本 analysis_stock_sentiment 的逐則評分，回傳 (標題分數, 綜合分數)"""
+    stock_terms = [symbol.lower(), symbol] + STOCK_TERMS
+    compound_score = polarity(title)
+    title_lower = title.lower()
+    pos_matches = sum(1 for term in FINANCE_POS_TERMS if term in title_lower)
+    neg_matches = sum(1 for term in FINANCE_NEG_TERMS if term in title_lower)
+    weight = 1.5 if any(term in title_lower for term in stock_terms) else 1.0
+    if -0.1 < compound_score < 0.1:
+        if pos_matches > neg_matches:
+            compound_score += 0.1 * pos_matches
+        elif neg_matches > pos_matches:
+            compound_score -= 0.1 * neg_matches
+    title_score = max(-1.0, min(1.0, compound_score * weight))
+    if not content or len(content) <= 100:
+        return title_score, title_score
+
+    chunks = [content[i:i + 1000] for i in range(0, len(content), 1000)]
+    weighted = [polarity(chunk) * (1.0 / (1 + i * 0.3)) for i, chunk in enumerate(chunks)]
+    article_score = sum(weighted) / sum(1.0 / (1 + i * 0.3) for i in range(len(chunks)))
+    content_lower = content.lower()
+    pos_matches = sum(1 for term in FINANCE_POS_TERMS if term in content_lower)
+    neg_matches = sum(1 for term in FINANCE_NEG_TERMS if term in content_lower)
+    if -0.1 < article_score < 0.1:
+        if pos_matches > neg_matches:
+            article_score += 0.05 * min(5, pos_matches)
+        elif neg_matches > pos_matches:
+            article_score -= 0.05 * min(5, neg_matches)
+    article_score = max(-1.0, min(1.0, article_score))
+    return title_score, title_score * 0.35 + article_score * 0.65
+
+
+def make_news(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    words = np.array("the company said revenue outlook quarter demand shares market".split()
+                     + FINANCE_POS_TERMS + FINANCE_NEG_TERMS)
+    symbols = [f"SYM{i % 7}" for i in range(n)]
+    titles = [f"{symbols[i] if i % 3 else 'Apple'} " + " ".join(rng.choice(words, 8)).title() for i in range(n)]
+    contents = []
+    for i in range(n):
+        if i % 5 == 0:
+            contents.append(None)
+        elif i % 5 == 1:
+            contents.append("short text")
+        else:
+            contents.append(" ".join(rng.choice(words, int(rng.integers(20, 600)))))
+    return titles, symbols, contents
+
+
+def test_batch_scores_match_per_item_baseline():
+    titles, symbols, contents = make_news()
+    title_scores, combined = score_news_batch(titles, symbols, contents, polarity)
+    expected = np.array([baseline(*item) for item in zip(titles, symbols, contents)])
+
+    np.testing.assert_allclose(title_scores, expected[:, 0])
+    np.testing.assert_allclose(combined, expected[:, 1])
+
+
+def test_term_presence_is_per_text_substring_match():
+    present = term_presence(["Shares RALLY", "no match", "rallying downgrade"], ["rally", "downgrade"])
+    assert present.tolist() == [[True, False, True], [False, False, True]]
+
+
+def test_empty_batch():
+    title_scores, combined = score_news_batch([], [], [], polarity)
+    assert title_scores.shape == combined.shape == (0,)
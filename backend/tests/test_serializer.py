@@ -0,0 +1,60 @@
+"""
+回應序列化：NaN / inf 在 JSON、Arrow、msgpack 中都是空值
+
+執行方式（於 backend 目錄）:
+    python -m pytest tests
+"""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_app import serializer
+
+
+def make_columns():
+    return {
+        # 與路由相同，日期已由 format_dates 轉為字串
+        "dates": pd.bdate_range("2024-01-01", periods=4).strftime('%Y-%m-%d').tolist(),
+        "close_prices": np.array([1.5, np.nan, np.inf, -np.inf]),
+        "volumes": np.array([1, 2, 3, 4]),
+    }
+
+
+def test_json_without_orjson_writes_null(monkeypatch):
+    monkeypatch.setattr(serializer, "orjson", None)
+    body = json.loads(serializer.dumps_columns(make_columns()))
+
+    assert body["close_prices"] == [1.5, None, None, None]
+    assert body["volumes"] == [1, 2, 3, 4]
+    assert body["dates"][0] == "2024-01-01"
+
+
+def test_json_with_orjson_writes_null():
+    pytest.importorskip("orjson")
+    body = json.loads(serializer.dumps_columns(make_columns()))
+    assert body["close_prices"] == [1.5, None, None, None]
+
+
+def test_arrow_marks_non_finite_as_null():
+    pa = pytest.importorskip("pyarrow")
+    body = serializer.dumps_arrow(make_columns(), meta={"change": 1.0})
+    table = pa.ipc.open_stream(body).read_all()
+
+    assert table.column("close_prices").to_pylist() == [1.5, None, None, None]
+    assert table.column("volumes").to_pylist() == [1, 2, 3, 4]
+    assert str(table.column("dates")[0]) == "2024-01-01"
+    assert json.loads(table.schema.metadata[b"meta"]) == {"change": 1.0}
+
+
+def test_msgpack_marks_non_finite_as_invalid():
+    msgpack = pytest.importorskip("msgpack")
+    payload = msgpack.unpackb(serializer.dumps_msgpack(make_columns()), raw=False)
+
+    column = payload["columns"]["close_prices"]
+    validity = np.unpackbits(np.frombuffer(column["validity"], dtype=np.uint8), bitorder="little")
+    assert validity[:4].tolist() == [1, 0, 0, 0]
+    assert np.frombuffer(column["data"], dtype="<f8")[0] == 1.5
+    assert payload["index"]["dtype"] == "date32"
+    assert payload["length"] == 4
@@ -0,0 +1,106 @@
+"""
+本地日K資料庫的增量更新與還原權值檢查（以假的 Yahoo 下載取代網路）
+
+執行方式（於 backend 目錄）:
+    python -m pytest tests
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_app import stockStore
+
+
+class FakeYahoo:
+    """依 start/end 切出 history 的一段，記錄每次下載的區間"""
+
+    def __init__(self, history):
+        self.history = history
+        self.calls = []
+
+    def download(self, symbol, start=None, end=None):
+        self.calls.append((start, end))
+        data = self.history
+        if start is not None:
+            data = data[data.index >= pd.Timestamp(start)]
+        if end is not None:
+            data = data[data.index < pd.Timestamp(end)]
+        return data
+
+    def download_many(self, symbols, start=None, end=None):
+        return {symbol: self.download(symbol, start, end) for symbol in symbols}
+
+
+def make_history(days=40):
+    end = pd.Timestamp(datetime.now().date())
+    index = pd.bdate_range(end=end, periods=days)
+    closes = np.linspace(100, 140, days)
+    return pd.DataFrame({
+        "Open": closes, "High": closes + 1, "Low": closes - 1, "Close": closes, "Volume": 1000.0,
+    }, index=index)
+
+
+@pytest.fixture
+def yahoo(tmp_path, monkeypatch):
+    monkeypatch.setattr(stockStore, "DB_PATH", str(tmp_path / "ohlcv.db"))
+    fake = FakeYahoo(make_history())
+    monkeypatch.setattr(stockStore, "_download", fake.download)
+    monkeypatch.setattr(stockStore, "_download_many", fake.download_many)
+    return fake
+
+
+def test_refresh_only_downloads_recent_bars(yahoo, monkeypatch):
+    stockStore.get_history("AAA", "1mo")
+    monkeypatch.setattr(stockStore, "REFRESH_SECONDS", -1)
+    stockStore.get_history("AAA", "1mo")
+
+    since, _ = yahoo.calls[-1]
+    # 從倒數第二根K棒開始下載
+    assert since == yahoo.history.index[-2].date()
+
+
+def test_split_rewrites_stored_history(yahoo, monkeypatch):
+    stockStore.get_history("AAA", "3mo")
+
+    # 10:1 分割：還原權值後所有舊K棒都變為十分之一
+    monkeypatch.setattr(stockStore, "REFRESH_SECONDS", -1)
+    yahoo.history = yahoo.history / 10
+    data = stockStore.get_history("AAA", "3mo")
+
+    assert np.allclose(data["Close"].to_numpy(), yahoo.history["Close"].to_numpy())
+
+
+def test_dividend_rewrites_history_in_batch_sync(yahoo, monkeypatch):
+    stockStore.get_histories(["AAA", "BBB"], "3mo")
+
+    monkeypatch.setattr(stockStore, "REFRESH_SECONDS", -1)
+    yahoo.history = yahoo.history * 0.99
+    histories = stockStore.get_histories(["AAA", "BBB"], "3mo")
+
+    for data in histories.values():
+        assert np.allclose(data["Close"].to_numpy(), yahoo.history["Close"].to_numpy())
+
+
+def test_backfill_with_changed_adjustment_rebuilds(yahoo):
+    yahoo.history = make_history(days=2000)
+    today = datetime.now().date()
+    stockStore.get_history("AAA", "1y")
+
+    yahoo.history = yahoo.history / 2
+    data = stockStore.get_history("AAA", "10y")
+    expected = yahoo.history[yahoo.history.index >= pd.Timestamp(today - timedelta(days=3653))]
+    assert np.allclose(data["Close"].to_numpy(), expected["Close"].to_numpy())
+
+
+def test_stock_data_one_day_period_returns_last_daily_bar(yahoo, client, monkeypatch):
+    from stock_app import routes
+
+    monkeypatch.setattr(routes, "fetch_info", lambda symbol: {"previousClose": 100.0, "currentPrice": 101.0})
+    response = client.get("/stock_app/api/stock_data/AAA/US?period=1d&interval=1d")
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["dates"] == [yahoo.history.index[-1].strftime('%Y-%m-%d')]
+    assert body["close_prices"] == [yahoo.history["Close"].iloc[-1]]
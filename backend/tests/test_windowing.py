@@ -0,0 +1,40 @@
+"""
+LSTM 輸入視窗的形狀與內容
+
+執行方式（於 backend 目錄）:
+    python -m pytest tests
+"""
+import numpy as np
+
+from stock_app.windowing import make_training_windows, make_windows
+
+
+def test_window_shapes_and_targets():
+    values = np.arange(100, dtype=np.float64).reshape(-1, 1)
+    x, y = make_training_windows(values, 60)
+
+    assert x.shape == (40, 60, 1)
+    assert y.shape == (40,)
+    # 第 i 個視窗為 values[i:i + 60]，目標為 values[i + 60]
+    np.testing.assert_array_equal(x[5, :, 0], np.arange(5, 65))
+    assert y[5] == 65
+    assert y[-1] == 99
+
+
+def test_windows_match_slicing_loop():
+    values = np.random.default_rng(0).normal(size=30)
+    expected = np.array([values[i:i + 7] for i in range(len(values) - 7)])[:, :, np.newaxis]
+    np.testing.assert_array_equal(make_windows(values, 7), expected)
+
+
+def test_windows_are_read_only_views():
+    values = np.arange(20, dtype=np.float64)
+    windows = make_windows(values, 5)
+    assert np.shares_memory(windows, values)
+    assert not windows.flags.writeable
+
+
+def test_too_short_series_gives_empty_windows():
+    x, y = make_training_windows(np.arange(5, dtype=np.float64), 5)
+    assert x.shape == (0, 5, 1)
+    assert y.shape == (0,)
@@ -2,6 +2,14 @@
 const API_BASE_URL =
   process.env.VUE_APP_API_BASE_URL || "http://localhost:5000";
 
+// 將 period / interval / max_points 等查詢參數加到網址後
+const withQuery = (endpoint, params = {}) => {
+  const query = new URLSearchParams(
+    Object.entries(params).filter(([, value]) => value != null)
+  ).toString();
+  return query ? `${endpoint}?${query}` : endpoint;
+};
+
 export const apiService = {
   async get(endpoint) {
     try {
@@ -18,21 +26,32 @@ export const apiService = {
 
   // Stock endpoints
   stock: {
-    getStockData: (symbol, market = "US") => 
-      apiService.get(`/stock_app/api/stock_data/${symbol}/${market}`),
-    getSMAData: (symbol, market = "US") => 
-      apiService.get(`/stock_app/api/ma/${symbol}/${market}`),
-    getBIASData: (symbol, market = "US") => 
-      apiService.get(`/stock_app/api/bias/${symbol}/${market}`),
+    getStockData: (symbol, market = "US", params = {}) =>
+      apiService.get(
+        withQuery(`/stock_app/api/stock_data/${symbol}/${market}`, params)
+      ),
+    getSMAData: (symbol, market = "US", params = {}) =>
+      apiService.get(withQuery(`/stock_app/api/ma/${symbol}/${market}`, params)),
+    getBIASData: (symbol, market = "US", params = {}) =>
+      apiService.get(
+        withQuery(`/stock_app/api/bias/${symbol}/${market}`, params)
+      ),
     predictStockPrice: (symbol, market = "US") =>
       apiService.get(`/stock_app/api/lstm_predict/${symbol}/${market}`),
+    // 尚無模型時後端在背景訓練，以工作編號查詢進度
+    getLstmJob: (jobId) => apiService.get(`/stock_app/api/lstm_jobs/${jobId}`),
     getStockCategories: (market = "US") => {
       if (market === "US") {
-        return apiService.get("/stock_app/api/categories");
+        // 後端回傳上一次完成的結果與背景更新進度，這裡只取股票列表
+        return apiService
+          .get("/stock_app/api/categories")
+          .then((data) => data.stocks || []);
       } else {
         return apiService.get("/stock_app/api/tw_categories");
       }
     },
+    getCategoriesStatus: () =>
+      apiService.get("/stock_app/api/categories/status"),
     getTwCategories: async () => {
       try {
         // 直接使用 fetch 獲取原始文本
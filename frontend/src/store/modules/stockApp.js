@@ -1,5 +1,8 @@
 import { apiService } from "@/services/api";
 
+// 查詢 LSTM 背景訓練進度的間隔（毫秒）
+const LSTM_JOB_POLL_MS = 3000;
+
 const state = {
   currentMarket: "US",
   loading: false,
@@ -215,7 +218,21 @@ const actions = {
     commit("SET_ERROR", null);
 
     try {
-      const data = await apiService.stock.predictStockPrice(symbol, state.currentMarket);
+      let data = await apiService.stock.predictStockPrice(symbol, state.currentMarket);
+
+      // 尚無模型：等待背景訓練完成後重新取得預測
+      if (data.status === "training") {
+        const jobId = data.training_job.job_id;
+        let job = data.training_job;
+        while (job.state === "queued" || job.state === "running") {
+          await new Promise((resolve) => setTimeout(resolve, LSTM_JOB_POLL_MS));
+          job = await apiService.stock.getLstmJob(jobId);
+        }
+        if (job.state !== "completed") {
+          throw new Error(job.error || `模型訓練${job.state === "failed" ? "失敗" : "中斷"}`);
+        }
+        data = await apiService.stock.predictStockPrice(symbol, state.currentMarket);
+      }
 
       if (data.error) {
         throw new Error(data.error);